@@ -0,0 +1,132 @@
+import logging
+import queue
+import threading
+
+logger = logging.getLogger('BulkPipeline')
+
+# Items waiting between two stages; a full queue makes the stage before it wait
+PIPELINE_QUEUE_SIZE = 16
+
+# How often blocked stages check for cancellation, in seconds
+POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+
+class Stage:
+    """One step of a pipeline: function(job) -> job, run by `workers` threads."""
+
+    def __init__(self, name, function, workers=1):
+        self.name = name
+        self.function = function
+        self.workers = workers
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, workers={self.workers})"
+
+
+class Pipeline:
+    """Runs jobs from a source through stages on threads joined by bounded queues.
+
+    Every stage works on its own threads, so rendering one payslip overlaps
+    with writing the previous one, and the bounded queues stop a fast stage
+    from running ahead of a slow one: at most a few queues' worth of jobs are
+    in memory at any time, however large the source is.
+
+    A job that raises in a stage is reported with on_error and goes no
+    further; the other jobs carry on.
+    """
+
+    def __init__(self, stages, queue_size=PIPELINE_QUEUE_SIZE):
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._errors = []
+
+    def cancel(self):
+        """Stop reading the source; jobs already in the pipeline are dropped."""
+        self.cancelled.set()
+
+    def _put(self, target, item):
+        while not self.cancelled.is_set():
+            try:
+                target.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source):
+        while not self.cancelled.is_set():
+            try:
+                return source.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _feed(self, source, target, workers):
+        try:
+            for job in source:
+                if not self._put(target, job):
+                    return
+        except Exception as e:
+            logger.error(f"Error reading jobs: {e}")
+            self._errors.append(e)
+        finally:
+            for _ in range(workers):
+                self._put(target, _DONE)
+
+    def _work(self, stage, source, target, remaining, next_workers, on_result, on_error):
+        while True:
+            job = self._get(source)
+            if job is _DONE:
+                break
+            try:
+                job = stage.function(job)
+            except Exception as e:
+                if on_error:
+                    on_error(job, stage.name, e)
+                continue
+            if target is None:
+                if on_result:
+                    on_result(job)
+            elif not self._put(target, job):
+                break
+        with self._lock:
+            remaining[stage.name] -= 1
+            last = remaining[stage.name] == 0
+        if last and target is not None:
+            # The next stage's workers stop once every worker of this stage has finished
+            for _ in range(next_workers):
+                self._put(target, _DONE)
+
+    def run(self, source, on_result=None, on_error=None):
+        """Push every job of source through the stages and wait until all are through.
+
+        Args:
+            source: Iterable of jobs; read on its own thread, only as fast as the stages take them
+            on_result: Called with each job leaving the last stage (from a worker thread)
+            on_error: Called with (job, stage name, exception) for jobs that failed (from a worker thread)
+
+        Raises:
+            Exception: What reading the source raised, after the jobs read so far are through
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        remaining = {stage.name: stage.workers for stage in self.stages}
+        threads = [threading.Thread(target=self._feed, args=(source, queues[0], self.stages[0].workers),
+                                    name='pipeline-source', daemon=True)]
+        for position, stage in enumerate(self.stages):
+            last = position == len(self.stages) - 1
+            target = None if last else queues[position + 1]
+            next_workers = 0 if last else self.stages[position + 1].workers
+            for number in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work, name=f'pipeline-{stage.name}-{number}', daemon=True,
+                    args=(stage, queues[position], target, remaining, next_workers, on_result, on_error)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
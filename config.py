@@ -54,6 +54,17 @@ class PayslipConfig:
                 self.config[sheet_type][mapping_type].pop(str(display_name), None)
             self.save_config()
 
+    def get_ytd(self):
+        """Year-to-date lines on payslips: {'enabled': bool, 'columns': {label: excel header}}.
+        Empty columns means the layout's totals (see payroll_history.ytd_columns).
+        """
+        return self.config.get('YTD', {'enabled': False, 'columns': {}})
+
+    def set_ytd_enabled(self, enabled):
+        """Turn the year-to-date lines on payslips on or off"""
+        self.config.setdefault('YTD', {'enabled': False, 'columns': {}})['enabled'] = bool(enabled)
+        self.save_config()
+
     def get_mappings(self, sheet_type):
         """Get all mappings for a sheet type"""
         return self.config.get(sheet_type, {'earnings': {}, 'deductions': {}})
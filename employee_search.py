@@ -0,0 +1,87 @@
+import logging
+import sys
+from bisect import bisect_left
+import pandas as pd
+
+logger = logging.getLogger('EmployeeSearch')
+
+# Columns looked up by their exact value
+ID_COLUMNS = ('EMP NO', 'EPF NO', 'NIC NO.')
+
+# Column looked up by the start of any word of its value
+NAME_COLUMN = 'NAME'
+
+# Most rows returned by one search
+SEARCH_LIMIT = 50
+
+
+def search_key(value):
+    """Text a cell or a search is compared by: whole numbers without '.0', collapsed spaces, upper-case."""
+    if pd.isna(value):  # None, NaN, NaT and pd.NA (blanks of nullable Int64 ID columns)
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    key = ' '.join(str(value).split()).upper()
+    return key or None
+
+
+class EmployeeIndex:
+    """Lookup of a loaded sheet's rows by employee ID or name.
+
+    Built once when the sheet is loaded: a dict from each EMP NO, EPF NO and
+    NIC NO. value to its rows, and a sorted list of names (one entry starting
+    at each word of a name) searched by prefix with bisect.
+    """
+
+    def __init__(self, df, schema):
+        from sheet_loader import SheetRows
+        rows = SheetRows(df)
+        self.ids = {}
+        for column in ID_COLUMNS:
+            position = schema.position(column)
+            if position is None:
+                continue
+            get = rows.column_getter(position)
+            for row in range(len(rows)):
+                key = search_key(get(row))
+                if key is not None:
+                    self.ids.setdefault(key, []).append(row)
+
+        names = []
+        position = schema.position(NAME_COLUMN)
+        if position is not None:
+            get = rows.column_getter(position)
+            for row in range(len(rows)):
+                key = search_key(get(row))
+                if key is None:
+                    continue
+                # "K. SILVA" is found by both "K" and "SIL"
+                words = key.split(' ')
+                for start in range(len(words)):
+                    names.append((' '.join(words[start:]), row))
+        names.sort()
+        self._names = [name for name, _ in names]
+        self._name_rows = [row for _, row in names]
+        self.size = (sys.getsizeof(self.ids) + sum(sys.getsizeof(key) for key in self.ids)
+                     + sum(sys.getsizeof(name) for name in self._names))
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        """Rows matching a search, in sheet order: exact ID matches first, then names starting with it."""
+        query = search_key(text)
+        if query is None:
+            return []
+        found = set(self.ids.get(query, ()))
+        if query.isdigit() and query != query.lstrip('0'):
+            # IDs typed with leading zeros, e.g. 0042 for EMP NO 42
+            found.update(self.ids.get(query.lstrip('0') or '0', ()))
+        matches = sorted(found)
+
+        name_matches = []
+        i = bisect_left(self._names, query)
+        while i < len(self._names) and self._names[i].startswith(query) and len(found) < limit:
+            row = self._name_rows[i]
+            if row not in found:
+                found.add(row)
+                name_matches.append(row)
+            i += 1
+        return (matches + sorted(name_matches))[:limit]
@@ -0,0 +1,487 @@
+"""Golden-output check for payslip text and PDFs.
+
+Renders a reference corpus through the same path as the application
+(workbook -> parse_sheet -> generate_payslip -> render_pdf_bytes) with a
+fixed payslip month and the current payslip_config.json, and compares the
+result with the golden files under golden/. Any change to spacing, number
+formatting or which items are printed shows up as a diff per payslip.
+
+The corpus is a synthetic workbook built here (the same rows on every run)
+plus any anonymized workbooks saved in golden/ (see --anonymize).
+
+    python golden_check.py              # compare, exit status 1 on differences
+    python golden_check.py --update     # accept the current output as golden
+    python golden_check.py --anonymize payroll.xlsx golden/april.xlsx
+
+PDF goldens hold the text extracted from the PDF, one line per text row with
+runs of spaces collapsed, so they follow the words and line breaks on the
+page rather than the PDF bytes. They depend on the installed payslip font
+only where it changes line wrapping.
+"""
+import os
+import re
+import sys
+import zlib
+import difflib
+import logging
+import argparse
+import tempfile
+import warnings
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('GoldenCheck')
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+# Month printed on every golden payslip, so the goldens do not change with the date
+GOLDEN_MONTH = 'APRIL 2025'
+
+# Rows per synthetic sheet; the first rows are the edge cases below
+CORPUS_ROWS = 40
+
+# Most diff lines shown per golden file
+DIFF_LINES = 200
+
+SYNTHETIC = 'synthetic'
+
+_SECTION = re.compile(r'^===== (.*) =====$')
+
+
+# --- Synthetic corpus ---------------------------------------------------------
+
+def _mapped_headers(mappings, limit=None):
+    """Sheet headers named by earnings or deductions mappings, with their neighbour columns.
+
+    Returns (headers in sheet order, headers holding the amounts).
+    """
+    headers, amounts = [], []
+    for excel_header in list(mappings.values())[:limit]:
+        if isinstance(excel_header, (list, tuple)) and len(excel_header) == 2:
+            first, second = excel_header
+            if second == 'prev_column':
+                headers += [f'{first} HRS', first]
+            elif second == 'next_column':
+                headers += [first, f'{first} HRS']
+            else:
+                headers += [first, second]
+            amounts.append(first)
+        else:
+            headers.append(excel_header)
+            amounts.append(excel_header)
+    return headers, amounts
+
+
+def _rng(*names):
+    """Random generator seeded by names, so a column's values do not depend on the other columns."""
+    return np.random.default_rng(zlib.crc32('|'.join(names).encode()))
+
+
+def _amounts(sheet_type, header, n, hours=False):
+    rng = _rng(sheet_type, header)
+    if hours:
+        values = np.round(rng.random(n) * 40, 1)
+    else:
+        values = np.round(rng.random(n) * 20000, 2)
+    values[rng.random(n) < 0.6] = 0.0
+    # Edge cases: nothing printed, everything printed, large and negative amounts,
+    # amounts rounding to zero and to one cent, blank cells
+    values[0] = 0.0
+    values[1] = 1.5 if hours else 1234.5
+    values[2] = 987654.32 if not hours else 99.9
+    values[3] = 0.004
+    values[4] = np.nan
+    if not hours:
+        values[5] = 0.005
+        values[6] = -250.75
+    return values
+
+
+def _identity_columns(sheet_type, n):
+    rng = _rng(sheet_type, 'identity')
+    names = [f'EMPLOYEE {chr(65 + i % 26)}. {"SYNTHETIC" if i % 3 else "TEST"} {i}' for i in range(n)]
+    names[4] = 'W.A. KARUNARATHNA MUDIYANSELAGE PERERA SILVA'  # Longer than its column
+    names[5] = '  EXTRA   SPACED  NAME '
+    dob = pd.to_datetime('1975-01-01') + pd.to_timedelta(rng.integers(0, 12000, n), 'D')
+    doj = pd.to_datetime('2000-01-01') + pd.to_timedelta(rng.integers(0, 8000, n), 'D')
+    dob, doj = list(dob), list(doj)
+    dob[4] = None  # Blank date
+    doj[5] = '15/03/2010'  # Date typed as text
+    emp_no = np.arange(1000, 1000 + n).astype(float)
+    epf_no = np.arange(5000, 5000 + n).astype(float)
+    emp_no[7] = epf_no[7] = np.nan  # Blank IDs: the sheet still loads and the row is reported
+    return {
+        'EMP NO': emp_no,
+        'NAME': names,
+        'NIC No.': [f'{850000000 + i * 7919}V' for i in range(n)],
+        'DEPARTMENT': rng.choice(['DYEING', 'WINDING', 'STORES', 'QA'], n),
+        'DESIGNATION': rng.choice(['OPERATOR', 'HELPER', 'SUPERVISOR'], n),
+        'DOB': dob,
+        'DOJ': doj,
+        'EPF NO': epf_no,
+    }
+
+
+def corpus_frames(rows=CORPUS_ROWS):
+    """Synthetic payroll sheets by sheet name, covering the current mappings."""
+    from config import PayslipConfig
+    config = PayslipConfig()
+    frames = {}
+    for sheet_name, sheet_type, minimal in (('FIXED APRIL', 'FIXED', False),
+                                            ('FTC APRIL', 'FTC', False),
+                                            ('FTC MINIMAL', 'FTC', True)):
+        rng = _rng(sheet_name, 'other')
+        columns = _identity_columns(sheet_type, rows)
+        if sheet_type == 'FIXED':
+            columns['REF NO'] = np.arange(70000, 70000 + rows)
+            for filler in range(9, 13):
+                columns[f'X{filler}'] = ''
+            columns['BANK'] = rng.choice(['7010', '7278'], rows)
+            columns['BANK NAME'] = rng.choice(['BOC', 'HNB', 'COMMERCIAL'], rows)  # Position 14, the layout's fallback
+            columns['BRANCH NAME'] = rng.choice(['KANDY', 'COLOMBO', 'GALLE'], rows)
+        else:
+            columns['RATE'] = rng.integers(1000, 3000, rows)
+            if not minimal:
+                columns['BANK CODE'] = rng.choice(['7010', '7278'], rows)
+                columns['BRANCH'] = rng.choice(['KANDY', 'COLOMBO', 'GALLE'], rows)
+        columns['A/C NO'] = rng.integers(10**9, 10**11, rows)
+
+        # The minimal sheet has a few mapped items and none of the optional columns
+        mappings = config.get_mappings(sheet_type)
+        totals = {}
+        for mapping_type in ('earnings', 'deductions'):
+            headers, amounts = _mapped_headers(mappings.get(mapping_type, {}), 3 if minimal else None)
+            for header in headers:
+                if header.upper() not in {column.upper() for column in columns}:
+                    columns[header] = _amounts(sheet_type, header, rows, hours=header.endswith(' HRS'))
+            totals[mapping_type] = sum((np.nan_to_num(columns[header]) for header in amounts
+                                        if header in columns), np.zeros(rows))
+        earnings, deductions = totals['earnings'], totals['deductions']
+        base = sum((np.nan_to_num(columns[header]) for header in ('BASIC SAL', 'B.R ALLOWA')
+                    if header in columns), np.zeros(rows))
+        columns['TOT EARN'] = np.round(earnings, 2)
+        columns['TOT DED' if sheet_type == 'FIXED' else 'total deduction'] = np.round(deductions, 2)
+        columns['netpay' if sheet_type == 'FIXED' else 'NETPAY'] = np.round(earnings - deductions, 2)
+        columns.setdefault('EPF YEE', np.round(base * 0.08, 2))
+        columns['ETF YER'] = np.round(base * 0.03, 2)
+        columns['EPF YER'] = np.round(base * 0.12, 2)
+        columns['TOTAL EPF'] = np.round(base * 0.20, 2)
+        if sheet_type == 'FTC' and not minimal:
+            columns['NO OF DAYS WORKED'] = rng.integers(0, 27, rows).astype(float)
+        frames[sheet_name] = pd.DataFrame(columns)
+    return frames
+
+
+def write_workbook(frames, path):
+    """Save sheets as a workbook with a title row above the header, like the payroll files."""
+    with pd.ExcelWriter(path) as writer:
+        for sheet_name, df in frames.items():
+            pd.DataFrame([[f'{sheet_name} PAYROLL']]).to_excel(writer, sheet_name=sheet_name,
+                                                               header=False, index=False)
+            df.to_excel(writer, sheet_name=sheet_name, startrow=1, index=False)
+
+
+# --- Anonymizing real sheets ---------------------------------------------------
+
+def anonymize_frame(df, schema):
+    """Copy of a loaded sheet with names, IDs, account numbers and birth dates replaced.
+
+    Amounts and the other columns are kept, so the copy renders payslips with
+    the same layout as the original.
+    """
+    df = df.copy()
+    n = len(df)
+    replacements = {
+        'NAME': [f'EMPLOYEE {i + 1}' for i in range(n)],
+        'EMP NO': np.arange(100001, 100001 + n),
+        'EPF NO': np.arange(200001, 200001 + n),
+        'NIC NO.': [f'{700000000 + i}V' for i in range(n)],
+        'A/C NO': np.arange(9000000001, 9000000001 + n),
+        'REF NO': np.arange(300001, 300001 + n),
+        'DOB': [pd.Timestamp('1980-01-01')] * n,
+    }
+    for header, values in replacements.items():
+        position = schema.position(header)
+        if position is not None:
+            df.isetitem(position, values)
+    return df
+
+
+def anonymize_workbook(source, destination):
+    """Write the payroll sheets of a workbook with personal details replaced."""
+    from sheet_jobs import parse_sheet
+    frames = {}
+    for sheet_name in pd.ExcelFile(source).sheet_names:
+        loaded = parse_sheet(source, sheet_name, payroll_only=True)
+        if loaded is not None:
+            frames[sheet_name] = anonymize_frame(loaded['df'], loaded['schema'])
+    write_workbook(frames, destination)
+    logger.info(f"Anonymized {len(frames)} sheets of {source} into {destination}")
+    return list(frames)
+
+
+# --- Rendering -------------------------------------------------------------------
+
+def render_workbook(path, with_pdf=True):
+    """Golden texts of every payroll sheet of a workbook.
+
+    Returns:
+        Dict of golden file name -> text: '<sheet>.txt' holds the payslip
+        texts and '<sheet>.pdf.txt' the text read back from their PDFs
+    """
+    import slypGenarater
+    from sheet_jobs import parse_sheet
+    from sheet_loader import SheetRows
+    month, ytd = slypGenarater.get_payslip_month_year, slypGenarater.year_to_date
+    slypGenarater.get_payslip_month_year = lambda: GOLDEN_MONTH
+    # Year-to-date lines depend on this machine's payroll history, so they are left out
+    slypGenarater.year_to_date = lambda schema, sheet_type=None: None
+    try:
+        if with_pdf:
+            from print_manager import render_pdf_bytes
+        outputs = {}
+        for sheet_name in pd.ExcelFile(path).sheet_names:
+            loaded = parse_sheet(path, sheet_name, payroll_only=True)
+            if loaded is None:
+                continue
+            rows, schema = SheetRows(loaded['df']), loaded['schema']
+            emp_no = schema.position('EMP NO')
+            texts, pdf_texts = [], []
+            for row in range(len(rows)):
+                values = rows.values(row)
+                label = f"{sheet_name} row {row + 1}"
+                if emp_no is not None:
+                    label += f" EMP NO {values[emp_no]}"
+                try:
+                    text = slypGenarater.generate_payslip(values, sheet_name, schema)
+                except Exception as e:
+                    texts.append(f"===== {label} =====\nERROR {type(e).__name__}: {e}\n")
+                    continue
+                texts.append(f"===== {label} =====\n{text}\n")
+                if with_pdf:
+                    pdf_texts.append(f"===== {label} =====\n{pdf_text(render_pdf_bytes(text))}\n")
+            outputs[f"{sheet_name}.txt"] = ''.join(texts)
+            if with_pdf:
+                outputs[f"{sheet_name}.pdf.txt"] = ''.join(pdf_texts)
+        return outputs
+    finally:
+        slypGenarater.get_payslip_month_year, slypGenarater.year_to_date = month, ytd
+
+
+# --- PDF text ----------------------------------------------------------------------
+
+_OBJECT = re.compile(rb'(\d+) 0 obj(.*?)endobj', re.S)
+_STREAM = re.compile(rb'stream\r?\n')
+_HEX = re.compile(rb'<([0-9A-Fa-f]+)>')
+_CONTENT_TOKEN = re.compile(rb'<[0-9A-Fa-f]*>|\[|\]|/[^\s/\[\]<>()]+|[-+]?\d*\.?\d+|[A-Za-z\'"*]+')
+
+
+def _pdf_objects(data):
+    """Object number -> (dictionary bytes, decoded stream or None) of an uncompressed-xref PDF."""
+    objects = {}
+    for match in _OBJECT.finditer(data):
+        body = match.group(2)
+        stream = _STREAM.search(body)
+        if stream is None:
+            objects[int(match.group(1))] = (body, None)
+            continue
+        raw = body[stream.end():body.rindex(b'endstream')]
+        if b'/FlateDecode' in body[:stream.start()]:
+            raw = zlib.decompressobj().decompress(raw)
+        objects[int(match.group(1))] = (body[:stream.start()], raw)
+    return objects
+
+
+def _to_unicode(cmap):
+    """Glyph code -> text from a ToUnicode CMap."""
+    codes = {}
+    for block in re.findall(rb'beginbfchar(.*?)endbfchar', cmap, re.S):
+        pairs = _HEX.findall(block)
+        for source, target in zip(pairs[::2], pairs[1::2]):
+            codes[int(source, 16)] = bytes.fromhex(target.decode()).decode('utf-16-be', 'replace')
+    for block in re.findall(rb'beginbfrange(.*?)endbfrange', cmap, re.S):
+        for first, last, targets in re.findall(rb'<(\w+)>\s*<(\w+)>\s*(\[[^\]]*\]|<\w+>)', block):
+            first, last = int(first, 16), int(last, 16)
+            if targets.startswith(b'['):
+                for offset, target in enumerate(_HEX.findall(targets)):
+                    codes[first + offset] = bytes.fromhex(target.decode()).decode('utf-16-be', 'replace')
+            else:
+                start = int(targets[1:-1], 16)
+                for offset in range(last - first + 1):
+                    codes[first + offset] = chr(start + offset)
+    return codes
+
+
+def pdf_text(data):
+    """Text of a PDF written by Qt: one line per row of glyphs, runs of spaces collapsed.
+
+    Handles what QPdfWriter produces (Type0 fonts with ToUnicode maps, one
+    positioned glyph run per Tj/TJ); it is not a general PDF reader.
+    """
+    objects = _pdf_objects(data)
+    fonts = {}
+    for number, (dictionary, _) in objects.items():
+        match = re.search(rb'/ToUnicode (\d+) 0 R', dictionary)
+        if match and int(match.group(1)) in objects:
+            fonts[number] = _to_unicode(objects[int(match.group(1))][1] or b'')
+    resources = {}
+    for dictionary, _ in objects.values():
+        for block in re.findall(rb'/Font\s*<<(.*?)>>', dictionary, re.S):
+            for name, number in re.findall(rb'/([^\s/]+)\s+(\d+) 0 R', block):
+                resources[name.decode()] = fonts.get(int(number), {})
+
+    pages = []
+    for dictionary, stream in objects.values():
+        if stream is None or b'BT' not in stream or b'/Type /XObject' in dictionary:
+            continue
+        rows = {}
+        codes, line_x, line_y, operands = {}, 0.0, 0.0, []
+        for token in _CONTENT_TOKEN.findall(stream):
+            if token[:1] in b'<[]/' or re.fullmatch(rb'[-+]?\d*\.?\d+', token):
+                operands.append(token)
+                continue
+            op = token.decode()
+            if op == 'Tf' and len(operands) >= 2:
+                codes = resources.get(operands[-2].decode()[1:], {})
+            elif op == 'Tm' and len(operands) >= 6:
+                line_x, line_y = float(operands[-2]), float(operands[-1])
+            elif op in ('Td', 'TD') and len(operands) >= 2:
+                line_x += float(operands[-2])
+                line_y += float(operands[-1])
+            elif op in ('Tj', 'TJ', "'", '"'):
+                glyphs = b''.join(bytes.fromhex(t[1:-1].decode()) for t in operands if t.startswith(b'<'))
+                text = ''.join(codes.get(int.from_bytes(glyphs[i:i + 2], 'big'), '')
+                               for i in range(0, len(glyphs) - 1, 2))
+                rows.setdefault(round(line_y, 1), []).append((line_x, text))
+            operands = []
+        lines = []
+        for glyphs in rows.values():
+            glyphs.sort()
+            advances = [b[0] - a[0] for a, b in zip(glyphs, glyphs[1:]) if b[0] > a[0]]
+            step = min(advances) if advances else 0
+            parts = []
+            for i, (x, text) in enumerate(glyphs):
+                if i and step and x - glyphs[i - 1][0] > step * 1.5:
+                    parts.append(' ')
+                parts.append(text)
+            line = ' '.join(''.join(parts).split())
+            if line:
+                lines.append(line)
+        pages.append('\n'.join(lines))
+    return '\n\f\n'.join(pages)
+
+
+# --- Comparing -----------------------------------------------------------------------
+
+def _sections(text):
+    """Golden text split into {label: lines} per payslip, in order."""
+    sections, label = {}, None
+    for line in text.split('\n'):
+        match = _SECTION.match(line)
+        if match:
+            label = match.group(1)
+            sections[label] = []
+        elif label is not None:
+            sections[label].append(line)
+    return sections
+
+
+def diff_golden(golden, current, name, limit=DIFF_LINES):
+    """Readable differences between a golden file and the current output, per payslip."""
+    old, new = _sections(golden), _sections(current)
+    changed = sum(label not in new or old[label] != new[label] for label in old) \
+        + sum(label not in old for label in new)
+    lines = []
+    for label in [label for label in old if label not in new]:
+        lines.append(f"- {name}: {label} is no longer rendered")
+    for label in [label for label in new if label not in old]:
+        lines.append(f"+ {name}: {label} is new")
+    for label in old:
+        if label in new and old[label] != new[label]:
+            lines.append(f"~ {name}: {label}")
+            lines.extend(difflib.unified_diff(old[label], new[label], 'golden', 'current', n=1, lineterm=''))
+    if len(lines) > limit:
+        lines = lines[:limit] + [f"... {len(lines) - limit} more lines"]
+    return [f"{changed} of {len(old)} payslips differ"] + lines
+
+
+def corpus_workbooks(golden_dir=GOLDEN_DIR):
+    """(name, path, temporary) of the synthetic corpus and the anonymized workbooks in golden_dir."""
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    write_workbook(corpus_frames(), path)
+    workbooks = [(SYNTHETIC, path, True)]
+    if os.path.isdir(golden_dir):
+        for file_name in sorted(os.listdir(golden_dir)):
+            if file_name.lower().endswith('.xlsx'):
+                workbooks.append((os.path.splitext(file_name)[0], os.path.join(golden_dir, file_name), False))
+    return workbooks
+
+
+def run(update=False, with_pdf=True, golden_dir=GOLDEN_DIR, out=sys.stdout):
+    """Render the corpus and compare it with (or, with update, save it as) the goldens.
+
+    Returns:
+        Number of golden files that differ or are missing
+    """
+    if with_pdf:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication(sys.argv[:1])  # noqa: F841 (needed by QPdfWriter)
+    failures = 0
+    for name, path, temporary in corpus_workbooks(golden_dir):
+        try:
+            outputs = render_workbook(path, with_pdf)
+        finally:
+            if temporary:
+                os.remove(path)
+        directory = os.path.join(golden_dir, name)
+        for file_name, text in outputs.items():
+            golden_path = os.path.join(directory, file_name)
+            label = os.path.relpath(golden_path, golden_dir)
+            if update:
+                os.makedirs(directory, exist_ok=True)
+                with open(golden_path, 'w', encoding='utf-8', newline='\n') as f:
+                    f.write(text)
+                print(f"wrote {label} ({text.count('=====') // 2} payslips)", file=out)
+                continue
+            if not os.path.exists(golden_path):
+                failures += 1
+                print(f"MISSING {label}: run with --update to create it", file=out)
+                continue
+            with open(golden_path, encoding='utf-8') as f:
+                golden = f.read()
+            if golden == text:
+                print(f"ok      {label}", file=out)
+                continue
+            failures += 1
+            print(f"CHANGED {label}", file=out)
+            for line in diff_golden(golden, text, label):
+                print(f"    {line}", file=out)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare payslip text and PDFs with the golden outputs.")
+    parser.add_argument('--update', action='store_true', help="save the current output as the goldens")
+    parser.add_argument('--no-pdf', action='store_true', help="check the payslip text only")
+    parser.add_argument('--anonymize', nargs=2, metavar=('SOURCE', 'DESTINATION'),
+                        help="copy a payroll workbook with personal details replaced, for use as corpus")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    # Date parsing warnings from the loader would bury the report
+    warnings.simplefilter('ignore', UserWarning)
+    # payslip_config.json is read from the working directory, as the application does
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if args.anonymize:
+        sheets = anonymize_workbook(*args.anonymize)
+        print(f"Anonymized sheets: {', '.join(sheets) or 'none'}")
+        return 0
+    failures = run(update=args.update, with_pdf=not args.no_pdf)
+    if failures:
+        print(f"{failures} golden file(s) differ")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
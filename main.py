@@ -1,16 +1,19 @@
+import time
+# Taken before anything else is imported, for the startup timing report
+_STARTED = time.perf_counter()
+
 import sys
 import os
-import pandas as pd
 import logging
 from datetime import datetime
-from slypGenarater import generate_payslip
-from print_manager import PayslipPrintManager  # Changed to PayslipPrintManager
+# pandas, the payslip modules and Qt print support are imported on first use,
+# so the window shows without waiting for them
 from PyQt5.QtWidgets import (
    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
    QFileDialog, QLabel, QListWidget, QTableWidget, QTableWidgetItem, QSplitter,
-   QMessageBox, QTextEdit, QDialog, QComboBox, QLineEdit, QListWidgetItem
+   QMessageBox, QTextEdit, QDialog, QComboBox, QLineEdit, QListWidgetItem, QCheckBox, QProgressBar
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QPalette
 from config import PayslipConfig
 
@@ -19,6 +22,17 @@ from config import PayslipConfig
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('ExcelViewer')
 
+_IMPORTED = time.perf_counter()
+
+# Startup slower than this is logged as a warning
+STARTUP_BUDGET_MS = 1500
+
+# Table rows filled per event loop pass, so a large sheet never freezes the window
+TABLE_FILL_ROWS = 250
+
+# Scopes of the bulk buttons, in the order of job_scope_combo
+JOB_SCOPE_ALL, JOB_SCOPE_SELECTED, JOB_SCOPE_FILTER = range(3)
+
 
 class ExcelSheetViewer(QMainWindow):
    def __init__(self):
@@ -27,8 +41,8 @@ class ExcelSheetViewer(QMainWindow):
        self.setGeometry(100, 100, 1200, 800)  # Made window larger
 
 
-       # Initialize printer
-       self.printer = PayslipPrintManager(self)  # Use PayslipPrintManager instead of PayslipPDFGenerator
+       # Printer manager is built on first use (see the printer property)
+       self._printer = None
 
 
        # Main widget and layout
@@ -50,6 +64,16 @@ class ExcelSheetViewer(QMainWindow):
        self.select_file_button = QPushButton("Select Excel File")
        self.select_file_button.clicked.connect(self.select_file)
        file_layout.addWidget(self.select_file_button)
+
+       # Payslip-only mode reads just the columns the payslips use; untick to see the whole sheet
+       self.payslip_only_checkbox = QCheckBox("Load payslip columns only")
+       self.payslip_only_checkbox.toggled.connect(self.on_payslip_only_toggled)
+       file_layout.addWidget(self.payslip_only_checkbox)
+
+       # Eager mode parses every payroll sheet in parallel right after opening, so clicks are instant
+       self.preload_checkbox = QCheckBox("Pre-load all payroll sheets")
+       self.preload_checkbox.toggled.connect(self.on_preload_toggled)
+       file_layout.addWidget(self.preload_checkbox)
       
        self.layout.addWidget(file_container)
 
@@ -107,8 +131,36 @@ class ExcelSheetViewer(QMainWindow):
       
        self.table_label = QLabel("Sheet data:")
        self.table_layout.addWidget(self.table_label)
+
+       # Employee search: jumps to the matching row and previews its payslip
+       search_layout = QHBoxLayout()
+       search_layout.addWidget(QLabel("Find employee:"))
+       self.search_edit = QLineEdit()
+       self.search_edit.setPlaceholderText("EMP NO, EPF NO, NIC NO. or name - Enter for the next match")
+       self.search_edit.textChanged.connect(self.on_search_changed)
+       self.search_edit.returnPressed.connect(self.next_search_match)
+       search_layout.addWidget(self.search_edit)
+       self.search_label = QLabel("")
+       search_layout.addWidget(self.search_label)
+       self.table_layout.addLayout(search_layout)
+
+       # Row filter for bulk jobs, e.g. DEPARTMENT in {DYEING, QA} and netpay > 0
+       filter_layout = QHBoxLayout()
+       filter_layout.addWidget(QLabel("Filter rows:"))
+       self.filter_edit = QLineEdit()
+       self.filter_edit.setPlaceholderText("e.g. DEPARTMENT in {DYEING, QA} and netpay > 0, or EMP NO in {pasted list}")
+       self.filter_edit.textChanged.connect(self.on_filter_changed)
+       filter_layout.addWidget(self.filter_edit)
+       self.filter_label = QLabel("")
+       filter_layout.addWidget(self.filter_label)
+       self.table_layout.addLayout(filter_layout)
       
        self.data_table = QTableWidget()
+       # Enable row selection
+       self.data_table.setSelectionBehavior(QTableWidget.SelectRows)
+       # Several rows can be selected (Ctrl/Shift+click) for bulk jobs on the selection
+       self.data_table.setSelectionMode(QTableWidget.ExtendedSelection)
+       self.data_table.itemSelectionChanged.connect(self.on_row_selection_changed)
        self.table_layout.addWidget(self.data_table)
       
        # Add the table to the bottom of main splitter
@@ -125,6 +177,17 @@ class ExcelSheetViewer(QMainWindow):
        self.status_label = QLabel("Status: Ready")
        bottom_layout.addWidget(self.status_label)
 
+       # Sheet loading progress, shown while a sheet is read in the background
+       self.load_progress = QProgressBar()
+       self.load_progress.setMaximumWidth(200)
+       self.load_progress.hide()
+       bottom_layout.addWidget(self.load_progress)
+
+       self.cancel_load_button = QPushButton("Cancel")
+       self.cancel_load_button.clicked.connect(self.cancel_sheet_load)
+       self.cancel_load_button.hide()
+       bottom_layout.addWidget(self.cancel_load_button)
+
 
        button_container = QWidget()
        button_layout = QHBoxLayout()
@@ -143,6 +206,14 @@ class ExcelSheetViewer(QMainWindow):
        button_layout.addWidget(self.print_selected_button)
 
 
+       # Which rows the bulk buttons work on
+       button_layout.addWidget(QLabel("Bulk jobs for:"))
+       self.job_scope_combo = QComboBox()
+       self.job_scope_combo.addItems(["All rows", "Selected rows", "Rows matching filter"])
+       self.job_scope_combo.currentIndexChanged.connect(self.on_job_scope_changed)
+       button_layout.addWidget(self.job_scope_combo)
+
+
        self.generate_bulk_button = QPushButton("Generate All Payslips & PDFs")
        self.generate_bulk_button.clicked.connect(self.generate_bulk_payslips)
        self.generate_bulk_button.setEnabled(False)
@@ -153,6 +224,15 @@ class ExcelSheetViewer(QMainWindow):
        self.print_bulk_button.clicked.connect(self.print_bulk_payslips)
        self.print_bulk_button.setEnabled(False)
        button_layout.addWidget(self.print_bulk_button)
+
+       self.preview_bulk_button = QPushButton("Preview All Payslips")
+       self.preview_bulk_button.clicked.connect(self.preview_bulk_payslips)
+       self.preview_bulk_button.setEnabled(False)
+       button_layout.addWidget(self.preview_bulk_button)
+      
+       self.compare_button = QPushButton("Compare with Last Month")
+       self.compare_button.clicked.connect(self.compare_with_last_month)
+       button_layout.addWidget(self.compare_button)
       
        # Add Configure button
        self.configure_button = QPushButton("Configure Custom Fields")
@@ -164,41 +244,67 @@ class ExcelSheetViewer(QMainWindow):
 
 
        self.selected_file = None
+       self.excel_file = None
        self.current_df = None
+       self.current_schema = None
+       self.coercion_issues = []
+       self.current_memory = 0
+       self.employee_index = None
+       self.search_matches = []
+       self.search_position = 0
+       self.diff_dialog = None
+       # Background loading: running workers are kept referenced until they finish
+       self.workbook_worker = None
+       self.sheet_worker = None
+       self.preload_worker = None
+       self.preload_pending = set()  # Sheets the pre-load worker has not reported yet
+       self.awaiting_sheet = None  # Sheet clicked while the pre-load worker was parsing it
+       self._workers = []
+       from sheet_jobs import SheetCache
+       self.sheet_cache = SheetCache()  # Parsed sheets by (sheet name, payslip-only)
+       self._table_fill = None
+       self.table_fill_timer = QTimer(self)
+       self.table_fill_timer.timeout.connect(self._fill_table_chunk)
        self.current_headers = []  # Add this line after self.current_df initialization
 
 
+   @property
+   def printer(self):
+       """PayslipPrintManager, created the first time something is printed or saved"""
+       if self._printer is None:
+           from print_manager import PayslipPrintManager
+           self._printer = PayslipPrintManager(self)
+       return self._printer
+
+
    def select_file(self):
        file_name, _ = QFileDialog.getOpenFileName(
            self, "Select Excel File", "", "Excel Files (*.xlsx *.xls)"
        )
        if file_name:
+           from sheet_worker import WorkbookOpenWorker
            self.selected_file = file_name
            self.file_label.setText(f"Selected File: {os.path.basename(file_name)}")
-           try:
-               # Load Excel file to get sheet names
-               xls = pd.ExcelFile(file_name)
-               sheet_names = xls.sheet_names
-              
-               # Clear and update the sheet list
-               self.sheet_list.clear()
-               self.sheet_list.addItems(sheet_names)
-              
-               # Clear the table
-               self.data_table.clear()
-               self.data_table.setRowCount(0)
-               self.data_table.setColumnCount(0)
-               self.table_label.setText("Sheet data:")
-              
-               self.status_label.setText(
-                   f"Status: Excel file loaded successfully. Found {len(sheet_names)} sheets."
-               )
-           except Exception as e:
-               error_msg = f"Error loading Excel file: {str(e)}"
-               logger.error(error_msg)
-               self.status_label.setText(f"Status: {error_msg}")
-               self.sheet_list.clear()
-               self.data_table.clear()
+           self.cancel_sheet_load()
+           self.cancel_preload()
+           self.sheet_cache.clear()
+           if self.workbook_worker:
+               self.workbook_worker.cancel()
+           self.excel_file = None
+           self.sheet_list.clear()
+          
+           # Clear the table
+           self._clear_table()
+           self.table_label.setText("Sheet data:")
+
+           # Sheet names are listed as soon as they are read; the window stays usable meanwhile
+           self.status_label.setText("Status: Opening workbook...")
+           worker = WorkbookOpenWorker(file_name)
+           worker.sheet_names_ready.connect(self.on_sheet_names_ready)
+           worker.opened.connect(self.on_workbook_opened)
+           worker.failed.connect(self.on_workbook_failed)
+           self.workbook_worker = worker
+           self._start_worker(worker)
        else:
            logger.info("No file selected by user")
            self.file_label.setText("No Excel file selected")
@@ -208,105 +314,317 @@ class ExcelSheetViewer(QMainWindow):
            self.table_label.setText("Sheet data:")
 
 
+   def _start_worker(self, worker):
+       self._workers.append(worker)
+       worker.finished.connect(lambda: self._workers.remove(worker))
+       worker.start()
+
+
+   def on_sheet_names_ready(self, sheet_names):
+       if self.sender() is not self.workbook_worker:
+           return
+       # Clear and update the sheet list
+       self.sheet_list.clear()
+       self.sheet_list.addItems(sheet_names)
+       self.status_label.setText(
+           f"Status: Excel file loaded successfully. Found {len(sheet_names)} sheets."
+       )
+       if self.preload_checkbox.isChecked():
+           self.start_preload()
+
+
+   def on_workbook_opened(self, excel_file):
+       # Kept open so .xls sheets are parsed from the same workbook without re-reading it;
+       # .xlsx sheets are streamed from the file instead
+       if self.sender() is self.workbook_worker:
+           self.excel_file = excel_file
+
+
+   def on_workbook_failed(self, message):
+       if self.sender() is not self.workbook_worker:
+           return
+       error_msg = f"Error loading Excel file: {message}"
+       self.status_label.setText(f"Status: {error_msg}")
+       self.excel_file = None
+       self.sheet_list.clear()
+       self.data_table.clear()
+
+
    def on_sheet_selected(self, item):
        sheet_name = item.text()
        logger.info(f"Sheet selected: {sheet_name}")
        self.show_sheet_data(str(sheet_name))
 
 
+   def on_payslip_only_toggled(self, checked):
+       # Reload the current sheet with or without the columns the payslips don't use
+       if self.preload_worker is not None:
+           self.cancel_preload()
+           self.start_preload()
+       if self.current_schema is not None:
+           self.show_sheet_data(self.current_schema.sheet_name)
+
+
+   def _sheet_names(self):
+       return [self.sheet_list.item(i).text() for i in range(self.sheet_list.count())]
+
+
+   def on_preload_toggled(self, checked):
+       if checked:
+           self.start_preload()
+       else:
+           self.cancel_preload()
+
+
+   def start_preload(self):
+       """Parse the workbook's payroll sheets in worker processes, filling the sheet cache"""
+       if not self.selected_file or self.preload_worker is not None:
+           return
+       from sheet_worker import SheetPreloadWorker
+       payslip_only = self.payslip_only_checkbox.isChecked()
+       sheet_names = [name for name in self._sheet_names() if (name, payslip_only) not in self.sheet_cache]
+       if not sheet_names:
+           return
+       worker = SheetPreloadWorker(self.selected_file, sheet_names, payslip_only)
+       worker.sheet_ready.connect(self.on_sheet_preloaded)
+       worker.finished.connect(self.on_preload_finished)
+       self.preload_worker = worker
+       self.preload_pending = set(sheet_names)
+       self._start_worker(worker)
+
+
+   def cancel_preload(self):
+       if self.preload_worker is None:
+           return
+       self.preload_worker.cancel()
+       self.preload_worker = None
+       self.preload_pending = set()
+       if self.awaiting_sheet:
+           # The clicked sheet is read on its own instead
+           sheet_name, self.awaiting_sheet = self.awaiting_sheet, None
+           self.show_sheet_data(sheet_name)
+
+
+   def on_sheet_preloaded(self, sheet_name, result):
+       if self.sender() is not self.preload_worker:
+           return
+       self.preload_pending.discard(sheet_name)
+       self.sheet_cache.put((sheet_name, self.preload_worker.payslip_only), result)
+       if sheet_name == self.awaiting_sheet:
+           self.awaiting_sheet = None
+           self._show_loaded(result)
+
+
+   def on_preload_finished(self):
+       if self.sender() is not self.preload_worker:
+           return
+       self.preload_worker = None
+       self.preload_pending = set()
+       if self.awaiting_sheet:
+           # Not a payroll sheet, or too large to pre-parse: read it now
+           sheet_name, self.awaiting_sheet = self.awaiting_sheet, None
+           self.show_sheet_data(sheet_name)
+
+
    def show_sheet_data(self, sheet_name):
        if not self.selected_file:
            return
-      
-       try:
-           # Read Excel with parse_dates=False to keep original format
-           df = pd.read_excel(self.selected_file, sheet_name=sheet_name, header=1)
-           self.current_df = df
-           self.current_headers = [str(h) for h in df.columns]  # Store headers
-          
-           # Known date columns (add any other date column names you have)
-           date_columns = ['DOB', 'DOJ', 'D.O.B.', 'D.O.J', 'DATE']
-          
-           # Update table
-           rows, cols = df.shape
-           self.data_table.setRowCount(rows)
-           self.data_table.setColumnCount(cols)
-           self.data_table.setHorizontalHeaderLabels([str(h) for h in df.columns])
-          
-           # Fill data efficiently with proper date formatting
-           for i in range(rows):
-               for j in range(cols):
-                   value = df.iloc[i, j]
-                   col_name = str(df.columns[j])
-
-
-                   # Check if column is a date column or value is datetime
-                   is_date = (
-                       col_name in date_columns or
-                       pd.api.types.is_datetime64_any_dtype(df.iloc[:, j]) or
-                       isinstance(value, pd.Timestamp)
-                   )
+       from sheet_worker import SheetLoadWorker
+
+       self.cancel_sheet_load(quiet=True)
+       self.awaiting_sheet = None
+       payslip_only = self.payslip_only_checkbox.isChecked()
+       cached = self.sheet_cache.get((sheet_name, payslip_only))
+       if cached is not None:
+           self._show_loaded(cached)
+           return
+       if sheet_name in self.preload_pending and self.preload_worker.payslip_only == payslip_only:
+           # Already being parsed; shown as soon as the pre-load worker reports it
+           self.awaiting_sheet = sheet_name
+           self.generate_bulk_button.setEnabled(False)
+           self.print_bulk_button.setEnabled(False)
+           self.preview_bulk_button.setEnabled(False)
+           self._show_load_progress(True)
+           self.status_label.setText(f"Status: Pre-loading '{sheet_name}'...")
+           return
 
+       # Detect the header row and sheet type, then read with that header, in the background
+       worker = SheetLoadWorker(self.excel_file or self.selected_file, sheet_name, payslip_only)
+       worker.progress.connect(self.on_sheet_load_progress)
+       worker.loaded.connect(self.on_sheet_loaded)
+       worker.failed.connect(self.on_sheet_load_failed)
+       self.sheet_worker = worker
 
-                   if is_date and pd.notnull(value):
-                       try:
-                           # Convert to datetime if string
-                           if isinstance(value, str):
-                               value = pd.to_datetime(value)
-                           # Only show the date part (remove timestamp)
-                           formatted_value = value.strftime('%d/%m/%Y')
-                       except Exception:
-                           formatted_value = str(value)
-                   elif isinstance(value, (int, float)) and pd.notnull(value):
-                       # Format numbers to 2 decimal points
-                       formatted_value = f"{value:.2f}"
-                   else:
-                       formatted_value = "" if pd.isna(value) else str(value)
+       self.generate_bulk_button.setEnabled(False)
+       self.print_bulk_button.setEnabled(False)
+       self.preview_bulk_button.setEnabled(False)
+       self._show_load_progress(True)
+       self.status_label.setText(f"Status: Loading '{sheet_name}'...")
+       self._start_worker(worker)
+
+
+   def is_loading(self):
+       """True while a sheet is being read or its table is being filled"""
+       return (self.sheet_worker is not None or self.awaiting_sheet is not None
+               or self.table_fill_timer.isActive())
+
+
+   def cancel_sheet_load(self, quiet=False):
+       """Stop reading the sheet that is loading; the previous sheet stays loaded"""
+       if self.awaiting_sheet is not None:
+           # The pre-load goes on in the background; only stop waiting for it
+           sheet_name, self.awaiting_sheet = self.awaiting_sheet, None
+       elif self.sheet_worker is not None:
+           self.sheet_worker.cancel()
+           sheet_name = self.sheet_worker.sheet_name
+           self.sheet_worker = None
+       else:
+           return
+       self._show_load_progress(False)
+       if not quiet:
+           self.status_label.setText(f"Status: Loading '{sheet_name}' cancelled")
+           loaded = self.current_df is not None
+           self.generate_bulk_button.setEnabled(loaded)
+           self.print_bulk_button.setEnabled(loaded)
+           self.preview_bulk_button.setEnabled(loaded)
 
 
-                   self.data_table.setItem(i, j, QTableWidgetItem(formatted_value))
-          
+   def _show_load_progress(self, visible):
+       self.load_progress.setRange(0, 0)  # Busy until the first progress report
+       self.load_progress.setVisible(visible)
+       self.cancel_load_button.setVisible(visible)
+
+
+   def on_sheet_load_progress(self, rows, bytes_read, total_bytes):
+       if self.sender() is not self.sheet_worker:
+           return
+       if total_bytes:
+           self.load_progress.setRange(0, 100)
+           self.load_progress.setValue(int(bytes_read * 100 / total_bytes))
+       else:
+           self.load_progress.setRange(0, 0)
+       self.status_label.setText(f"Status: Loading '{self.sheet_worker.sheet_name}': {rows} rows read")
+
+
+   def on_sheet_load_failed(self, message):
+       if self.sender() is not self.sheet_worker:
+           return
+       self.sheet_worker = None
+       self._show_load_progress(False)
+       self.status_label.setText(f"Status: Failed to load sheet")
+       self.generate_bulk_button.setEnabled(False)
+       self.print_bulk_button.setEnabled(False)
+       self.preview_bulk_button.setEnabled(False)
+
+
+   def on_sheet_loaded(self, result):
+       if self.sender() is not self.sheet_worker:
+           return
+       self.sheet_cache.put((self.sheet_worker.sheet_name, self.sheet_worker.payslip_only), result)
+       self.sheet_worker = None
+       self._show_loaded(result)
+
+
+   def _show_loaded(self, result):
+       from sheet_loader import format_bytes
+       self._show_load_progress(False)
+       df, schema = result['df'], result['schema']
+       self.current_df = df
+       self.current_schema = schema
+       self.coercion_issues = result['coercion_issues']
+       self.current_memory = result['memory']
+       self.employee_index = result['index']
+       self.on_filter_changed(self.filter_edit.text())
+       self.current_headers = list(schema.sheet_columns)  # Store headers (all of the sheet's)
+
+       # Update table; cells are filled a chunk of rows at a time
+       rows, cols = df.shape
+       self._clear_table()
+       self.data_table.setRowCount(rows)
+       self.data_table.setColumnCount(cols)
+       self.data_table.setHorizontalHeaderLabels([str(h) for h in df.columns])
+       self._table_fill = (result['cells'], 0)
+       self.table_fill_timer.start(0)
+       self.search_edit.blockSignals(True)
+       self.search_edit.clear()
+       self.search_edit.blockSignals(False)
+       self.search_matches = []
+       self.search_label.clear()
+      
+       # Enable bulk generation and print buttons when sheet is loaded
+       self.generate_bulk_button.setEnabled(True)
+       self.print_bulk_button.setEnabled(True)
+       self.preview_bulk_button.setEnabled(True)
+      
+       status = (f"Status: Loaded {rows} rows from '{schema.sheet_name}' "
+                 f"({schema.sheet_type or 'unknown'} sheet, header row {schema.header_row + 1})")
+       if schema.is_subset:
+           status += f", {cols} of {len(schema.sheet_columns)} columns"
+       status += f", {format_bytes(self.current_memory)} in memory"
+       if self.coercion_issues:
+           status += f" - {len(self.coercion_issues)} non-numeric cells left blank"
+       self.status_label.setText(status)
+
+
+   def _clear_table(self):
+       self.table_fill_timer.stop()
+       self._table_fill = None
+       self.data_table.clear()
+       self.data_table.setRowCount(0)
+       self.data_table.setColumnCount(0)
+
+
+   def _fill_table_chunk(self):
+       cells, start = self._table_fill
+       end = min(start + TABLE_FILL_ROWS, self.data_table.rowCount())
+       for j, column in enumerate(cells):
+           for i in range(start, end):
+               self.data_table.setItem(i, j, QTableWidgetItem(column[i]))
+       if start == 0:
+           # Widths from the first rows; sizing over the whole sheet would stall the window
            self.data_table.resizeColumnsToContents()
-           # Enable row selection
-           self.data_table.setSelectionBehavior(QTableWidget.SelectRows)
-           self.data_table.setSelectionMode(QTableWidget.SingleSelection)
-           # Connect selection signal
-           self.data_table.itemSelectionChanged.connect(self.on_row_selection_changed)
-          
-           # Enable bulk generation and print buttons when sheet is loaded
-           self.generate_bulk_button.setEnabled(True)
-           self.print_bulk_button.setEnabled(True)
-          
-           self.status_label.setText(f"Status: Loaded {rows} rows from '{sheet_name}'")
-          
-       except Exception as e:
-           logger.error(f"Error loading sheet: {e}")
-           self.status_label.setText(f"Status: Failed to load sheet")
-           self.generate_bulk_button.setEnabled(False)
-           self.print_bulk_button.setEnabled(False)
+       if end < self.data_table.rowCount():
+           self._table_fill = (cells, end)
+           return
+       self.table_fill_timer.stop()
+       self._table_fill = None
+
+
+   def closeEvent(self, event):
+       # Let background readers stop before the window (and their signals' receiver) goes away
+       self.cancel_sheet_load(quiet=True)
+       self.cancel_preload()
+       for worker in list(self._workers):
+           worker.cancel()
+           worker.wait()
+       super().closeEvent(event)
 
 
    def on_row_selection_changed(self):
        # Enable/disable payslip and print buttons based on row selection
-       selected_rows = self.data_table.selectedItems()
-       has_selection = len(selected_rows) > 0
+       has_selection = self.data_table.selectionModel().hasSelection()
        self.generate_payslip_button.setEnabled(has_selection)
        self.print_selected_button.setEnabled(has_selection)
-       self.print_selected_button.setEnabled(len(selected_rows) > 0)
+
+
+   def _selected_rows(self):
+       """Positions of the selected table rows, in sheet order"""
+       return sorted(index.row() for index in self.data_table.selectionModel().selectedRows())
 
 
    def generate_selected_payslip(self):
        if self.current_df is not None:
-           selected_items = self.data_table.selectedItems()
-           if selected_items:
-               row_index = selected_items[0].row()
+           selected_rows = self._selected_rows()
+           if selected_rows:
+               row_index = selected_rows[0]
                try:
+                   from slypGenarater import generate_payslip
                    # Get the row data as Series
                    row_data = self.current_df.iloc[row_index]
                   
                    # Generate payslip with current sheet name
                    current_sheet = self.sheet_list.currentItem().text()
-                   payslip = generate_payslip(row_data, current_sheet)
+                   payslip = generate_payslip(row_data, current_sheet, self.current_schema)
                   
                    # Display payslip in preview area
                    self.payslip_preview.setText(payslip)
@@ -340,8 +658,14 @@ class ExcelSheetViewer(QMainWindow):
 
 
        try:
+           rows = self._job_rows()
+           if rows == []:
+               return
+           skip_rows = self._run_preflight(rows)
+           if skip_rows is None:
+               return
            current_sheet = self.sheet_list.currentItem().text()
-           self._generate_bulk_pdfs(current_sheet)
+           self._generate_bulk_pdfs(current_sheet, skip_rows, rows)
        except Exception as e:
            error_msg = f"Error in bulk generation: {str(e)}"
            logger.error(error_msg)
@@ -349,79 +673,110 @@ class ExcelSheetViewer(QMainWindow):
            QMessageBox.critical(self, "Error", error_msg)
 
 
-   def _generate_bulk_pdfs(self, current_sheet):
+   def _generate_bulk_pdfs(self, current_sheet, skip_rows=frozenset(), rows=None):
        """Generate PDFs for bulk payslips with directory chooser"""
-       progress = None
        try:
-           # Prepare data for bulk PDF generation
-           employees = []
-           total_rows = len(self.current_df)
-          
-           # Show progress dialog
-           progress = QMessageBox(self)
-           progress.setWindowTitle("Preparing Data")
-           progress.setText("Preparing data for PDF generation...")
-           progress.setStandardButtons(QMessageBox.NoButton)
-           progress.show()
-           QApplication.processEvents()
-          
-           for index, row_data in self.current_df.iterrows():
-               try:
-                   # Get employee name
-                   emp_name = str(row_data.get('NAME', f'Employee {index}'))
-                  
-                   # Generate payslip content
-                   payslip = generate_payslip(row_data, current_sheet)
-                  
-                   # Show current payslip in UI
-                   self.payslip_preview.setText(payslip)
-                   QApplication.processEvents()  # Update UI
-                  
-                   # Add to the list of employees to process
-                   employee_data = {'name': emp_name, 'data': row_data, 'sheet': current_sheet}
-                   employees.append(employee_data)
-                  
-               except Exception as e:
-                   logger.error(f"Error preparing data for row {index}: {str(e)}")
-          
-           # Close the preparing dialog
-           if progress:
-               progress.close()
-               progress.deleteLater()
-               progress = None
-               QApplication.processEvents()
-          
-           # Define a content generator function
-           def content_generator(employee):
-               return generate_payslip(employee['data'], employee['sheet'])
+           employees = self._bulk_employees(current_sheet, skip_rows, rows)
           
            # Start PDF generation process with directory chooser
            if employees:
-               self.printer.generate_bulk_pdfs(employees, content_generator, ask_directory=True)
+               self.printer.generate_bulk_pdfs(employees, self._bulk_content_generator(), ask_directory=True)
                self.status_label.setText("Status: PDF generation started...")
            else:
                QMessageBox.warning(self, "Warning", "No data prepared for PDF generation")
               
        except Exception as e:
-           # Ensure dialog is closed even if an error occurs
-           if progress:
-               progress.close()
-               progress.deleteLater()
-               progress = None
-               QApplication.processEvents()
-          
            error_msg = f"Error in PDF generation: {str(e)}"
            logger.error(error_msg)
            QMessageBox.critical(self, "Error", error_msg)
 
 
+   def _bulk_employees(self, current_sheet, skip_rows=frozenset(), rows=None):
+       """Bulk job entries: employee name and row position only, no copied row data.
+
+       rows limits the job to those row positions; None means every row of the sheet.
+       """
+       if rows is None:
+           rows = range(len(self.current_df))
+       rows = [row for row in rows if row not in skip_rows]
+       name_position = self.current_schema.position('NAME')
+       if name_position is not None:
+           names = self.current_df.iloc[rows, name_position].astype(str).tolist()
+       else:
+           names = [f'Employee {row}' for row in rows]
+       return [{'name': name, 'row': row, 'sheet': current_sheet}
+               for name, row in zip(names, rows)]
+
+
+   def _job_rows(self):
+       """Rows a bulk job works on, from the scope chosen next to the bulk buttons.
+
+       Returns None for every row of the sheet, or a list of row positions;
+       an empty list (after telling the user why) means there is nothing to do.
+       """
+       scope = self.job_scope_combo.currentIndex()
+       if scope == JOB_SCOPE_SELECTED:
+           rows = self._selected_rows()
+           if not rows:
+               QMessageBox.warning(self, "Warning", "Please select the rows first")
+           return rows
+       if scope == JOB_SCOPE_FILTER:
+           from row_filter import filter_rows, FilterError
+           try:
+               rows = filter_rows(self.current_df, self.current_schema, self.filter_edit.text())
+           except FilterError as e:
+               QMessageBox.warning(self, "Warning", f"Cannot use the row filter: {e}")
+               return []
+           if not rows:
+               QMessageBox.warning(self, "Warning", "No rows match the filter")
+           return rows
+       return None
+
+
+   def on_job_scope_changed(self, scope):
+       word = {JOB_SCOPE_SELECTED: "Selected", JOB_SCOPE_FILTER: "Filtered"}.get(scope, "All")
+       self.generate_bulk_button.setText(f"Generate {word} Payslips & PDFs")
+       self.print_bulk_button.setText(f"Print {word} Payslips")
+       self.preview_bulk_button.setText(f"Preview {word} Payslips")
+
+
+   def on_filter_changed(self, text):
+       if not text.strip():
+           self.filter_label.clear()
+           return
+       self.job_scope_combo.setCurrentIndex(JOB_SCOPE_FILTER)
+       if self.current_df is None:
+           return
+       from row_filter import filter_rows, FilterError
+       try:
+           rows = filter_rows(self.current_df, self.current_schema, text)
+       except FilterError as e:
+           self.filter_label.setText(str(e))
+           return
+       self.filter_label.setText(f"{len(rows)} of {len(self.current_df)} rows match")
+
+
+   def _bulk_content_generator(self):
+       """Payslip renderer for bulk jobs, bound to the sheet that is loaded now"""
+       from sheet_loader import SheetRows
+       from slypGenarater import payslip_builder
+       rows = SheetRows(self.current_df)
+       build_payslip = payslip_builder(self.current_schema)
+
+       def content_generator(employee):
+           return build_payslip(rows.values(employee['row']))
+
+       return content_generator
+
+
    def print_selected_payslip(self):
        """Prints the currently selected payslip with B4 paper size"""
        if self.current_df is not None:
-           selected_items = self.data_table.selectedItems()
-           if selected_items:
-               row_index = selected_items[0].row()
+           selected_rows = self._selected_rows()
+           if selected_rows:
+               row_index = selected_rows[0]
                try:
+                   from slypGenarater import generate_payslip
                    # Get the row data as Series
                    row_data = self.current_df.iloc[row_index]
                   
@@ -430,7 +785,7 @@ class ExcelSheetViewer(QMainWindow):
                   
                    # Generate payslip with current sheet name
                    current_sheet = self.sheet_list.currentItem().text()
-                   payslip = generate_payslip(row_data, current_sheet)
+                   payslip = generate_payslip(row_data, current_sheet, self.current_schema)
                   
                    # Show the payslip in preview
                    self.payslip_preview.setText(payslip)
@@ -477,8 +832,12 @@ class ExcelSheetViewer(QMainWindow):
            return
           
        try:
+           rows = self._job_rows()
+           if rows == []:
+               return
+
            # Ask for confirmation before printing many payslips
-           total_rows = len(self.current_df)
+           total_rows = len(self.current_df) if rows is None else len(rows)
            confirm = QMessageBox.question(
                self,
                "Bulk Print Confirmation",
@@ -489,23 +848,19 @@ class ExcelSheetViewer(QMainWindow):
           
            if confirm == QMessageBox.No:
                return
+
+           skip_rows = self._run_preflight(rows)
+           if skip_rows is None:
+               return
           
            # Use the bulk printing method from print manager
            current_sheet = self.sheet_list.currentItem().text()
           
-           # Prepare employees data
-           employees = []
-           for index, row_data in self.current_df.iterrows():
-               emp_name = str(row_data.get('NAME', f'Employee {index}'))
-               employee_data = {'name': emp_name, 'data': row_data, 'sheet': current_sheet}
-               employees.append(employee_data)
-          
-           # Define content generator
-           def content_generator(employee):
-               return generate_payslip(employee['data'], employee['sheet'])
+           # Prepare employees data (row positions only)
+           employees = self._bulk_employees(current_sheet, skip_rows, rows)
           
            # Use the print manager's bulk printing method (only printing, no PDF)
-           if self.printer.print_bulk_payslips(employees, content_generator):
+           if self.printer.print_bulk_payslips(employees, self._bulk_content_generator()):
                self.status_label.setText("Status: Bulk printing completed successfully")
            else:
                self.status_label.setText("Status: Bulk printing was cancelled or failed")
@@ -517,16 +872,296 @@ class ExcelSheetViewer(QMainWindow):
            QMessageBox.critical(self, "Error", error_msg)
 
 
+   def preview_bulk_payslips(self):
+       """Page through the payslips a bulk print would send, then optionally print them"""
+       if self.current_df is None:
+           QMessageBox.warning(self, "Warning", "Please load a sheet first")
+           return
+       try:
+           rows = self._job_rows()
+           if rows == []:
+               return
+           current_sheet = self.sheet_list.currentItem().text()
+           employees = self._bulk_employees(current_sheet, rows=rows)
+           if self.printer.preview_bulk_payslips(employees, self._bulk_content_generator()):
+               self.print_bulk_payslips()
+       except Exception as e:
+           error_msg = f"Error in bulk preview: {str(e)}"
+           logger.error(error_msg)
+           logger.exception("Detailed error:")
+           QMessageBox.critical(self, "Error", error_msg)
+
+
+   def _run_preflight(self, rows=None):
+       """Validate the whole sheet before a bulk job starts rendering.
+
+       Only issues of the job's rows (all rows if rows is None) and of the sheet
+       as a whole are shown. Returns the set of row positions to skip, or None
+       if the job should not run.
+       """
+       from slypGenarater import get_compiled_layout
+       from preflight import validate_sheet, error_rows
+       from reconciliation import reconcile_sheet
+       layout = get_compiled_layout(self.current_schema)
+       issues = validate_sheet(self.current_df, self.current_schema, layout, self.coercion_issues)
+       if error_rows(issues) is not None:
+           # Totals that disagree with the line items are reported alongside, as warnings
+           issues += reconcile_sheet(self.current_df, self.current_schema, layout)
+           issues.sort(key=lambda issue: (issue['row'] is not None, issue['row'] or 0))
+       if rows is not None:
+           job_rows = set(rows)
+           issues = [issue for issue in issues if issue['row'] is None or issue['row'] in job_rows]
+       if not issues:
+           return set()
+
+       dialog = PreflightDialog(self, issues)
+       if dialog.exec_() != QDialog.Accepted:
+           self.status_label.setText("Status: Bulk job cancelled after pre-flight check")
+           return None
+       return error_rows(issues)
+
+
+   def compare_with_last_month(self):
+       """List who is new, who left and which figures moved since last month's sheet or history"""
+       if self.current_df is None or not self.current_schema.sheet_type:
+           QMessageBox.information(self, "Compare with Last Month", "Load a FIXED or FTC payroll sheet first.")
+           return
+       from PyQt5.QtWidgets import QInputDialog
+       from payroll_history import PayrollHistory, history_path, month_text
+       sheet_type = self.current_schema.sheet_type
+       months = []
+       if os.path.exists(history_path()):
+           try:
+               with PayrollHistory() as history:
+                   months = sorted({sheet['month'] for sheet in history.months()
+                                    if sheet['sheet_type'] == sheet_type}, reverse=True)
+           except Exception as e:
+               logger.error(f"Error reading payroll history: {e}")
+       sources = ["A sheet of last month's workbook..."] + [f"Payroll history: {month_text(month)}"
+                                                            for month in months]
+       choice, ok = QInputDialog.getItem(self, "Compare with Last Month", "Compare this sheet with:",
+                                         sources, 0, False)
+       if not ok:
+           return
+
+       from sheet_worker import PayrollDiffWorker
+       if choice == sources[0]:
+           file_name, _ = QFileDialog.getOpenFileName(
+               self, "Last Month's Workbook", "", "Excel Files (*.xlsx *.xls)"
+           )
+           if not file_name:
+               return
+           from payslip_lib import sheet_names
+           from sheet_loader import classify_sheet
+           names = sheet_names(file_name)
+           same_type = [i for i, name in enumerate(names) if classify_sheet(name, ()) == sheet_type]
+           sheet_name, ok = QInputDialog.getItem(self, "Compare with Last Month", "Last month's sheet:",
+                                                 names, same_type[0] if same_type else 0, False)
+           if not ok:
+               return
+           worker = PayrollDiffWorker(self.current_df, self.current_schema, file_name, sheet_name)
+           source = f"'{sheet_name}' of {os.path.basename(file_name)}"
+       else:
+           month = months[sources.index(choice) - 1]
+           worker = PayrollDiffWorker(self.current_df, self.current_schema, history_month=month)
+           source = f"the payroll history of {month_text(month)}"
+       worker.compared.connect(lambda changes: self.on_payroll_compared(changes, source))
+       worker.failed.connect(lambda message: QMessageBox.warning(
+           self, "Compare with Last Month", f"Could not compare: {message}"))
+       self.compare_button.setEnabled(False)
+       worker.finished.connect(lambda: self.compare_button.setEnabled(True))
+       self.status_label.setText(f"Status: Comparing with {source}...")
+       self._start_worker(worker)
+
+
+   def on_payroll_compared(self, changes, source):
+       self.status_label.setText(f"Status: Compared with {source}")
+       if self.diff_dialog is not None:
+           self.diff_dialog.close()
+       self.diff_dialog = PayrollDiffDialog(self, changes, source)
+       self.diff_dialog.show()
+
+
+   def select_table_row(self, row):
+       """Select a sheet row in the data table and scroll it into view"""
+       if 0 <= row < self.data_table.rowCount():
+           self.data_table.selectRow(row)
+           # By index, so rows whose cells are not filled in yet are found as well
+           self.data_table.scrollTo(self.data_table.model().index(row, 0), QTableWidget.PositionAtCenter)
+
+
+   def on_search_changed(self, text):
+       if self.employee_index is None:
+           return
+       self.search_matches = self.employee_index.search(text)
+       self.search_position = 0
+       if not text.strip():
+           self.search_label.clear()
+       elif not self.search_matches:
+           self.search_label.setText("No matches")
+       else:
+           self._show_search_match()
+
+
+   def next_search_match(self):
+       if self.search_matches:
+           self.search_position = (self.search_position + 1) % len(self.search_matches)
+           self._show_search_match()
+
+
+   def _show_search_match(self):
+       row = self.search_matches[self.search_position]
+       self.search_label.setText(f"{self.search_position + 1} of {len(self.search_matches)}")
+       self.select_table_row(row)
+       self.preview_row(row)
+
+
+   def preview_row(self, row):
+       """Show the payslip of a sheet row in the preview area"""
+       from slypGenarater import generate_payslip
+       try:
+           payslip = generate_payslip(self.current_df.iloc[row], self.current_schema.sheet_name,
+                                      self.current_schema)
+       except Exception as e:
+           logger.error(f"Error previewing payslip: {e}")
+           self.payslip_preview.setText(f"Cannot preview this row: {e}")
+           return
+       self.payslip_preview.setText(payslip)
+
+
    def show_config_dialog(self):
-       dialog = ConfigDialog(self, self.current_headers)
+       dialog = ConfigDialog(self, self.current_headers, self.current_df, self.current_schema)
        dialog.exec_()
+       # Cached sheets were converted with the old mappings
+       self.cancel_preload()
+       self.sheet_cache.clear()
+       if self.current_schema is not None and self.current_schema.is_subset:
+           # Newly mapped columns may not be loaded yet
+           self.show_sheet_data(self.current_schema.sheet_name)
+       # Columns mapped in the dialog need the same numeric conversion as at load time
+       elif self.current_df is not None and self.current_schema.sheet_type:
+           from sheet_loader import coerce_numeric_columns
+           from slypGenarater import payslip_numeric_positions
+           self.coercion_issues = coerce_numeric_columns(
+               self.current_df, payslip_numeric_positions(self.current_schema))
+
+
+class PreflightDialog(QDialog):
+    """Lists pre-flight issues before a bulk job; clicking an issue jumps to its row"""
+    def __init__(self, viewer, issues):
+        super().__init__(viewer)
+        from preflight import error_rows, ERROR
+        self.viewer = viewer
+        self.setWindowTitle("Pre-flight Check")
+        self.setMinimumSize(520, 400)
+        layout = QVBoxLayout()
+
+        skip_rows = error_rows(issues)
+        errors = sum(1 for issue in issues if issue['severity'] == ERROR)
+        if skip_rows is None:
+            summary = "The sheet cannot be used for payslips until these problems are fixed."
+        else:
+            summary = (f"Found {errors} errors and {len(issues) - errors} warnings.\n"
+                       f"{len(skip_rows)} rows with errors will be skipped if you continue.")
+        layout.addWidget(QLabel(summary))
+
+        self.issue_list = QListWidget()
+        for issue in issues:
+            where = f"Row {issue['row'] + 1}" if issue['row'] is not None else "Sheet"
+            item = QListWidgetItem(f"{issue['severity'].title()} - {where}: {issue['message']}")
+            item.setData(Qt.UserRole, issue['row'])
+            if issue['severity'] == ERROR:
+                item.setForeground(Qt.red)
+            self.issue_list.addItem(item)
+        self.issue_list.itemClicked.connect(self.on_issue_clicked)
+        layout.addWidget(self.issue_list)
+        layout.addWidget(QLabel("Click an issue to show its row in the sheet."))
+
+        button_layout = QHBoxLayout()
+        if skip_rows is not None:
+            continue_button = QPushButton("Continue")
+            continue_button.clicked.connect(self.accept)
+            button_layout.addWidget(continue_button)
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def on_issue_clicked(self, item):
+        row = item.data(Qt.UserRole)
+        if row is not None:
+            self.viewer.select_table_row(row)
+
+
+class PayrollDiffDialog(QDialog):
+    """Lists the changes since last month; clicking a change jumps to its row"""
+    KINDS = [("All changes", None), ("New employees", ('added',)), ("Left", ('removed',)),
+             ("Changed figures", ('changed',)), ("New or gone columns", ('new column', 'gone column'))]
+
+    def __init__(self, viewer, changes, source):
+        super().__init__(viewer)
+        from payroll_diff import summary, ADDED, REMOVED, CHANGED, NEW_COLUMN, GONE_COLUMN
+        self.viewer = viewer
+        self.changes = changes
+        self.setWindowTitle("Changes Since Last Month")
+        self.setMinimumSize(560, 420)
+        layout = QVBoxLayout()
+
+        counts = summary(changes)
+        layout.addWidget(QLabel(
+            f"Compared with {source}:\n"
+            f"{counts[ADDED]} new employees, {counts[REMOVED]} left, {counts[CHANGED]} with changed figures, "
+            f"{counts[NEW_COLUMN] + counts[GONE_COLUMN]} new or gone columns."))
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Show:"))
+        self.kind_combo = QComboBox()
+        self.kind_combo.addItems([label for label, _ in self.KINDS])
+        self.kind_combo.currentIndexChanged.connect(self.show_changes)
+        filter_layout.addWidget(self.kind_combo)
+        filter_layout.addStretch()
+        layout.addLayout(filter_layout)
+
+        self.change_list = QListWidget()
+        self.change_list.setUniformItemSizes(True)
+        self.change_list.itemClicked.connect(self.on_change_clicked)
+        layout.addWidget(self.change_list)
+        layout.addWidget(QLabel("Click a change to show its row and payslip."))
+
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.close)
+        layout.addWidget(close_button)
+        self.setLayout(layout)
+        self.show_changes()
+
+    def show_changes(self):
+        from payroll_diff import describe
+        kinds = self.KINDS[self.kind_combo.currentIndex()][1]
+        self.change_list.clear()
+        for change in self.changes:
+            if kinds is not None and change['kind'] not in kinds:
+                continue
+            item = QListWidgetItem(describe(change))
+            item.setData(Qt.UserRole, change['row'])
+            self.change_list.addItem(item)
+
+    def on_change_clicked(self, item):
+        row = item.data(Qt.UserRole)
+        if row is not None:
+            self.viewer.select_table_row(row)
+            self.viewer.preview_row(row)
 
 
 class ConfigDialog(QDialog):
-    def __init__(self, parent=None, headers=None):
+    def __init__(self, parent=None, headers=None, df=None, schema=None):
         super().__init__(parent)
         self.config = PayslipConfig()
         self.headers = headers or []
+        # The loaded sheet, to preview which payslips a mapping change affects
+        self.df = df
+        self.schema = schema
         self.setup_ui()
 
     def setup_ui(self):
@@ -537,8 +1172,9 @@ class ConfigDialog(QDialog):
 
 
         # Sheet type selector
+        from payslip_layout import LAYOUTS
         self.sheet_type = QComboBox()
-        self.sheet_type.addItems(['FIXED', 'FTC'])
+        self.sheet_type.addItems(list(LAYOUTS))
         self.sheet_type.currentTextChanged.connect(self.update_mappings_list)
         layout.addWidget(QLabel("Sheet Type:"))
         layout.addWidget(self.sheet_type)
@@ -627,6 +1263,11 @@ class ConfigDialog(QDialog):
         self.cancel_edit_button.hide()
         button_layout.addWidget(self.cancel_edit_button)
 
+        # Preview impact on the loaded sheet without saving
+        preview_button = QPushButton("Preview Impact")
+        preview_button.clicked.connect(self.preview_impact)
+        button_layout.addWidget(preview_button)
+
         # Remove mapping button
         remove_button = QPushButton("Remove Selected")
         remove_button.clicked.connect(self.remove_mapping)
@@ -713,6 +1354,12 @@ class ConfigDialog(QDialog):
                 sheet_type = self.sheet_type.currentText()
                 mapping_type = self.mapping_type.currentText()
                 
+                # What removing it changes on the loaded sheet's payslips
+                from mapping_impact import edited_mappings
+                result = self.impact_of(sheet_type, edited_mappings(
+                    self.config.get_mappings(sheet_type), mapping_type, display_name, None))
+                impact_text = f"\n\n{result[1][0]}" if result is not None else ""
+                
                 # Check if we're trying to remove the mapping being edited
                 if (self.editing_mapping and 
                     self.editing_mapping['display_name'] == display_name and
@@ -721,7 +1368,7 @@ class ConfigDialog(QDialog):
                     
                     reply = QMessageBox.question(self, "Remove Edited Mapping", 
                                                f"You are currently editing '{display_name}'.\n"
-                                               f"Do you want to remove it instead?",
+                                               f"Do you want to remove it instead?{impact_text}",
                                                QMessageBox.Yes | QMessageBox.No, 
                                                QMessageBox.No)
                     if reply == QMessageBox.No:
@@ -732,7 +1379,8 @@ class ConfigDialog(QDialog):
                 else:
                     # Normal confirmation for non-edited mappings
                     reply = QMessageBox.question(self, "Confirm Removal", 
-                                               f"Are you sure you want to remove the mapping '{display_name}'?",
+                                               f"Are you sure you want to remove the mapping '{display_name}'?"
+                                               f"{impact_text}",
                                                QMessageBox.Yes | QMessageBox.No, 
                                                QMessageBox.No)
                     
@@ -830,8 +1478,8 @@ class ConfigDialog(QDialog):
         # Clear selection
         self.mappings_list.clearSelection()
 
-    def add_or_update_mapping(self):
-        """Add new mapping or update existing one based on current mode"""
+    def mapping_input(self):
+        """(sheet_type, mapping_type, display name, excel header) from the inputs, or None after a warning"""
         mapping_format = self.mapping_format.currentText()
         sheet_type = self.sheet_type.currentText()
         mapping_type = self.mapping_type.currentText()
@@ -844,14 +1492,79 @@ class ConfigDialog(QDialog):
             if not (dn1 and col1 and col2):
                 QMessageBox.warning(self, "Incomplete Data", 
                                   "Please fill in display name and both column names for double column mapping.")
-                return
+                return None
             excel_header = [col1, col2]
         else:
             if not (dn1 and col1):
                 QMessageBox.warning(self, "Incomplete Data", 
                                   "Please fill in display name and column name for single column mapping.")
-                return
+                return None
             excel_header = col1
+        return sheet_type, mapping_type, dn1, excel_header
+
+    def edited_mappings(self, sheet_type, mapping_type, display_name, excel_header):
+        """The sheet type's mappings as they would be saved from the inputs; excel_header None removes"""
+        from mapping_impact import edited_mappings
+        mappings = self.config.get_mappings(sheet_type)
+        old_display_name = None
+        if self.editing_mapping and self.editing_mapping['sheet_type'] == sheet_type:
+            if self.editing_mapping['mapping_type'] == mapping_type:
+                old_display_name = self.editing_mapping['display_name']
+            elif excel_header is not None:
+                # Moved from earnings to deductions or back
+                mappings = edited_mappings(mappings, self.editing_mapping['mapping_type'],
+                                           self.editing_mapping['display_name'], None)
+        return edited_mappings(mappings, mapping_type, display_name, excel_header, old_display_name)
+
+    def impact_of(self, sheet_type, new_mappings):
+        """(impact, (summary, details)) of saving new_mappings, for the loaded sheet; None if none of the type is loaded"""
+        if self.df is None or self.schema is None or self.schema.sheet_type != sheet_type:
+            return None
+        from mapping_impact import mapping_impact, describe_impact
+        started = time.perf_counter()
+        impact = mapping_impact(self.df, self.schema, self.config.get_mappings(sheet_type), new_mappings, sheet_type)
+        logger.info(f"Mapping impact computed in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return impact, describe_impact(impact)
+
+    def preview_impact(self):
+        """Show which payslips of the loaded sheet the mapping in the inputs changes, without saving it"""
+        inputs = self.mapping_input()
+        if inputs is None:
+            return
+        result = self.impact_of(inputs[0], self.edited_mappings(*inputs))
+        if result is None:
+            QMessageBox.information(self, "Preview Impact",
+                                    f"Load a {inputs[0]} sheet to preview which payslips change.")
+            return
+        _, (summary, details) = result
+        box = QMessageBox(QMessageBox.Information, "Preview Impact", summary, QMessageBox.Ok, self)
+        if details:
+            box.setDetailedText(details)
+        box.exec_()
+
+    def confirm_impact(self, sheet_type, new_mappings):
+        """Show what saving new_mappings changes on the loaded sheet's payslips; False if the user cancels"""
+        result = self.impact_of(sheet_type, new_mappings)
+        if result is None:
+            return True
+        impact, (summary, details) = result
+        if not impact['items'] and not impact['notes']:
+            return True
+        box = QMessageBox(QMessageBox.Question, "Mapping Impact", f"{summary}\n\nSave this change?",
+                          QMessageBox.Save | QMessageBox.Cancel, self)
+        box.setDefaultButton(QMessageBox.Save)
+        if details:
+            box.setDetailedText(details)
+        return box.exec_() == QMessageBox.Save
+
+    def add_or_update_mapping(self):
+        """Add new mapping or update existing one based on current mode"""
+        inputs = self.mapping_input()
+        if inputs is None:
+            return
+        sheet_type, mapping_type, dn1, excel_header = inputs
+        if not self.confirm_impact(sheet_type, self.edited_mappings(*inputs)):
+            return
         
         if self.editing_mapping:
             # Update existing mapping
@@ -890,10 +1603,31 @@ class ConfigDialog(QDialog):
         # Update the list to show changes
         self.update_mappings_list()
 
+def report_startup(window_built):
+   """Log how long startup took, once the event loop has shown the window"""
+   shown = time.perf_counter()
+   timings = {
+       'imports': (_IMPORTED - _STARTED) * 1000,
+       'window built': (window_built - _IMPORTED) * 1000,
+       'first window shown': (shown - _STARTED) * 1000,
+   }
+   report = ", ".join(f"{name} {ms:.0f} ms" for name, ms in timings.items())
+   if timings['first window shown'] > STARTUP_BUDGET_MS:
+       logger.warning(f"Slow startup: {report} (budget {STARTUP_BUDGET_MS} ms)")
+   else:
+       logger.info(f"Startup: {report}")
+   return timings
+
+
 def main():
-   app = QApplication(sys.argv)
+   from profiling import configure
+   # --profile[=DIR] (or PAYSLIP_PROFILE) writes a profile of every bulk and print job
+   app = QApplication(configure(sys.argv))
    window = ExcelSheetViewer()
+   window_built = time.perf_counter()
    window.show()
+   # Runs as soon as the event loop is idle, i.e. after the window is painted
+   QTimer.singleShot(0, lambda: report_startup(window_built))
    sys.exit(app.exec_())
 
 
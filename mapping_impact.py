@@ -0,0 +1,164 @@
+"""Impact of a mapping change on the payslips of the loaded sheet.
+
+Compiles the sheet's layout with the current and with the edited mappings
+and compares, item by item and column-wise over all rows, whether each
+earnings/deductions line is printed and with which amounts. Nothing is
+rendered except the sample lines, so even large sheets are checked in a
+fraction of a second before the change is saved.
+"""
+import copy
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('MappingImpact')
+
+# Before/after examples shown per kind of change
+SAMPLE_LINES = 3
+
+
+def edited_mappings(mappings, mapping_type, display_name, excel_header, old_display_name=None):
+    """A copy of one sheet type's mappings with an item added or changed, as PayslipConfig.add_mapping
+    would save it. old_display_name is the item being replaced; excel_header None removes display_name."""
+    mappings = copy.deepcopy(mappings)
+    items = mappings.setdefault(mapping_type, {})
+    if excel_header is None:
+        items.pop(display_name, None)
+        return mappings
+    if isinstance(excel_header, str) and ',' in excel_header:
+        excel_header = [h.strip() for h in excel_header.split(',', 1)]
+    if isinstance(display_name, str) and ',' in display_name:
+        display_name = str([d.strip() for d in display_name.split(',', 1)])
+    if old_display_name is not None and old_display_name != display_name:
+        items.pop(old_display_name, None)
+    items[display_name] = excel_header
+    return mappings
+
+
+def _amounts(column):
+    """A column as float64, with NaN where the payslip would print nothing"""
+    if isinstance(column.dtype, pd.SparseDtype):
+        column = column.sparse.to_dense()
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype(object)
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+
+class _Lines:
+    """The printed lines of one layout's items over all rows, computed column-wise."""
+
+    def __init__(self, df, items):
+        self.items = {}
+        zeros = np.zeros(len(df))
+        for label, value_format, sources in items:
+            amounts = [zeros if position is None else _amounts(df.iloc[:, position]) for position in sources]
+            # As payslip_layout.shows_amount, for every row at once: a float prints as
+            # something other than 0.00 exactly when its magnitude is at least the float 0.005
+            shown = np.zeros(len(df), dtype=bool)
+            for values in amounts:
+                with np.errstate(invalid='ignore'):
+                    shown |= np.isfinite(values) & (np.abs(values) >= 0.005)
+            self.items[label.strip()] = (label, value_format, amounts, shown)
+
+    def line(self, name, row):
+        label, value_format, amounts, _ = self.items[name]
+        return label + value_format(*[values[row] for values in amounts])
+
+
+def mapping_impact(df, schema, old_mappings, new_mappings, sheet_type=None):
+    """Compare the payslip lines of a loaded sheet under two sets of mappings of its sheet type.
+
+    Returns:
+        Dict with 'employees' (rows), 'gain', 'lose' and 'change' (employees
+        gaining, losing or getting a different earnings/deductions line),
+        'items' (per line label: gain, lose, change), 'samples' (dicts with
+        'kind', 'row', 'before' and 'after' lines) and 'notes' (columns of
+        added or changed items that the sheet lacks or that were not loaded).
+    """
+    from payslip_layout import compile_layout
+    from sheet_loader import normalize_header
+    sheet_type = sheet_type or schema.sheet_type
+    old = compile_layout(schema, old_mappings, '', sheet_type)
+    new = compile_layout(schema, new_mappings, '', sheet_type)
+    rows = len(df)
+
+    notes = []
+    sheet_headers = {normalize_header(header) for header in schema.sheet_columns}
+    for mapping_type in ('earnings', 'deductions'):
+        unchanged = old_mappings.get(mapping_type, {})
+        for display_name, excel_header in new_mappings.get(mapping_type, {}).items():
+            if unchanged.get(display_name) == excel_header:
+                continue
+            headers = excel_header if isinstance(excel_header, (list, tuple)) else [excel_header]
+            for header in headers:
+                if header in ('next_column', 'prev_column') or schema.has(header):
+                    continue
+                if normalize_header(header) in sheet_headers:
+                    notes.append(f"'{header}' ({display_name}) is not loaded; untick \"Load payslip columns only\" "
+                                 f"to include it")
+                else:
+                    notes.append(f"'{header}' ({display_name}) is not a column of this sheet; the line is not printed")
+
+    impact = {'employees': rows, 'items': {}, 'samples': [], 'notes': notes}
+    affected = {'gain': np.zeros(rows, dtype=bool), 'lose': np.zeros(rows, dtype=bool),
+                'change': np.zeros(rows, dtype=bool)}
+    for before_items, after_items in ((old.earnings, new.earnings), (old.deductions, new.deductions)):
+        before = _Lines(df, before_items)
+        after = _Lines(df, after_items)
+        for name in list(before.items) + [name for name in after.items if name not in before.items]:
+            no_line = np.zeros(rows, dtype=bool)
+            shown_before = before.items[name][3] if name in before.items else no_line
+            shown_after = after.items[name][3] if name in after.items else no_line
+            gain = ~shown_before & shown_after
+            lose = shown_before & ~shown_after
+            change = np.zeros(rows, dtype=bool)
+            if name in before.items and name in after.items:
+                label_before, format_before, amounts_before, _ = before.items[name]
+                label_after, format_after, amounts_after, _ = after.items[name]
+                both = shown_before & shown_after
+                if label_before != label_after or len(amounts_before) != len(amounts_after):
+                    change = both
+                else:
+                    for values_before, values_after in zip(amounts_before, amounts_after):
+                        with np.errstate(invalid='ignore'):
+                            differs = np.round(values_before, 2) != np.round(values_after, 2)
+                        change |= both & differs & ~(np.isnan(values_before) & np.isnan(values_after))
+            counts = {'gain': int(gain.sum()), 'lose': int(lose.sum()), 'change': int(change.sum())}
+            if not any(counts.values()):
+                continue
+            impact['items'][name] = counts
+            for kind, mask in (('gain', gain), ('lose', lose), ('change', change)):
+                affected[kind] |= mask
+                taken = sum(1 for sample in impact['samples'] if sample['kind'] == kind)
+                for row in np.flatnonzero(mask)[:max(0, SAMPLE_LINES - taken)]:
+                    impact['samples'].append({
+                        'kind': kind, 'row': int(row),
+                        'before': before.line(name, row) if kind != 'gain' else '',
+                        'after': after.line(name, row) if kind != 'lose' else ''})
+    for kind, mask in affected.items():
+        impact[kind] = int(mask.sum())
+    logger.info(f"Mapping impact on '{schema.sheet_name}': {impact['gain']} gain, {impact['lose']} lose, "
+                f"{impact['change']} change a line of {rows} employees")
+    return impact
+
+
+def describe_impact(impact):
+    """(summary, details) texts of a mapping_impact result"""
+    summary = (f"Of {impact['employees']} employees on the loaded sheet, "
+               f"{impact['gain']} gain a line, {impact['lose']} lose a line and "
+               f"{impact['change']} get a line with different amounts.")
+    if not impact['items']:
+        summary = f"No payslip of the {impact['employees']} employees on the loaded sheet changes."
+    details = []
+    for name, counts in impact['items'].items():
+        details.append(f"{name}: {counts['gain']} gain, {counts['lose']} lose, {counts['change']} change")
+    if impact['samples']:
+        details.append("")
+    for sample in impact['samples']:
+        details.append(f"Row {sample['row'] + 1} ({sample['kind']}):")
+        details.append(f"  before: {sample['before'] or '(no line)'}")
+        details.append(f"  after:  {sample['after'] or '(no line)'}")
+    if impact['notes']:
+        details.append("")
+    details += impact['notes']
+    return summary, '\n'.join(details)
@@ -0,0 +1,253 @@
+"""Month-over-month payroll diff.
+
+Joins this month's sheet with the previous month's, from another workbook or
+from the payroll history (payroll_history.py), on EMP NO and lists who is
+new, who has left, and which payslip figures moved by more than a threshold.
+
+    python payroll_diff.py payroll_may.xlsx "FIXED MAY" --previous payroll_april.xlsx ["FIXED APRIL"]
+    python payroll_diff.py payroll_may.xlsx "FIXED MAY" --history 2025-04
+                           [--percent 20] [--min-amount 1000]
+"""
+import os
+import sys
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('PayrollDiff')
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+NEW_COLUMN = 'new column'
+GONE_COLUMN = 'gone column'
+
+# A figure has changed when it moved by at least this many percent of last month's value...
+DIFF_PERCENT = 20.0
+
+# ...and by at least this amount, so small figures moving a lot are not reported
+DIFF_MIN_AMOUNT = 1000.0
+
+
+def _change(kind, message, row=None, emp_no=None, column=None, previous=None, current=None):
+    """Build a change record. row is the current sheet's row position, or None (sheet-wide or left)."""
+    return {'kind': kind, 'row': row, 'emp_no': emp_no, 'column': column,
+            'previous': previous, 'current': current, 'message': message}
+
+
+def _numbers(column):
+    """A column as float64, blanks and text as 0"""
+    if isinstance(column.dtype, pd.SparseDtype):
+        column = column.sparse.to_dense()
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype(object)
+    values = pd.to_numeric(column, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    return np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def sheet_figures(df, schema):
+    """A sheet's payslip figures by employee.
+
+    Returns a DataFrame indexed by EMP NO (as payroll_history.emp_key gives
+    it) with one float column per figure (normalized header), and 'row' (the
+    first row of the EMP NO) and 'name'. Rows repeating an EMP NO are added
+    together; rows without one are left out.
+    """
+    from payroll_history import figure_columns, emp_key
+    emp_position = schema.position('EMP NO')
+    if emp_position is None:
+        raise ValueError(f"'{schema.sheet_name}' has no EMP NO column")
+    frame = pd.DataFrame({header: _numbers(df.iloc[:, position]) for header, position in figure_columns(schema)},
+                         index=pd.RangeIndex(len(df)))
+    frame['row'] = np.arange(len(df))
+    name_position = schema.position('NAME')
+    frame['name'] = df.iloc[:, name_position].astype(object).to_numpy() if name_position is not None else None
+    frame['emp_no'] = pd.Series(df.iloc[:, emp_position].to_numpy(dtype=object)).map(emp_key).to_numpy()
+    frame = frame[frame['emp_no'].notna()]
+    if frame['emp_no'].duplicated().any():
+        figures = [column for column in frame.columns if column not in ('row', 'name', 'emp_no')]
+        aggregations = dict.fromkeys(figures, 'sum')
+        aggregations.update(row='first', name='first')
+        return frame.groupby('emp_no', sort=False).agg(aggregations)
+    return frame.set_index('emp_no')
+
+
+def history_figures(month, sheet_type=None, history=None):
+    """The payslip figures stored for a month in the payroll history, shaped like sheet_figures ('row' is -1)."""
+    from payroll_history import PayrollHistory, month_key
+    month = month_key(month)
+    own = history is None
+    history = history or PayrollHistory()
+    try:
+        query = ("SELECT a.emp_no, a.header, a.value FROM amounts a JOIN sheets s ON s.id = a.sheet_id "
+                 "WHERE s.month = ?")
+        names_query = ("SELECT e.emp_no, e.name FROM employees e JOIN sheets s ON s.id = e.sheet_id "
+                       "WHERE s.month = ?")
+        parameters = [month]
+        if sheet_type:
+            query += " AND s.sheet_type = ?"
+            names_query += " AND s.sheet_type = ?"
+            parameters.append(sheet_type)
+        amounts = pd.read_sql_query(query, history.connection, params=parameters)
+        names = pd.read_sql_query(names_query, history.connection, params=parameters)
+    finally:
+        if own:
+            history.close()
+    if names.empty:
+        raise ValueError(f"The payroll history has no {sheet_type or 'payroll'} sheets for {month}")
+    frame = amounts.pivot_table(index='emp_no', columns='header', values='value', aggfunc='sum', fill_value=0.0)
+    frame.columns.name = None
+    names = names.drop_duplicates('emp_no').set_index('emp_no')['name']
+    frame = frame.reindex(names.index, fill_value=0.0)
+    frame['row'] = -1
+    frame['name'] = names
+    return frame
+
+
+def _format(value):
+    return f"{value:,.2f}"
+
+
+def diff_figures(current, previous, percent=DIFF_PERCENT, min_amount=DIFF_MIN_AMOUNT):
+    """Compare two sheet_figures frames.
+
+    Uses one outer merge on EMP NO and column-wise comparisons, so 10,000
+    employees are compared in a fraction of a second.
+
+    Returns:
+        List of change dicts with 'kind' (added, removed, changed, new column,
+        gone column), 'row' (current sheet row, or None), 'emp_no', 'column',
+        'previous', 'current' and 'message'; sheet-wide changes first, then by
+        row, then the employees who left.
+    """
+    info = ['row', 'name']
+    current_headers = [column for column in current.columns if column not in info]
+    previous_headers = [column for column in previous.columns if column not in info]
+    headers = current_headers + [header for header in previous_headers if header not in current_headers]
+    current = current.reindex(columns=headers + info, fill_value=0.0)
+    previous = previous.reindex(columns=headers + info, fill_value=0.0)
+
+    changes = []
+    for header in headers:
+        paid_now = bool((current[header] != 0).any())
+        paid_before = bool((previous[header] != 0).any())
+        if paid_now and not paid_before:
+            count = int((current[header] != 0).sum())
+            changes.append(_change(NEW_COLUMN, f"{header} is paid or deducted this month but was not last month "
+                                               f"({count} employees)", column=header))
+        elif paid_before and not paid_now:
+            count = int((previous[header] != 0).sum())
+            changes.append(_change(GONE_COLUMN, f"{header} was paid or deducted last month "
+                                                f"({count} employees) but is not this month", column=header))
+
+    merged = current.merge(previous, how='outer', left_index=True, right_index=True,
+                           suffixes=('', '_previous'), indicator=True)
+    where = merged['_merge'].to_numpy()
+    rows = merged['row'].to_numpy()
+    emp_nos = merged.index.to_numpy()
+
+    added = np.flatnonzero(where == 'left_only')
+    names = merged['name'].to_numpy()
+    for i in added:
+        changes.append(_change(ADDED, f"New this month: EMP NO {emp_nos[i]} {names[i]}", int(rows[i]), emp_nos[i]))
+
+    both = np.flatnonzero(where == 'both')
+    for header in headers:
+        now = merged[header].to_numpy()[both]
+        before = merged[f"{header}_previous"].to_numpy()[both]
+        delta = now - before
+        moved = (np.abs(delta) >= min_amount) & \
+            ((before == 0) | (np.abs(delta) >= np.abs(before) * (percent / 100)))
+        for i, was, value, change in zip(both[moved], before[moved], now[moved], delta[moved]):
+            share = f" ({change / abs(was):+.0%})" if was else ''
+            changes.append(_change(CHANGED, f"{header} {_format(was)} -> {_format(value)}{share}",
+                                   int(rows[i]), emp_nos[i], header, float(was), float(value)))
+
+    left_names = merged['name_previous'].to_numpy()
+    for i in np.flatnonzero(where == 'right_only'):
+        changes.append(_change(REMOVED, f"Not on this month's sheet: EMP NO {emp_nos[i]} {left_names[i]}",
+                               None, emp_nos[i]))
+
+    changes.sort(key=lambda change: (change['kind'] != NEW_COLUMN and change['kind'] != GONE_COLUMN,
+                                     change['row'] is None, change['row'] or 0))
+    logger.info(f"Payroll diff: {len(added)} new, {int((where == 'right_only').sum())} left, "
+                f"{sum(1 for change in changes if change['kind'] == CHANGED)} changed figures")
+    return changes
+
+
+def diff_sheets(df, schema, previous, percent=DIFF_PERCENT, min_amount=DIFF_MIN_AMOUNT):
+    """Compare a loaded sheet with previous figures (sheet_figures or history_figures); see diff_figures."""
+    return diff_figures(sheet_figures(df, schema), previous, percent, min_amount)
+
+
+def describe(change):
+    """One line for a change, e.g. 'Row 12 - EMP NO 1010: NORMAL OT 1,927.94 -> 6,927.94 (+259%)'"""
+    if change['row'] is not None:
+        where = f"Row {change['row'] + 1}"
+    else:
+        where = "Sheet" if change['emp_no'] is None else "Left"
+    who = f"EMP NO {change['emp_no']}: " if change['kind'] == CHANGED else ''
+    return f"{where} - {who}{change['message']}"
+
+
+def summary(changes):
+    """Counts by kind, e.g. {'added': 3, 'removed': 1, 'changed': 12}; changed counts employees."""
+    counts = {ADDED: 0, REMOVED: 0, CHANGED: 0, NEW_COLUMN: 0, GONE_COLUMN: 0}
+    changed = set()
+    for change in changes:
+        if change['kind'] == CHANGED:
+            changed.add(change['emp_no'])
+        else:
+            counts[change['kind']] += 1
+    counts[CHANGED] = len(changed)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List employees and payslip figures that changed since last month.")
+    parser.add_argument('workbook', help="this month's workbook")
+    parser.add_argument('sheet', help="this month's sheet")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--previous', nargs='+', metavar=('WORKBOOK', 'SHEET'),
+                        help="last month's workbook and sheet (default: the sheet of the same type)")
+    source.add_argument('--history', metavar='YYYY-MM', help="last month from the payroll history")
+    parser.add_argument('--percent', type=float, default=DIFF_PERCENT,
+                        help=f"report figures moving by at least this percent (default {DIFF_PERCENT:g})")
+    parser.add_argument('--min-amount', type=float, default=DIFF_MIN_AMOUNT,
+                        help=f"...and by at least this amount (default {DIFF_MIN_AMOUNT:g})")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    workbook = os.path.abspath(args.workbook)
+    previous_workbook = os.path.abspath(args.previous[0]) if args.previous else None
+    # payslip_config.json is read from the working directory, as the application does
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    from payslip_lib import load_sheet, sheet_names
+    sheet = load_sheet(workbook, args.sheet)
+    if args.history:
+        previous = history_figures(args.history, sheet.sheet_type)
+    else:
+        if len(args.previous) > 1:
+            previous_sheet = load_sheet(previous_workbook, args.previous[1])
+        else:
+            from sheet_loader import detect_sheet_schema
+            matches = [name for name in sheet_names(previous_workbook)
+                       if detect_sheet_schema(previous_workbook, name).sheet_type == sheet.sheet_type]
+            if not matches:
+                print(f"{previous_workbook} has no {sheet.sheet_type} sheet")
+                return 1
+            previous_sheet = load_sheet(previous_workbook, matches[0])
+        previous = sheet_figures(previous_sheet.df, previous_sheet.schema)
+
+    changes = diff_sheets(sheet.df, sheet.schema, previous, args.percent, args.min_amount)
+    for change in changes:
+        print(describe(change))
+    counts = summary(changes)
+    print(f"{counts[ADDED]} new, {counts[REMOVED]} left, {counts[CHANGED]} employees with changed figures, "
+          f"{counts[NEW_COLUMN]} new and {counts[GONE_COLUMN]} gone columns")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
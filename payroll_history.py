@@ -0,0 +1,466 @@
+"""Payroll history: every processed payroll sheet, kept in one SQLite database.
+
+Ingesting a sheet stores its month and sheet type and, for each EMP NO,
+the figures of the columns the payslip reads as numbers (the mapped
+earnings and deductions with their hours columns, and the totals). Year-to-
+date totals and questions over several months are then answered from the
+database instead of reopening old workbooks:
+
+    python payroll_history.py ingest payroll.xlsx [--month 2025-04] [--sheet "FIXED APRIL"]
+    python payroll_history.py employee 1001 [--column "NORMAL OT"] [--from 2024-11] [--to 2025-04]
+    python payroll_history.py column "NORMAL OT" [--from 2024-11] [--to 2025-04]
+    python payroll_history.py ytd 1001 [--month 2025-04] [--sheet-type FIXED]
+    python payroll_history.py months
+    python payroll_history.py payslip-ytd on|off
+
+Ingesting a month and sheet again replaces what was stored for it.
+"""
+import os
+import sys
+import math
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+from functools import lru_cache
+
+logger = logging.getLogger('PayrollHistory')
+
+# Set to a database file to keep the history somewhere other than ~/Payslips
+HISTORY_ENV = 'PAYSLIP_HISTORY'
+
+# Month the year-to-date figures start from: the year of assessment starts in April
+YEAR_START_MONTH = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheets (
+    id INTEGER PRIMARY KEY,
+    month TEXT NOT NULL,
+    sheet_type TEXT NOT NULL,
+    sheet_name TEXT NOT NULL,
+    workbook TEXT NOT NULL,
+    ingested_at TEXT NOT NULL,
+    employees INTEGER NOT NULL,
+    UNIQUE (month, sheet_type, sheet_name)
+);
+CREATE TABLE IF NOT EXISTS employees (
+    sheet_id INTEGER NOT NULL,
+    emp_no TEXT NOT NULL,
+    name TEXT,
+    PRIMARY KEY (emp_no, sheet_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS amounts (
+    sheet_id INTEGER NOT NULL,
+    emp_no TEXT NOT NULL,
+    header TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (emp_no, header, sheet_id)
+) WITHOUT ROWID;
+-- Covers the column and year-to-date queries, which then never read the table
+CREATE INDEX IF NOT EXISTS amounts_by_header ON amounts (header, sheet_id, value);
+CREATE INDEX IF NOT EXISTS sheets_by_month ON sheets (month);
+"""
+
+
+def history_path():
+    """The history database file: $PAYSLIP_HISTORY, or Payslips/payroll_history.sqlite at home."""
+    return os.environ.get(HISTORY_ENV) or os.path.join(
+        os.path.expanduser("~"), "Payslips", "payroll_history.sqlite")
+
+
+def month_key(month):
+    """'YYYY-MM' of a month given as '2025-04' or as the payslips print it, 'APRIL 2025'."""
+    month = ' '.join(str(month).split())
+    for pattern in ('%Y-%m', '%B %Y', '%b %Y'):
+        try:
+            return datetime.strptime(month, pattern).strftime('%Y-%m')
+        except ValueError:
+            continue
+    raise ValueError(f"Not a month: '{month}' (use YYYY-MM, e.g. 2025-04)")
+
+
+def month_text(key):
+    """'APRIL 2025' of a 'YYYY-MM' month"""
+    return datetime.strptime(key, '%Y-%m').strftime('%B %Y').upper()
+
+
+def year_start(key):
+    """First month of the payroll year holding the month"""
+    year, month = map(int, key.split('-'))
+    if month < YEAR_START_MONTH:
+        year -= 1
+    return f"{year:04d}-{YEAR_START_MONTH:02d}"
+
+
+def previous_month(key):
+    year, month = map(int, key.split('-'))
+    return f"{year - 1:04d}-12" if month == 1 else f"{year:04d}-{month - 1:02d}"
+
+
+def emp_key(value):
+    """EMP NO as stored: the search key, without leading zeros on numbers"""
+    from employee_search import search_key
+    key = search_key(value)
+    if key is not None and key.isdigit():
+        key = key.lstrip('0') or '0'
+    return key
+
+
+def figure_columns(schema):
+    """(normalized header, position) of the columns a sheet's payslips read as numbers, IDs excepted"""
+    from slypGenarater import get_compiled_layout
+    from sheet_loader import normalize_header
+    layout = get_compiled_layout(schema)
+    positions = sorted(set(layout.numeric_positions) - set(layout.id_positions))
+    return [(normalize_header(schema.columns[position]), position) for position in positions]
+
+
+def _amount(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) and value != 0 else None
+
+
+class PayrollHistory:
+    """The history database. Open one per thread; it is read and written with sqlite3."""
+
+    def __init__(self, path=None):
+        self.path = path or history_path()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ingest(self, sheet, month, workbook=''):
+        """Store a payslip_lib.PayslipSheet as the given month; returns the employees stored.
+
+        Rows without an EMP NO are skipped; rows repeating an EMP NO are added together.
+        """
+        month = month_key(month)
+        schema = sheet.schema
+        emp_position = schema.position('EMP NO')
+        if emp_position is None:
+            raise ValueError(f"'{sheet.name}' has no EMP NO column")
+        columns = figure_columns(schema)
+        headers = [header for header, _ in columns]
+        get_emp = sheet.rows.column_getter(emp_position)
+        name_position = schema.position('NAME')
+        get_name = sheet.rows.column_getter(name_position) if name_position is not None else None
+        getters = [sheet.rows.column_getter(position) for _, position in columns]
+
+        names = {}
+        amounts = {}
+        skipped = 0
+        for row in range(len(sheet)):
+            emp_no = emp_key(get_emp(row))
+            if emp_no is None:
+                skipped += 1
+                continue
+            if emp_no in names:
+                logger.warning(f"EMP NO {emp_no} is on several rows of '{sheet.name}'; their figures are added")
+            names[emp_no] = str(get_name(row)) if get_name is not None else None
+            for header, get in zip(headers, getters):
+                value = _amount(get(row))
+                if value is not None:
+                    amounts[emp_no, header] = amounts.get((emp_no, header), 0.0) + value
+        if skipped:
+            logger.warning(f"{skipped} rows of '{sheet.name}' have no EMP NO and were not stored")
+
+        with self.connection:
+            self._delete(month, schema.sheet_type, sheet.name)
+            cursor = self.connection.execute(
+                "INSERT INTO sheets (month, sheet_type, sheet_name, workbook, ingested_at, employees) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (month, schema.sheet_type, sheet.name, workbook, datetime.now().isoformat(timespec='seconds'),
+                 len(names)))
+            sheet_id = cursor.lastrowid
+            self.connection.executemany("INSERT INTO employees VALUES (?, ?, ?)",
+                                        [(sheet_id, emp_no, name) for emp_no, name in names.items()])
+            self.connection.executemany("INSERT INTO amounts VALUES (?, ?, ?, ?)",
+                                        [(sheet_id, emp_no, header, value)
+                                         for (emp_no, header), value in amounts.items()])
+        logger.info(f"Stored '{sheet.name}' as {month}: {len(names)} employees, {len(amounts)} figures")
+        return len(names)
+
+    def _delete(self, month, sheet_type, sheet_name):
+        for (sheet_id,) in self.connection.execute(
+                "SELECT id FROM sheets WHERE month = ? AND sheet_type = ? AND sheet_name = ?",
+                (month, sheet_type, sheet_name)).fetchall():
+            self.connection.execute("DELETE FROM amounts WHERE sheet_id = ?", (sheet_id,))
+            self.connection.execute("DELETE FROM employees WHERE sheet_id = ?", (sheet_id,))
+            self.connection.execute("DELETE FROM sheets WHERE id = ?", (sheet_id,))
+
+    def months(self):
+        """Stored sheets as dicts: month, sheet_type, sheet_name, workbook, ingested_at, employees"""
+        cursor = self.connection.execute(
+            "SELECT month, sheet_type, sheet_name, workbook, ingested_at, employees FROM sheets "
+            "ORDER BY month, sheet_type, sheet_name")
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def employee(self, emp_no, headers=None, since=None, until=None):
+        """An employee's figures per month: dicts with month, sheet_type, sheet_name, header, value."""
+        from sheet_loader import normalize_header
+        query = ("SELECT s.month, s.sheet_type, s.sheet_name, a.header, a.value FROM amounts a "
+                 "JOIN sheets s ON s.id = a.sheet_id WHERE a.emp_no = ?")
+        parameters = [emp_key(emp_no)]
+        if headers:
+            headers = [normalize_header(header) for header in headers]
+            query += f" AND a.header IN ({', '.join('?' * len(headers))})"
+            parameters += headers
+        query, parameters = self._month_range(query, parameters, since, until)
+        cursor = self.connection.execute(query + " ORDER BY s.month, s.sheet_name, a.header", parameters)
+        return [dict(zip(('month', 'sheet_type', 'sheet_name', 'header', 'value'), row)) for row in cursor]
+
+    def column(self, header, since=None, until=None):
+        """Every employee's figures of one column per month: dicts with month, sheet_name, emp_no, value."""
+        from sheet_loader import normalize_header
+        query = ("SELECT s.month, s.sheet_name, a.emp_no, a.value FROM amounts a "
+                 "JOIN sheets s ON s.id = a.sheet_id WHERE a.header = ?")
+        query, parameters = self._month_range(query, [normalize_header(header)], since, until)
+        cursor = self.connection.execute(query + " ORDER BY s.month, a.emp_no", parameters)
+        return [dict(zip(('month', 'sheet_name', 'emp_no', 'value'), row)) for row in cursor]
+
+    def totals(self, headers, since, until, emp_no=None, sheet_type=None):
+        """Sums of the columns over the months since..until (inclusive), as {emp_no: {header: sum}}.
+        With sheet_type only sheets of that type (FIXED or FTC) are added up."""
+        from sheet_loader import normalize_header
+        headers = [normalize_header(header) for header in headers]
+        if not headers:
+            return {}
+        query = (f"SELECT a.emp_no, a.header, SUM(a.value) FROM amounts a JOIN sheets s ON s.id = a.sheet_id "
+                 f"WHERE a.header IN ({', '.join('?' * len(headers))})")
+        parameters = list(headers)
+        if emp_no is not None:
+            query += " AND a.emp_no = ?"
+            parameters.append(emp_key(emp_no))
+        if sheet_type:
+            query += " AND s.sheet_type = ?"
+            parameters.append(sheet_type)
+        query, parameters = self._month_range(query, parameters, since, until)
+        sums = {}
+        for emp, header, value in self.connection.execute(query + " GROUP BY a.emp_no, a.header", parameters):
+            sums.setdefault(emp, {})[header] = value
+        return sums
+
+    @staticmethod
+    def _month_range(query, parameters, since, until):
+        if since:
+            query += " AND s.month >= ?"
+            parameters.append(month_key(since))
+        if until:
+            query += " AND s.month <= ?"
+            parameters.append(month_key(until))
+        return query, parameters
+
+
+def ytd_columns(sheet_type, columns=None):
+    """(label, header) of the year-to-date lines: the configured ones, else the layout's totals"""
+    if columns:
+        return list(columns.items())
+    from payslip_layout import LAYOUTS
+    totals = LAYOUTS[sheet_type]['totals']
+    return [('YTD EARNINGS', totals['earnings']), ('YTD DEDUCTIONS', totals['deductions']),
+            ('YTD NET PAY', totals['net']), ('YTD EPF YEE', 'EPF YEE')]
+
+
+class YearToDate:
+    """Year-to-date lines for the payslips of one sheet.
+
+    Holds the sums of earlier months of the payroll year for every employee,
+    read from the history once; rendering a payslip adds the row's own
+    figures, so the month being printed need not have been ingested.
+    """
+
+    LINE = "{:<18}  {:>12,.2f}       {:<16}  {:>10,.2f}"
+    HALF_LINE = "{:<18}  {:>12,.2f}"
+
+    def __init__(self, schema, columns, sums, since, month):
+        from sheet_loader import normalize_header
+        self.emp_position = schema.position('EMP NO')
+        self.columns = [(label, schema.position(header), normalize_header(header)) for label, header in columns]
+        self.sums = sums
+        self.title = f"YEAR TO DATE ({month_text(since)} - {month_text(month)})"
+
+    def lines(self, values):
+        """The lines to append to a payslip of a row given as positional values (Payslip.appendix)"""
+        earlier = self.sums.get(emp_key(values[self.emp_position]), {}) if self.emp_position is not None else {}
+        figures = []
+        for label, position, header in self.columns:
+            current = _amount(values[position]) if position is not None else None
+            figures.append((label, earlier.get(header, 0.0) + (current or 0.0)))
+        lines = []
+        for start in range(0, len(figures), 2):
+            pair = figures[start:start + 2]
+            if len(pair) == 2:
+                lines.append(self.LINE.format(pair[0][0], pair[0][1], pair[1][0], pair[1][1]))
+            else:
+                lines.append(self.HALF_LINE.format(*pair[0]))
+        return ['', self.title] + (lines or [''])
+
+    def render(self, values):
+        """The text to append to a payslip's text"""
+        return '\n' + '\n'.join(self.lines(values))
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+def payslip_ytd(schema, sheet_type, month, columns=None, path=None):
+    """YearToDate for payslips of a sheet printed for month, reading the history once per change."""
+    path = path or history_path()
+    return _payslip_ytd(schema, sheet_type, month_key(month), tuple(ytd_columns(sheet_type, columns)),
+                        path, _file_stamp(path))
+
+
+@lru_cache(maxsize=8)
+def _payslip_ytd(schema, sheet_type, month, columns, path, history_stamp):
+    since = year_start(month)
+    sums = {}
+    if history_stamp is not None and month != since:
+        try:
+            with PayrollHistory(path) as history:
+                sums = history.totals([header for _, header in columns], since, previous_month(month),
+                                      sheet_type=sheet_type)
+        except sqlite3.Error as e:
+            logger.error(f"Error reading payroll history {path}: {str(e)}")
+    return YearToDate(schema, columns, sums, since, month)
+
+
+def ingest_workbook(path, month, sheet_names=None, history=None):
+    """Ingest the payroll sheets of a workbook (or the named ones); returns {sheet name: employees}"""
+    from payslip_lib import load_sheet, sheet_names as workbook_sheets
+    names = sheet_names or workbook_sheets(path)
+    stored = {}
+    own = history is None
+    history = history or PayrollHistory()
+    try:
+        for name in names:
+            try:
+                sheet = load_sheet(path, name)
+            except ValueError:
+                if sheet_names:
+                    raise
+                continue  # Not a payroll sheet
+            stored[name] = history.ingest(sheet, month, os.path.abspath(path))
+    finally:
+        if own:
+            history.close()
+    return stored
+
+
+def _print_rows(rows, columns):
+    widths = [max([len(column)] + [len(_cell(row[column])) for row in rows]) for column in columns]
+    print('  '.join(column.upper().ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(_cell(row[column]).rjust(width) if isinstance(row[column], float)
+                        else _cell(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+def _cell(value):
+    return f"{value:,.2f}" if isinstance(value, float) else str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Store processed payroll sheets and query them by month.")
+    parser.add_argument('--db', help=f"history database (default ${HISTORY_ENV} or {history_path()})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help="store the payroll sheets of a workbook")
+    ingest.add_argument('workbook')
+    ingest.add_argument('--month', help="YYYY-MM the sheets are for (default: the month payslips print)")
+    ingest.add_argument('--sheet', action='append', help="only this sheet (repeatable)")
+
+    employee = commands.add_parser('employee', help="an employee's figures per month")
+    employee.add_argument('emp_no')
+    employee.add_argument('--column', action='append', help="only this column (repeatable)")
+
+    column = commands.add_parser('column', help="one column for every employee per month")
+    column.add_argument('header')
+
+    for command in (employee, column):
+        command.add_argument('--from', dest='since', help="first month, YYYY-MM")
+        command.add_argument('--to', dest='until', help="last month, YYYY-MM")
+
+    ytd = commands.add_parser('ytd', help="an employee's year-to-date totals")
+    ytd.add_argument('emp_no')
+    ytd.add_argument('--month', help="last month included, YYYY-MM (default: the latest stored)")
+    ytd.add_argument('--column', action='append', help="sum this column (default: the totals)")
+    ytd.add_argument('--sheet-type', help="add up sheets of this type (default: the type of the latest one)")
+
+    commands.add_parser('months', help="list the stored sheets")
+
+    toggle = commands.add_parser('payslip-ytd', help="add year-to-date lines to payslips, or stop")
+    toggle.add_argument('state', choices=['on', 'off'])
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    # payslip_config.json is read from the working directory, as the application does
+    workbook = os.path.abspath(args.workbook) if args.command == 'ingest' else None
+    database = os.path.abspath(args.db) if args.db else None
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.command == 'payslip-ytd':
+        from config import PayslipConfig
+        PayslipConfig().set_ytd_enabled(args.state == 'on')
+        print(f"Year-to-date lines on payslips: {args.state}")
+        return 0
+
+    with PayrollHistory(database) as history:
+        if args.command == 'ingest':
+            if args.month:
+                month = month_key(args.month)
+            else:
+                from slypGenarater import get_payslip_month_year
+                month = month_key(get_payslip_month_year())
+            stored = ingest_workbook(workbook, month, args.sheet, history)
+            for name, count in stored.items():
+                print(f"{name}: {count} employees stored as {month}")
+            if not stored:
+                print("No payroll sheets found")
+                return 1
+        elif args.command == 'months':
+            _print_rows(history.months(), ['month', 'sheet_type', 'sheet_name', 'employees', 'ingested_at'])
+        elif args.command == 'employee':
+            _print_rows(history.employee(args.emp_no, args.column, args.since, args.until),
+                        ['month', 'sheet_name', 'header', 'value'])
+        elif args.command == 'column':
+            _print_rows(history.column(args.header, args.since, args.until),
+                        ['month', 'sheet_name', 'emp_no', 'value'])
+        elif args.command == 'ytd':
+            rows = history.employee(args.emp_no)
+            if not rows:
+                print(f"EMP NO {args.emp_no} is not in the history")
+                return 1
+            until = month_key(args.month) if args.month else rows[-1]['month']
+            sheet_type = args.sheet_type or rows[-1]['sheet_type']
+            from sheet_loader import normalize_header
+            headers = [normalize_header(header) for header in
+                       args.column or [header for _, header in ytd_columns(sheet_type)]]
+            sums = history.totals(headers, year_start(until), until, args.emp_no,
+                                  sheet_type).get(emp_key(args.emp_no), {})
+            print(f"EMP NO {args.emp_no} ({sheet_type}), {month_text(year_start(until))} - {month_text(until)}")
+            _print_rows([{'column': header, 'total': float(sums.get(header, 0.0))} for header in headers],
+                        ['column', 'total'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
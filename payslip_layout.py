@@ -0,0 +1,387 @@
+import math
+import pandas as pd
+from datetime import datetime
+
+_MISSING = object()
+
+
+class Field:
+    """A sheet value placed into a layout line.
+
+    kind is one of:
+        'text'   - str(value)
+        'number' - the float value itself, formatted by the line's format spec
+        'int'    - str(int(value)), for IDs and account numbers
+        'date'   - dd/mm/yyyy via format_date_only
+    """
+    __slots__ = ('name', 'kind', 'default', 'position')
+
+    def __init__(self, name=None, kind='text', default=_MISSING, position=None):
+        self.name = name
+        self.kind = kind
+        self.default = default
+        self.position = position
+
+
+def field(name, kind='text', default=_MISSING, position=None):
+    """Layout field looked up by header name. Without a default the column is required.
+
+    position is the column to read when the sheet has no such header (for
+    columns older sheets leave unlabelled).
+    """
+    return Field(name, kind, default, position)
+
+
+def column_at(position, kind='text'):
+    """Layout field read from a fixed column position (for unlabelled columns)."""
+    return Field(kind=kind, position=position)
+
+
+# Formats for configured earnings/deductions items: label, single value, double value
+EARNING_ITEMS = {'label': '{:<20}', 'single': '{:>12,.2f}', 'double': '{:>12,.2f}{:>5,.2f}'}
+DEDUCTION_ITEMS = {'label': '{:15}', 'single': '{:>12,.2f}', 'double': '{:>12,.2f}{:>12,.2f}'}
+
+# Layout templates, one per sheet type.
+#   markers: headers only found on this kind of sheet, used to classify unnamed sheets
+#   info/footer: lines as (format string, *parts); parts are labels or fields, "" is a blank line
+#   columns: headings of the earnings and deductions columns
+#   column_width/gap: width of the earnings column and spacing before deductions
+#   totals: sheet columns holding total earnings, total deductions and net pay
+#   epf_base: columns the EPF/ETF contributions are calculated on
+FIXED_LAYOUT = {
+    'title': 'COATS THREAD EXPORTS (PVT) LTD - OPERATOR EMPLOYEES',
+    'header_width': 80,
+    'markers': {'TOT DED', 'REF NO', 'BRANCH NAME'},
+    'totals': {'earnings': 'TOT EARN', 'deductions': 'TOT DED', 'net': 'netpay'},
+    'epf_base': ['BASIC SAL', 'B.R ALLOWA'],
+    'info': [
+        ("{:<12}  {:<26}{:<14}  {}", 'EMP NO', field('EMP NO', 'int'), 'NIC NO', field('NIC No.')),
+        ("{:<12}  {:<26}{:<14}  {}", 'NAME', field('NAME'), 'DEPARTMENT', field('DEPARTMENT')),
+        ("{:<12}  {:<26}{:<14}  {}", 'DESIGNATION', field('DESIGNATION'), 'D.O.B', field('DOB', 'date')),
+        ("{:<12}  {:<26}{:<14}  {}", 'D.O.J', field('DOJ', 'date'), 'E.P.F.NO', field('EPF NO', 'int')),
+        ("{:<12}  {:<26}{:<14}  {}", '', '', 'SAP NO', field('REF NO')),
+    ],
+    'columns': ('EARNINGS', 'DEDUCTIONS'),
+    'column_width': 37,
+    'gap': 3,
+    'earnings': EARNING_ITEMS,
+    'deductions': DEDUCTION_ITEMS,
+    'footer': [
+        ("{:<18}  {:>11,.2f}       {:<18}  {:>9,.2f}",
+         'TOT EARNINGS', field('TOT EARN', 'number'), ' TOT DEDUCTIONS', field('TOT DED', 'number')),
+        "",
+        ("{:<18}  {:>12,.2f}       {:<16}  {:>10,.2f}",
+         'EPF YEE 8%', field('EPF YEE', 'number'), ' NET PAY', field('netpay', 'number')),
+        ("{:<18}  {:>12,.2f}       {:<16}  {:>10,.2f}",
+         'ETF YER 3%', field('ETF YER', 'number'), ' BANK PAYMENT', field('netpay', 'number')),
+        ("{:<18}  {:>12,.2f}", 'EPF YER 12%', field('EPF YER', 'number')),
+        ("{:<18}  {:>12,.2f}", 'TOTAL EPF', field('TOTAL EPF', 'number')),
+        "",
+        # The bank name sits in an unlabelled column of older FIXED sheets
+        ("{:<10}  {}   {}       {:<12}  {}",
+         'BANK', field('BANK NAME', position=14), field('BRANCH NAME'), 'A/C NO', field('A/C NO', 'int')),
+    ],
+}
+
+FTC_LAYOUT = {
+    'title': 'COATS THREAD EXPORTS (PVT) LTD - FTC EMPLOYEES',
+    'header_width': 80,
+    'markers': {'TOTAL DEDUCTION', 'RATE', 'NO OF DAYS WORKED', 'BANK CODE'},
+    'totals': {'earnings': 'TOT EARN', 'deductions': 'total deduction', 'net': 'NETPAY'},
+    'epf_base': ['BASIC SAL', 'B.R ALLOWA'],
+    'info': [
+        ("{:<15}  {:<24}{:<16}  {}", 'EMP NO', field('EMP NO', 'int'), 'NIC NO', field('NIC No.')),
+        ("{:<15}  {:<24}{:<16}  {}", 'NAME', field('NAME'), 'DEPARTMENT', field('DEPARTMENT')),
+        ("{:<15}  {:<24}{:<16}  {}", 'DESIGNATION', field('DESIGNATION'), 'D.O.B', field('DOB', 'date')),
+        ("{:<15}  {:<24}{:<16}  {}", 'D.O.J', field('DOJ', 'date'), 'E.P.F.NO', field('EPF NO', 'int')),
+        ("{:<15}  {:<24}", 'RATE', field('RATE', 'int')),
+    ],
+    'columns': ('EARNINGS', ' DEDUCTIONS'),
+    'column_width': 37,
+    'gap': 4,
+    'earnings': EARNING_ITEMS,
+    'deductions': DEDUCTION_ITEMS,
+    'footer': [
+        ("{:<18}  {:>12,.2f}         {:<15}  {:>10,.2f}",
+         'TOT EARNINGS', field('TOT EARN', 'number', 0), 'TOT DEDUCTIONS', field('total deduction', 'number', 0)),
+        "",
+        ("{:<18}  {:>12,.2f}         {:<15}  {:>10,.2f}",
+         'EPF YEE 8%', field('EPF YEE', 'number', 0), 'NET PAY', field('NETPAY', 'number', 0)),
+        ("{:<18}  {:>12,.2f}         {:<15}  {:>10,.2f}",
+         'ETF YER 3%', field('ETF YER', 'number', 0), 'BANK PAYMENT', field('NETPAY', 'number', 0)),
+        ("{:<18}  {:>12,.2f}", 'EPF YER 12%', field('EPF YER', 'number', 0)),
+        ("{:<18}  {:>12,.2f}         {:<15}  {:>8,.2f}",
+         'TOTAL EPF', field('TOTAL EPF', 'number', 0), 'NO OF DAYS WORKED', field('NO OF DAYS WORKED', 'number', 0)),
+        "",
+        ("{:<10}  {:<15}  {:<10}  {:<15}  {:<15}",
+         'BANK', field('BANK CODE', default=''), field('BRANCH', default=''), 'A/C NO', field('A/C NO', 'int', 0)),
+    ],
+}
+
+# Registered layouts by sheet type; a new sheet type only needs a template here
+LAYOUTS = {
+    'FIXED': FIXED_LAYOUT,
+    'FTC': FTC_LAYOUT,
+}
+
+
+def format_date_only(val):
+    """Format a date value to dd/mm/yyyy, or return as string if not a date."""
+    if pd.isnull(val):
+        return ""
+    try:
+        if isinstance(val, str):
+            dt = pd.to_datetime(val)
+        elif isinstance(val, (pd.Timestamp, datetime)):
+            dt = val
+        else:
+            return str(val)
+        return dt.strftime('%d/%m/%Y')
+    except Exception:
+        return str(val)
+
+
+def _to_int_text(val):
+    return str(int(val))
+
+
+_CONVERTERS = {
+    'text': str,
+    'number': None,
+    'int': _to_int_text,
+    'date': format_date_only,
+}
+
+
+def shows_amount(val):
+    """Check whether a value prints as a non-zero amount with two decimals.
+
+    Decided from the formatted text, as round() gives numpy and Python floats
+    different results (round(np.float64(0.005), 2) is 0.0, round(0.005, 2) is 0.01).
+    """
+    return val == val and math.isfinite(val) and f"{val:.2f}" not in ('0.00', '-0.00')
+
+
+class CompiledLayout:
+    """A layout template resolved against one sheet's schema and mappings.
+
+    Every line is reduced to a format operation over column positions, and
+    every configured item to its label, value format and the positions used
+    to decide whether it is printed, so rendering a row is a straight pass
+    over these lists.
+    """
+
+    def __init__(self, template, schema, mappings, month):
+        self.template = template
+        self.sheet_type = schema.sheet_type
+        self.numeric_positions = set()
+        self.used_positions = set()
+        self.missing_columns = []
+        self.id_positions = {}
+        self.date_positions = {}
+
+        width = template['header_width']
+        self.header_lines = [template['title'].center(width), ('PAY SLIP FOR THE MONTH OF ' + month).center(width)]
+        left_heading, right_heading = template['columns']
+        self.heading_lines = ['', f"{left_heading.ljust(width // 2)}{right_heading.ljust(width // 2)}", '']
+        self.column_width = template['column_width']
+        self.gap = ' ' * template['gap']
+        self.total_positions = [(name, schema.position(header)) for name, header in template['totals'].items()]
+
+        # Header and footer fields by name: read from the row, or a default the sheet lacks
+        self.field_sources = []
+        self.field_defaults = {}
+        self.info_fields = []
+        self.footer_fields = []
+        self.info = [self._compile_line(line, schema, self.info_fields) for line in template['info']]
+        self.footer = [self._compile_line(line, schema, self.footer_fields) for line in template['footer']]
+        self.earnings = self._compile_items(mappings.get('earnings', {}), template['earnings'], schema)
+        self.deductions = self._compile_items(mappings.get('deductions', {}), template['deductions'], schema)
+
+    def _resolve(self, item, schema, keys):
+        """Resolve a line part to (constant, key): a label, or the name of the field in Payslip.fields."""
+        if not isinstance(item, Field):
+            return item, None
+        key = item.name if item.name is not None else f"column {item.position + 1}"
+        if key in keys or key in self.missing_columns:
+            return None, key
+        position = schema.position(item.name) if item.name is not None else None
+        if position is None and item.position is not None:
+            position = schema.local_position(item.position)
+        if position is None:
+            if item.default is _MISSING:
+                # Reported by pre-flight checks; rendering refuses to run without it
+                self.missing_columns.append(key)
+                return None, key
+            converter = _CONVERTERS[item.kind]
+            keys.append(key)
+            self.field_defaults[key] = converter(item.default) if converter else item.default
+            return None, key
+        self.used_positions.add(position)
+        if item.kind in ('number', 'int'):
+            self.numeric_positions.add(position)
+        if item.kind == 'int':
+            self.id_positions[position] = item.name
+        elif item.kind == 'date':
+            self.date_positions[position] = item.name
+        keys.append(key)
+        if all(key != known for known, _, _ in self.field_sources):
+            self.field_sources.append((key, position, _CONVERTERS[item.kind]))
+        return None, key
+
+    def _compile_line(self, line, schema, keys):
+        if isinstance(line, str):
+            return line, None
+        fmt, *parts = line
+        parts = [self._resolve(part, schema, keys) for part in parts]
+        if all(key is None for _, key in parts):
+            # Labels only: format once now
+            return fmt.format(*[constant for constant, _ in parts]), None
+        return fmt.format, parts
+
+    def _compile_items(self, mappings, formats, schema):
+        items = []
+        label_format = formats['label']
+        for display_name, excel_header in mappings.items():
+            if isinstance(excel_header, (list, tuple)) and len(excel_header) == 2:
+                col1, col2 = excel_header
+                col1_idx = schema.position(col1)
+                if col1_idx is None:
+                    continue
+                if col2 == "next_column":
+                    col2_idx = schema.local_position(schema.source_position(col1_idx) + 1)
+                elif col2 == "prev_column":
+                    col2_idx = schema.local_position(schema.source_position(col1_idx) - 1)
+                else:
+                    col2_idx = schema.position(col2)
+                # A missing second column prints as 0
+                sources = [col1_idx, col2_idx]
+                value_format = formats['double']
+            else:
+                col1_idx = schema.position(excel_header)
+                if col1_idx is None:
+                    continue
+                sources = [col1_idx]
+                value_format = formats['single']
+            self.numeric_positions.update(p for p in sources if p is not None)
+            self.used_positions.update(p for p in sources if p is not None)
+            items.append((label_format.format(display_name), value_format.format, sources))
+        return items
+
+    def amount_positions(self, mapping_type):
+        """Column positions of the amounts of configured 'earnings' or 'deductions' items."""
+        items = self.earnings if mapping_type == 'earnings' else self.deductions
+        return [sources[0] for _, _, sources in items]
+
+    @staticmethod
+    def format_line(line, fields):
+        """A compiled header or footer line as text, with the field values of one payslip."""
+        text, parts = line
+        if parts is None:
+            return text
+        return text(*[constant if key is None else fields[key] for constant, key in parts])
+
+    @staticmethod
+    def _shown_items(items, values):
+        shown = []
+        for label, value_format, sources in items:
+            amounts = [0 if position is None else values[position] for position in sources]
+            for amount in amounts:
+                if shows_amount(amount):
+                    shown.append((label, value_format, amounts))
+                    break
+        return shown
+
+    def build(self, values):
+        """Build the Payslip for one row given as a positional sequence of values."""
+        if self.missing_columns:
+            raise KeyError(f"Sheet is missing columns: {', '.join(self.missing_columns)}")
+        fields = dict(self.field_defaults)
+        for key, position, converter in self.field_sources:
+            fields[key] = converter(values[position]) if converter else values[position]
+        return Payslip(
+            self,
+            fields,
+            self._shown_items(self.earnings, values),
+            self._shown_items(self.deductions, values),
+            {name: values[position] for name, position in self.total_positions if position is not None},
+        )
+
+    def render(self, values):
+        """Render the payslip text for one row given as a positional sequence of values."""
+        return self.build(values).text()
+
+
+class Payslip:
+    """One employee's payslip, before it is laid out as text.
+
+    Holds the header and footer field values by their sheet header (EMP NO,
+    NAME, EPF YEE, ETF YER, BANK NAME, A/C NO, ...), the printed earnings and
+    deductions items with their amounts, and the sheet's totals (earnings,
+    deductions, net). Field values are converted as the layout prints them:
+    text for names and IDs, dd/mm/yyyy for dates, floats for amounts.
+    Layout constants stay on the shared CompiledLayout, so a payslip is a
+    handful of small dicts and lists and cheap to keep. Output backends take
+    lines() or text() instead of splitting a string.
+    """
+    __slots__ = ('layout', 'fields', 'earnings', 'deductions', 'totals', 'appendix')
+
+    def __init__(self, layout, fields, earnings, deductions, totals, appendix=()):
+        self.layout = layout
+        self.fields = fields  # {header: value} of the header and footer fields
+        self.earnings = earnings  # (label, value format, amounts) of each printed item
+        self.deductions = deductions
+        self.totals = totals  # {'earnings': ..., 'deductions': ..., 'net': ...} from the sheet
+        self.appendix = appendix  # Lines added after the footer, e.g. year-to-date figures
+
+    def header(self):
+        """{header: value} of the fields above the items (EMP NO, NAME, EPF NO, ...), in layout order"""
+        return {key: self.fields[key] for key in self.layout.info_fields}
+
+    def footer(self):
+        """{header: value} of the fields below the items (totals, EPF/ETF, bank, A/C NO), in layout order"""
+        return {key: self.fields[key] for key in self.layout.footer_fields}
+
+    def items(self, mapping_type):
+        """(display name, amounts) of the printed 'earnings' or 'deductions' items"""
+        items = self.earnings if mapping_type == 'earnings' else self.deductions
+        return [(label.strip(), amounts) for label, _, amounts in items]
+
+    def lines(self):
+        """The payslip as text lines"""
+        layout = self.layout
+        earnings = [label + value_format(*amounts) for label, value_format, amounts in self.earnings]
+        deductions = [label + value_format(*amounts) for label, value_format, amounts in self.deductions]
+        width = layout.column_width
+        combined = []
+        for i in range(max(len(earnings), len(deductions))):
+            left = earnings[i] if i < len(earnings) else ""
+            right = deductions[i] if i < len(deductions) else ""
+            combined.append(f"{left:<{width}}{layout.gap}{right}")
+        info = [layout.format_line(line, self.fields) for line in layout.info]
+        footer = [layout.format_line(line, self.fields) for line in layout.footer]
+        return (layout.header_lines + info + layout.heading_lines + (combined or [''])
+                + [''] + (footer or ['']) + list(self.appendix))
+
+    def text(self):
+        """The payslip as one string, as shown, printed and saved"""
+        return '\n'.join(self.lines())
+
+    __str__ = text
+
+
+def compile_layout(schema, mappings, month, sheet_type=None):
+    """Compile the registered template for a sheet type against a schema.
+
+    Args:
+        schema: SheetSchema of the loaded sheet
+        mappings: Earnings/deductions mappings for the sheet type (PayslipConfig.get_mappings)
+        month: Month text for the header, e.g. 'MAY 2025'
+        sheet_type: Override the schema's sheet type
+    """
+    sheet_type = sheet_type or schema.sheet_type
+    if sheet_type not in LAYOUTS:
+        raise ValueError(f"Unsupported sheet type: {sheet_type or schema.sheet_name}")
+    layout = CompiledLayout(LAYOUTS[sheet_type], schema, mappings, month)
+    layout.sheet_type = sheet_type
+    return layout
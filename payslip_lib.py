@@ -0,0 +1,101 @@
+"""Payslips without the application window: load a sheet, render text, render PDF bytes.
+
+For batch scripts and services. Importing this module loads neither Qt nor
+pandas: pandas is imported when a sheet is loaded, and Qt (QtGui only) by
+the qt PDF backend when it draws its first PDF.
+
+    import payslip_lib
+    sheet = payslip_lib.load_sheet('payroll.xlsx', 'FIXED APRIL')
+    for row in range(len(sheet)):
+        text = payslip_lib.render_text(sheet, row)
+        pdf = payslip_lib.render_pdf(text)                     # qt when installed
+        payslip = payslip_lib.render_payslip(sheet, row)       # lines, items and totals
+        pdf = payslip_lib.render_pdf(payslip, backend='builtin')  # no Qt at all
+
+See pdf_render for the backends. Layouts and mappings come from
+payslip_config.json in the working directory, as in the application.
+"""
+from pdf_render import render_pdf, available_backends, select_backend, PAGE_SETTINGS  # noqa: F401 (re-exported)
+
+
+class PayslipSheet:
+    """One payroll sheet, loaded for rendering payslips."""
+
+    def __init__(self, name, df, schema, index):
+        from sheet_loader import SheetRows
+        self.name = name
+        self.df = df
+        self.schema = schema
+        self.index = index  # EmployeeIndex
+        self.rows = SheetRows(df)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def sheet_type(self):
+        return self.schema.sheet_type
+
+    def values(self, row):
+        return self.rows.values(row)
+
+    def employee_name(self, row):
+        position = self.schema.position('NAME')
+        return str(self.rows.column_getter(position)(row)) if position is not None else 'Employee'
+
+    def find(self, emp_no):
+        """Rows whose EMP NO is emp_no; leading zeros of numeric EMP NOs are ignored"""
+        from employee_search import search_key
+        key = search_key(emp_no)
+        position = self.schema.position('EMP NO')
+        if key is None or position is None:
+            return []
+        keys = {key, key.lstrip('0') or '0'} if key.isdigit() else {key}
+        get = self.rows.column_getter(position)
+        rows = set()
+        for candidate in keys:
+            rows.update(self.index.ids.get(candidate, ()))
+        # The index also holds EPF and NIC numbers; keep rows whose EMP NO matches
+        return [row for row in sorted(rows) if search_key(get(row)) in keys]
+
+
+def pdf_file_name(employee_name, timestamp):
+    """File name of an employee's payslip PDF, e.g. Payslip_JOHN_SILVA_20240131_101500.pdf"""
+    safe_name = ''.join(c for c in employee_name if c.isalnum() or c in (' ', '-', '_')).strip()
+    safe_name = safe_name.replace(' ', '_')
+    return f"Payslip_{safe_name}_{timestamp}.pdf"
+
+
+def sheet_names(path):
+    """Names of all sheets of a workbook, in workbook order (.xlsx without loading any sheet)"""
+    from sheet_jobs import is_xlsx
+    if is_xlsx(path):
+        from xlsx_stream import sheet_names as xlsx_sheet_names
+        return xlsx_sheet_names(path)
+    import pandas as pd
+    with pd.ExcelFile(path) as excel_file:
+        return list(excel_file.sheet_names)
+
+
+def load_sheet(path, sheet_name, payslip_only=True):
+    """Read a FIXED or FTC payroll sheet of a workbook.
+
+    payslip_only reads just the columns the payslips use. Raises ValueError
+    for sheets that are not payroll sheets.
+    """
+    from sheet_jobs import parse_sheet
+    result = parse_sheet(path, sheet_name, payslip_only=payslip_only, payroll_only=True, table=False)
+    if result is None:
+        raise ValueError(f"'{sheet_name}' is not a FIXED or FTC payroll sheet")
+    return PayslipSheet(sheet_name, result['df'], result['schema'], result['index'])
+
+
+def render_payslip(sheet, row):
+    """Payslip (payslip_layout.Payslip) of a row (0-based) of a PayslipSheet; render_pdf takes it as is"""
+    from slypGenarater import build_payslip
+    return build_payslip(sheet.values(row), sheet.name, sheet.schema)
+
+
+def render_text(sheet, row):
+    """Payslip text of a row (0-based) of a PayslipSheet, as the application shows it"""
+    return render_payslip(sheet, row).text()
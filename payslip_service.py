@@ -0,0 +1,238 @@
+"""Local payslip rendering service.
+
+Keeps a payroll workbook's sheets, the compiled payslip layouts and a PDF
+renderer loaded, and serves single payslips over HTTP on localhost, so
+other programs (e.g. the HR portal) get a payslip in milliseconds instead
+of starting pandas and Qt for every request. Built on payslip_lib, so it
+needs no Qt widgets, and no Qt at all with --pdf-backend builtin.
+
+    python payslip_service.py payroll.xlsx [--port 8765] [--workers 4] [--pdf-backend qt|builtin]
+
+    GET  /payslip?emp_no=1001                 payslip PDF
+    GET  /payslip?emp_no=1001&format=text     payslip text
+    GET  /payslip?emp_no=1001&sheet=FTC APRIL  when the EMP NO is on several sheets
+    GET  /sheets                              loaded sheets and their row counts (JSON)
+    POST /reload                              read the workbook again
+    GET  /health
+
+Mapping changes in payslip_config.json are picked up on the next request.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+logger = logging.getLogger('PayslipService')
+
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8765
+
+# Requests rendered at once; further requests wait for a free worker
+SERVICE_WORKERS = 4
+
+
+class PayslipStore:
+    """The payroll sheets of one workbook, loaded once and looked up by EMP NO."""
+
+    def __init__(self, path, pdf_backend=None):
+        self.path = path
+        self.pdf_backend = pdf_backend
+        self.sheets = {}
+        self.loaded_at = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Parse every payroll sheet (in parallel processes) and replace the loaded ones."""
+        from sheet_jobs import preload_sheets, parse_sheet
+        from payslip_lib import PayslipSheet, sheet_names
+        started = time.perf_counter()
+        names = sheet_names(self.path)
+        results = dict(preload_sheets(self.path, names, payslip_only=True))
+        for name in names:
+            # Sheets over the pre-parse memory budget are read one at a time
+            if name not in results:
+                result = parse_sheet(self.path, name, payslip_only=True, payroll_only=True, table=False)
+                if result is not None:
+                    results[name] = result
+        sheets = {}
+        for name in names:
+            if name in results:
+                result = results[name]
+                sheets[name] = PayslipSheet(name, result['df'], result['schema'], result['index'])
+        with self._lock:
+            self.sheets = sheets
+            self.loaded_at = time.time()
+        logger.info(f"Loaded {len(sheets)} payroll sheets of {self.path} "
+                    f"in {time.perf_counter() - started:.1f} s")
+        return list(sheets)
+
+    def find(self, emp_no, sheet_name=None):
+        """(sheet, row) of the employees with this EMP NO, on one sheet or all of them."""
+        with self._lock:
+            sheets = self.sheets
+        return [(sheet, row) for name, sheet in sheets.items()
+                if sheet_name is None or name == sheet_name
+                for row in sheet.find(emp_no)]
+
+    def render_pdf(self, payslip):
+        from pdf_render import render_pdf
+        return render_pdf(payslip, self.pdf_backend)
+
+    def warm_up(self):
+        """Render one payslip to PDF, so fonts and layouts are ready before the first request"""
+        from payslip_lib import render_text
+        with self._lock:
+            sheets = self.sheets
+        for name, sheet in sheets.items():
+            if len(sheet):
+                started = time.perf_counter()
+                self.render_pdf(render_text(sheet, 0))
+                logger.info(f"First payslip rendered in {(time.perf_counter() - started) * 1000:.0f} ms")
+                return
+
+    def summary(self):
+        with self._lock:
+            sheets = self.sheets
+        return {'workbook': self.path, 'loaded_at': self.loaded_at,
+                'pdf_backend': self.pdf_backend,
+                'sheets': [{'name': name, 'type': sheet.sheet_type, 'rows': len(sheet)}
+                           for name, sheet in sheets.items()]}
+
+
+class PayslipRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the service's PayslipStore."""
+    server_version = 'PayslipService/1.0'
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+    def _send(self, status, body, content_type, headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, data):
+        self._send(status, json.dumps(data), 'application/json')
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            if url.path == '/health':
+                self._send_json(200, {'status': 'ok'})
+            elif url.path == '/sheets':
+                self._send_json(200, self.server.store.summary())
+            elif url.path == '/payslip':
+                self._payslip(query)
+            else:
+                self._send_json(404, {'error': f"No such endpoint: {url.path}"})
+        except Exception as e:
+            logger.error(f"Error handling {self.path}: {str(e)}")
+            self._send_json(500, {'error': str(e)})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/reload':
+            self._send_json(404, {'error': f"No such endpoint: {self.path}"})
+            return
+        try:
+            sheets = self.server.store.load()
+            self._send_json(200, {'sheets': sheets})
+        except Exception as e:
+            logger.error(f"Error reloading {self.server.store.path}: {str(e)}")
+            self._send_json(500, {'error': str(e)})
+
+    def _payslip(self, query):
+        emp_no = query.get('emp_no')
+        output = query.get('format', 'pdf').lower()
+        if not emp_no:
+            self._send_json(400, {'error': "emp_no is required"})
+            return
+        if output not in ('pdf', 'text'):
+            self._send_json(400, {'error': "format must be pdf or text"})
+            return
+        store = self.server.store
+        matches = store.find(emp_no, query.get('sheet'))
+        if not matches:
+            self._send_json(404, {'error': f"EMP NO {emp_no} not found"})
+            return
+        if len(matches) > 1:
+            self._send_json(409, {'error': f"EMP NO {emp_no} is on several rows; pass sheet",
+                                  'matches': [{'sheet': sheet.name, 'row': row + 1} for sheet, row in matches]})
+            return
+        from payslip_lib import render_payslip, pdf_file_name
+        sheet, row = matches[0]
+        payslip = render_payslip(sheet, row)
+        if output == 'text':
+            self._send(200, payslip.text(), 'text/plain; charset=utf-8')
+            return
+        file_name = pdf_file_name(sheet.employee_name(row), time.strftime("%Y%m%d_%H%M%S"))
+        self._send(200, store.render_pdf(payslip), 'application/pdf',
+                   {'Content-Disposition': f'inline; filename="{file_name}"'})
+
+
+class PayslipService(ThreadingHTTPServer):
+    """HTTP server answering requests on a fixed pool of worker threads."""
+    daemon_threads = True
+
+    def __init__(self, store, host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS):
+        super().__init__((host, port), PayslipRequestHandler)
+        self.store = store
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='payslip-service')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve payslip PDFs and text for a payroll workbook on localhost.")
+    parser.add_argument('workbook', help="payroll workbook (.xlsx or .xls)")
+    parser.add_argument('--host', default=SERVICE_HOST, help=f"address to listen on (default {SERVICE_HOST})")
+    parser.add_argument('--port', type=int, default=SERVICE_PORT, help=f"port (default {SERVICE_PORT})")
+    parser.add_argument('--workers', type=int, default=SERVICE_WORKERS,
+                        help=f"requests rendered at once (default {SERVICE_WORKERS})")
+    parser.add_argument('--pdf-backend', choices=['qt', 'builtin'],
+                        help="qt draws the application's PDFs (default when PyQt5 is installed); "
+                             "builtin needs no Qt")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from pdf_render import select_backend, ensure_gui_application
+    backend = select_backend(args.pdf_backend)
+    if backend == 'qt':
+        # Created on the main thread; the PDFs are drawn on the worker threads
+        ensure_gui_application()
+
+    store = PayslipStore(os.path.abspath(args.workbook), backend)
+    # payslip_config.json is read from the working directory, as the application does
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    store.load()
+    store.warm_up()
+    service = PayslipService(store, args.host, args.port, args.workers)
+    logger.info(f"Serving payslips on http://{args.host}:{service.server_address[1]}/")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Payslip text to PDF bytes, with a choice of backend.
+
+    qt       QTextDocument printed into a QPdfWriter: the application's own PDFs.
+             Needs PyQt5's QtGui (not QtWidgets) and a QGuiApplication, which
+             is created on first use, offscreen when there is no display.
+    builtin  A small pure-Python writer: the text in the standard Courier font
+             on the same paper and margins. Needs nothing and starts at once,
+             but the layout is close to, not identical with, the qt backend.
+
+This module imports no Qt at import time; the qt backend imports it when used.
+"""
+import os
+import sys
+import zlib
+import logging
+import importlib.util
+
+logger = logging.getLogger('PdfRender')
+
+# Environment variable choosing the backend when none is given: qt or builtin
+BACKEND_ENV = 'PAYSLIP_PDF_BACKEND'
+
+PORTRAIT = 0
+LANDSCAPE = 1  # QPrinter.Landscape and QPageLayout.Landscape
+
+# The application's default page settings (see print_manager.PageSettingsManager)
+PAGE_SETTINGS = {
+    "paper_size": None,
+    "custom_size": (220, 200),  # (width, height) in mm, used instead of paper_size when set
+    "margins": {"top": 0, "bottom": 0, "left": 0, "right": 0},
+    "orientation": PORTRAIT,
+    "font_family": "Courier New",
+    "font_size": 10,
+}
+
+# Paper sizes in mm by Qt page size id (QPrinter.A4, QPageSize.B5, ...), for the builtin backend
+PAPER_SIZES_MM = {
+    0: (210.0, 297.0),    # A4
+    1: (176.0, 250.0),    # B5
+    2: (215.9, 279.4),    # Letter
+    3: (215.9, 355.6),    # Legal
+    4: (190.5, 254.0),    # Executive
+    8: (297.0, 420.0),    # A3
+    9: (148.0, 210.0),    # A5
+    19: (250.0, 353.0),   # B4
+}
+
+# Builtin layout: line spacing per point of font size and QTextDocument's default margin
+LINE_SPACING = 1.15
+DOCUMENT_MARGIN_PT = 3.0
+
+POINTS_PER_MM = 72 / 25.4
+
+_gui_application = None
+
+
+def _settings(settings):
+    merged = dict(PAGE_SETTINGS)
+    if settings:
+        merged.update(settings)
+    return merged
+
+
+def page_size_mm(settings):
+    """Paper (width, height) in millimetres of the settings, as oriented"""
+    if settings.get("custom_size"):
+        size = settings["custom_size"]
+        width, height = (size.width(), size.height()) if hasattr(size, 'width') else size
+    else:
+        paper_size = int(settings.get("paper_size") or 0)
+        if paper_size not in PAPER_SIZES_MM:
+            raise ValueError(f"Paper size {paper_size} is not known to the builtin PDF backend; "
+                             f"use custom_size or the qt backend")
+        width, height = PAPER_SIZES_MM[paper_size]
+    if int(settings.get("orientation") or PORTRAIT) == LANDSCAPE:
+        return height, width
+    return width, height
+
+
+def qt_available():
+    return importlib.util.find_spec('PyQt5') is not None
+
+
+def available_backends():
+    """Names of the backends usable here, the default first"""
+    return ['qt', 'builtin'] if qt_available() else ['builtin']
+
+
+def select_backend(backend=None):
+    """Resolve a backend name: the one given, else $PAYSLIP_PDF_BACKEND, else qt when installed."""
+    backend = (backend or os.environ.get(BACKEND_ENV) or available_backends()[0]).lower()
+    if backend not in ('qt', 'builtin'):
+        raise ValueError(f"Unknown PDF backend '{backend}'; use qt or builtin")
+    if backend == 'qt' and not qt_available():
+        raise RuntimeError("The qt PDF backend needs PyQt5; install it or use the builtin backend")
+    return backend
+
+
+def ensure_gui_application():
+    """Create the QGuiApplication QPdfWriter needs, if there is no Qt application yet.
+
+    Call from the main thread before rendering on other threads.
+    """
+    global _gui_application
+    from PyQt5.QtGui import QGuiApplication
+    if QGuiApplication.instance() is None:
+        if sys.platform.startswith('linux') and not os.environ.get('DISPLAY') \
+                and not os.environ.get('WAYLAND_DISPLAY'):
+            os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        _gui_application = QGuiApplication(sys.argv[:1])
+    return QGuiApplication.instance()
+
+
+def configure_pdf_writer(writer, settings):
+    """Give a QPdfWriter the paper, margins and orientation of the settings"""
+    from PyQt5.QtCore import QMarginsF, QSizeF
+    from PyQt5.QtGui import QGuiApplication, QPageSize, QPageLayout
+    if settings.get("custom_size"):
+        size = settings["custom_size"]
+        page_size = QPageSize(size if isinstance(size, QSizeF) else QSizeF(*size), QPageSize.Millimeter)
+    else:
+        page_size = QPageSize(QPageSize.PageSizeId(int(settings.get("paper_size") or 0)))
+    margins = settings.get("margins", {"top": 0, "bottom": 0, "left": 0, "right": 0})
+    orientation = QPageLayout.Landscape if int(settings.get("orientation") or PORTRAIT) == LANDSCAPE \
+        else QPageLayout.Portrait
+    layout = QPageLayout(page_size, orientation, QMarginsF(
+        float(margins["left"]), float(margins["top"]), float(margins["right"]), float(margins["bottom"])),
+        QPageLayout.Millimeter)
+    layout.setMode(QPageLayout.FullPageMode)  # As QPrinter.setFullPage(True)
+    writer.setPageLayout(layout)
+    # A default QPrinter lays text out at screen resolution; the same keeps the PDFs identical
+    writer.setResolution(int(QGuiApplication.primaryScreen().logicalDotsPerInch()))
+
+
+def configure_document(doc, settings):
+    """Set a QTextDocument's font from the settings"""
+    from PyQt5.QtGui import QFont
+    doc.setDefaultFont(QFont(settings.get("font_family", "Courier New"), settings.get("font_size", 10)))
+
+
+def render_qt(content, settings=None):
+    """PDF bytes of the content drawn by Qt; safe on worker threads once the application exists"""
+    from PyQt5.QtCore import QBuffer, QByteArray, QIODevice
+    from PyQt5.QtGui import QPdfWriter, QTextDocument
+    settings = _settings(settings)
+    ensure_gui_application()
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    writer = QPdfWriter(buffer)
+    configure_pdf_writer(writer, settings)
+    doc = QTextDocument()
+    doc.setPlainText(str(content))
+    configure_document(doc, settings)
+    doc.print_(writer)
+    del writer  # Finishes the PDF
+    buffer.close()
+    return bytes(data)
+
+
+def _pdf_string(line):
+    data = line.expandtabs(8).encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def render_builtin(content, settings=None):
+    """PDF bytes of the content in Courier, one text line per line, paginated to the page height"""
+    settings = _settings(settings)
+    width, height = (size * POINTS_PER_MM for size in page_size_mm(settings))
+    margins = {side: float(value) * POINTS_PER_MM for side, value in settings["margins"].items()}
+    font_size = float(settings.get("font_size", 10))
+    leading = font_size * LINE_SPACING
+    top = height - margins["top"] - DOCUMENT_MARGIN_PT - font_size
+    left = margins["left"] + DOCUMENT_MARGIN_PT
+    usable = height - margins["top"] - margins["bottom"] - 2 * DOCUMENT_MARGIN_PT
+    lines_per_page = max(1, int(usable // leading))
+
+    lines = content.split('\n') if isinstance(content, str) else content.lines()
+    pages = [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Page tree, once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>",
+    ]
+    page_refs = []
+    for page in pages:
+        stream = b"BT /F1 %.2f Tf %.2f TL %.2f %.2f Td " % (font_size, leading, left, top)
+        stream += b" T* ".join(_pdf_string(line) + b" Tj" for line in page) + b" ET"
+        stream = zlib.compress(stream)
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (width, height, content_ref))
+        page_refs.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % ref for ref in page_refs), len(page_refs))
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def render_pdf(content, backend=None, settings=None):
+    """PDF bytes of payslip text, or of a payslip_layout.Payslip, with the chosen backend (see select_backend).
+
+    settings overrides PAGE_SETTINGS, e.g. {"custom_size": (210, 297)}.
+    """
+    if select_backend(backend) == 'qt':
+        return render_qt(content, settings)
+    return render_builtin(content, settings)
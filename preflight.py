@@ -0,0 +1,115 @@
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('Preflight')
+
+ERROR = 'error'
+WARNING = 'warning'
+
+# Layout fields checked as IDs: blank, fractional or negative values are errors
+ID_COLUMNS = ('EMP NO', 'EPF NO', 'A/C NO')
+
+
+def _issue(severity, message, row=None, column=None):
+    """Build an issue record. row is the DataFrame row position, or None for sheet-wide issues."""
+    return {'severity': severity, 'row': row, 'column': column, 'message': message}
+
+
+def _rows_issues(mask, severity, message, column):
+    """One issue per row where a boolean column mask is set."""
+    return [_issue(severity, message, int(row), column) for row in np.flatnonzero(mask)]
+
+
+def _check_ids(df, layout):
+    """Null, non-integer or negative IDs would fail or print wrongly on the payslip.
+
+    Only EMP NO, E.P.F. NO and A/C NO are IDs. Other whole-number fields
+    (the FTC RATE) are left to the numeric checks; a blank one still cannot
+    be printed, so it is reported too.
+    """
+    issues = []
+    for position, name in layout.id_positions.items():
+        column = df.iloc[:, position]
+        if not pd.api.types.is_numeric_dtype(column):
+            column = pd.to_numeric(column, errors='coerce')
+        values = column.to_numpy(dtype='float64', na_value=np.nan)
+        missing = np.isnan(values)
+        issues += _rows_issues(missing, ERROR, f"{name} is blank", name)
+        if name in ID_COLUMNS:
+            invalid = ~missing & ((values != np.floor(values)) | (values < 0))
+            issues += _rows_issues(invalid, ERROR, f"{name} is not a whole number", name)
+    return issues
+
+
+def _check_duplicates(df, schema):
+    position = schema.position('EMP NO')
+    if position is None:
+        return []
+    column = df.iloc[:, position]
+    duplicated = (column.duplicated(keep=False) & column.notna()).to_numpy()
+    return _rows_issues(duplicated, WARNING, "EMP NO appears more than once in the sheet", 'EMP NO')
+
+
+def _check_dates(df, layout):
+    """Dates that cannot be read are printed as raw text instead of dd/mm/yyyy."""
+    issues = []
+    for position, name in layout.date_positions.items():
+        column = df.iloc[:, position]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            continue
+        values = column.to_numpy(dtype=object)
+        is_date = np.fromiter((isinstance(v, datetime) for v in values), dtype=bool, count=len(values))
+        candidates = np.flatnonzero(column.notna().to_numpy() & ~is_date)
+        text = pd.Series(values[candidates], dtype=object).astype(str).str.strip()
+        parsed = pd.to_datetime(text, errors='coerce', format='mixed')
+        bad_rows = np.zeros(len(df), dtype=bool)
+        bad_rows[candidates[(parsed.isna() & (text != '')).to_numpy()]] = True
+        issues += _rows_issues(bad_rows, WARNING, f"{name} is not a readable date", name)
+    return issues
+
+
+def validate_sheet(df, schema, layout, coercion_issues=()):
+    """Check a loaded sheet before any payslip is rendered.
+
+    Uses column-wise operations only, so the whole sheet is checked in a
+    fraction of a second even for thousands of rows.
+
+    Args:
+        df: Loaded sheet (with payslip number columns already coerced)
+        schema: SheetSchema of the sheet
+        layout: CompiledLayout the payslips will be rendered with
+        coercion_issues: Cells reported by coerce_numeric_columns
+
+    Returns:
+        List of issue dicts with 'severity' ('error' or 'warning'), 'row'
+        (row position or None), 'column' and 'message'. Rows with errors
+        cannot be rendered.
+    """
+    issues = [_issue(ERROR, f"Required column '{name}' is missing", column=name)
+              for name in layout.missing_columns]
+    if issues:
+        # Without the columns no payslip can be rendered; per-row checks add nothing
+        return issues
+
+    issues += _check_ids(df, layout)
+    issues += _check_duplicates(df, schema)
+    issues += _check_dates(df, layout)
+    issues += [_issue(WARNING, f"'{cell['value']}' is not a number and will print as blank",
+                      cell['row'], cell['column'])
+               for cell in coercion_issues]
+    issues.sort(key=lambda issue: (issue['row'] is not None, issue['row'] or 0))
+    logger.info(f"Pre-flight check found {len(issues)} issues in '{schema.sheet_name}'")
+    return issues
+
+
+def error_rows(issues):
+    """Row positions that cannot be rendered, or None if the whole sheet is blocked."""
+    rows = set()
+    for issue in issues:
+        if issue['severity'] == ERROR:
+            if issue['row'] is None:
+                return None
+            rows.add(issue['row'])
+    return rows
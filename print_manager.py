@@ -1,16 +1,23 @@
 import os
 import logging
+import threading
 from datetime import datetime
-from PyQt5.QtCore import QObject, pyqtSignal, QThread, QSizeF, Qt
-from PyQt5.QtWidgets import QMessageBox, QDialog, QProgressBar, QLabel, QVBoxLayout, QPushButton, QHBoxLayout, QFileDialog, QApplication, QProgressDialog, QCheckBox, QComboBox
+from collections import OrderedDict
+from PyQt5.QtCore import QObject, pyqtSignal, QThread, QSizeF, QSize, Qt, QEventLoop, QAbstractListModel, QModelIndex
+from PyQt5.QtWidgets import QMessageBox, QDialog, QProgressBar, QLabel, QVBoxLayout, QPushButton, QHBoxLayout, QFileDialog, QApplication, QProgressDialog, QCheckBox, QComboBox, QListView, QSpinBox
 from PyQt5.QtPrintSupport import QPrinter, QPrintDialog, QPrintPreviewDialog, QPrinterInfo
-from PyQt5.QtGui import QTextDocument, QFont
+from PyQt5.QtGui import QTextDocument, QImage, QPixmap, QPainter
 import uuid
 import math
+from progress_bus import ProgressBus, format_duration
+from profiling import profiled, thread_profile
 
 # Set up logging
 logger = logging.getLogger('PrintManager')
 
+# Most threads rendering PDFs at once in bulk generation
+PDF_RENDER_WORKERS = 4
+
 def is_printer_available():
     """Check if any printers are available on the system"""
     return True
@@ -88,23 +95,197 @@ class PDFGeneratorWorker(QThread):
         self.cancelled = True
 
 
+class PDFPipelineWorker(QThread):
+    """Worker thread generating payslip PDFs through a staged pipeline.
+
+    Employees are read, rendered to text, rendered to PDF in memory and
+    written to disk by separate stages joined by bounded queues (see
+    bulk_pipeline), so PDF rendering overlaps with writing and memory stays
+    flat however many employees there are.
+    """
+    job_complete = pyqtSignal(bool, str)  # success, message
+    batch_done = pyqtSignal(int)  # employees processed; call continue_batch() or cancel() to go on
+
+    def __init__(self, employees, content_generator, output_directory, batch_size=None, pdf_workers=None):
+        """
+        Args:
+            employees: Iterable of employee entries (read lazily, from the pipeline's own thread)
+            content_generator: Function that takes employee info and returns payslip content
+            output_directory: Directory to save the PDFs in
+            batch_size: Pause after every batch_size employees until continue_batch() is called
+            pdf_workers: Threads rendering PDFs (default: one per CPU, at most PDF_RENDER_WORKERS)
+        """
+        super().__init__()
+        from bulk_pipeline import Pipeline, Stage
+        self.employees = employees
+        self.content_generator = content_generator
+        self.output_directory = output_directory
+        self.batch_size = batch_size
+        pdf_workers = pdf_workers or min(PDF_RENDER_WORKERS, os.cpu_count() or 1)
+        self.pipeline = Pipeline([
+            Stage('text', self._render_text),
+            Stage('pdf', self._render_pdf, pdf_workers),
+            Stage('write', self._write),
+        ])
+        self.cancelled = False
+        self._completed = 0
+        self._progress = threading.Condition()
+        self._next_batch = threading.Event()
+
+    def _source(self):
+        for i, employee in enumerate(self.employees):
+            if self.batch_size and i and i % self.batch_size == 0:
+                # Let the batch finish, then wait for the go-ahead
+                with self._progress:
+                    self._progress.wait_for(lambda: self._completed >= i or self.cancelled)
+                if self.cancelled:
+                    return
+                self._next_batch.clear()
+                self.batch_done.emit(i)
+                self._next_batch.wait()
+            if self.cancelled:
+                return
+            yield {'employee': employee, 'name': employee.get('name', f"Employee {i+1}")}
+
+    def _render_text(self, job):
+        job['content'] = self.content_generator(job['employee'])
+        return job
+
+    def _render_pdf(self, job):
+        job['pdf'] = render_pdf_bytes(job.pop('content'))
+        return job
+
+    def _write(self, job):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]  # Include milliseconds
+        job['path'] = pdf_file_path(job['name'], self.output_directory, timestamp)
+        try:
+            with open(job['path'], 'wb') as f:
+                f.write(job.pop('pdf'))
+        except Exception:
+            discard_pdf(job['path'])
+            raise
+        return job
+
+    def _finish_job(self):
+        with self._progress:
+            self._completed += 1
+            self._progress.notify_all()
+
+    def _on_result(self, job):
+        self._finish_job()
+        self.job_complete.emit(True, f"Generated PDF for {job['name']}")
+
+    def _on_error(self, job, stage, error):
+        logger.error(f"Error processing {job['name']} ({stage}): {str(error)}")
+        self._finish_job()
+        self.job_complete.emit(False, f"Failed to generate PDF for {job['name']}")
+
+    def run(self):
+        try:
+            with thread_profile('pdf-worker'):
+                self.pipeline.run(self._source(), self._on_result, self._on_error)
+        except Exception as e:
+            logger.error(f"Error reading employees for PDF generation: {str(e)}")
+
+    def continue_batch(self):
+        self._next_batch.set()
+
+    def cancel(self):
+        """Stop generating; PDFs already written are kept"""
+        self.cancelled = True
+        self.pipeline.cancel()
+        with self._progress:
+            self._progress.notify_all()
+        self._next_batch.set()
+
+
+class RawPrintWorker(QThread):
+    """Worker thread writing payslips as a raw text stream to a printer, file or device"""
+    process_finished = pyqtSignal(int, int, str)  # success_count, error_count, error message ('' if none)
+    single_job_complete = pyqtSignal(bool, str)  # success, message
+
+    def __init__(self, employees, content_generator, lines, path=None, printer_name=None,
+                 escp=True, pitch=10, lines_per_inch=None):
+        """
+        Args:
+            employees: Employee entries, as for bulk PDFs
+            content_generator: Function that takes employee info and returns payslip content
+            lines: Page length in lines
+            path: File or device to write to, or None to use printer_name
+            printer_name: Printer queue to send the raw stream to
+            escp: Start the stream with ESC/P page length and pitch commands
+            pitch: Characters per inch (10, 12 or 15)
+        """
+        super().__init__()
+        from raw_print import LINES_PER_INCH
+        self.employees = employees
+        self.content_generator = content_generator
+        self.lines = lines
+        self.path = path
+        self.printer_name = printer_name
+        self.escp = escp
+        self.pitch = pitch
+        self.lines_per_inch = lines_per_inch or LINES_PER_INCH
+        self.cancelled = False
+        self.success_count = 0
+        self.error_count = 0
+
+    def _payslips(self):
+        """Payslip texts rendered on demand; employees that fail are reported and skipped"""
+        for i, employee in enumerate(self.employees):
+            if self.cancelled:
+                return
+            emp_name = employee.get('name', f"Employee {i+1}")
+            try:
+                payslip_content = self.content_generator(employee)
+            except Exception as e:
+                logger.error(f"Error generating payslip for {emp_name}: {str(e)}")
+                self.error_count += 1
+                self.single_job_complete.emit(False, f"Failed to generate payslip for {emp_name}")
+                payslip_content = None
+            if payslip_content is not None:
+                self.success_count += 1
+                self.single_job_complete.emit(True, f"Sent payslip for {emp_name}")
+                yield payslip_content
+
+    def run(self):
+        from raw_print import RawOutput, raw_stream
+        error = ''
+        try:
+            with thread_profile('raw-print-worker'), RawOutput(self.path, self.printer_name) as output:
+                for chunk in raw_stream(self._payslips(), self.lines, self.escp, self.pitch,
+                                        self.lines_per_inch):
+                    output.write(chunk)
+        except Exception as e:
+            logger.error(f"Error in raw printing: {str(e)}")
+            error = str(e)
+        self.process_finished.emit(self.success_count, self.error_count, error)
+
+    def cancel(self):
+        """Stop after the payslip being rendered; what was sent so far is printed"""
+        self.cancelled = True
+
+
 class PDFProgressDialog(QDialog):
     """Dialog displaying PDF generation progress"""
-    def __init__(self, parent=None, total_count=0):
+    def __init__(self, parent=None, total_count=0, title="Generating PDF Payslips",
+                 verb="Generating", done="Generated", noun="PDF payslips"):
         super().__init__(parent)
-        self.setWindowTitle("Generating PDF Payslips")
+        self.setWindowTitle(title)
         self.setMinimumWidth(400)
+        self.verb, self.done, self.noun = verb, done, noun
 
         # Create layout
         layout = QVBoxLayout()
 
-        # Status label
-        self.status_label = QLabel(f"Generating 0/{total_count} PDF payslips...")
+        # Status label (total_count is None when the rows are streamed and not counted yet)
+        self.status_label = QLabel(f"{verb} 0/{total_count} {noun}..." if total_count
+                                   else f"{verb} {noun}...")
         layout.addWidget(self.status_label)
 
-        # Progress bar
+        # Progress bar (busy indicator when the total is unknown)
         self.progress_bar = QProgressBar()
-        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setRange(0, 100 if total_count else 0)
         self.progress_bar.setValue(0)
         layout.addWidget(self.progress_bar)
 
@@ -126,12 +307,34 @@ class PDFProgressDialog(QDialog):
         """Update progress bar and status"""
         self.progress_bar.setValue(progress)
         completed = int(progress * self.total_count / 100)
-        self.status_label.setText(f"Generating {completed}/{self.total_count} PDF payslips...")
+        self.status_label.setText(f"{self.verb} {completed}/{self.total_count} {self.noun}...")
+
+    def update_count(self, completed):
+        """Update status when the total is unknown"""
+        self.status_label.setText(f"{self.done} {completed} {self.noun}...")
 
     def update_current_job(self, success, message):
         """Update current job status"""
         self.current_job.setText(message)
 
+    def show_progress(self, snapshot):
+        """Show a ProgressBus snapshot: counts, failures, payslips per second and time left"""
+        done, total = snapshot['done'], snapshot['total']
+        failed = f", {snapshot['failed']} failed" if snapshot['failed'] else ""
+        if total:
+            self.progress_bar.setValue(int(done * 100 / total))
+            self.status_label.setText(f"{self.verb} {done}/{total} {self.noun}{failed}...")
+        else:
+            self.status_label.setText(f"{self.done} {done} {self.noun}{failed}...")
+        speed = f"{snapshot['rate']:.1f} per second"
+        if snapshot['eta'] is not None:
+            speed += f", about {format_duration(snapshot['eta'])} left"
+        self.current_job.setText(f"{snapshot['message']}\n{speed}" if snapshot['message'] else speed)
+
+    def attach(self, bus):
+        """Show the progress of a ProgressBus; Cancel stays with the caller"""
+        bus.updated.connect(self.show_progress)
+
 
 class PageSettingsManager:
     """Centralized manager for page settings configuration using Singleton pattern"""
@@ -152,7 +355,10 @@ class PageSettingsManager:
                 "padding": 0,
                 "orientation": QPrinter.Portrait,
                 "font_family": "Courier New",
-                "font_size": 10
+                "font_size": 10,
+                # Raw text printing (dot-matrix printers)
+                "lines_per_inch": 6,
+                "raw_pitch": 10
             }
             self._initialized = True
 
@@ -175,16 +381,18 @@ class PageSettingsManager:
         printer.setFullPage(True)  # Enable full page printing
         printer.setFromTo(0, 0)  # This tricks the printer into not showing page numbers
         printer.setPrintRange(QPrinter.AllPages)
+    def configure_pdf_writer(self, writer):
+        """Configure a QPdfWriter like configure_printer configures a PDF QPrinter"""
+        from pdf_render import configure_pdf_writer
+        configure_pdf_writer(writer, self._settings)
+
     def configure_document(self, doc):
         """Configure document settings"""
-        font = QFont(
-            self._settings.get("font_family", "Courier New"),
-            self._settings.get("font_size", 10)
-        )
-        doc.setDefaultFont(font)
+        from pdf_render import configure_document
+        configure_document(doc, self._settings)
 
     def update(self, paper_size=None, custom_size=None, margins=None, padding=None,
-               orientation=None, font_family=None, font_size=None):
+               orientation=None, font_family=None, font_size=None, lines_per_inch=None, raw_pitch=None):
         """Update settings"""
         if paper_size:
             self._settings["paper_size"] = paper_size
@@ -202,12 +410,38 @@ class PageSettingsManager:
             self._settings["font_family"] = font_family
         if font_size:
             self._settings["font_size"] = font_size
+        if lines_per_inch:
+            self._settings["lines_per_inch"] = lines_per_inch
+        if raw_pitch:
+            self._settings["raw_pitch"] = raw_pitch
 
     @property
     def settings(self):
         """Get current settings"""
         return self._settings.copy()
 
+    def page_size_mm(self):
+        """Paper (width, height) in millimetres, as oriented for printing"""
+        from PyQt5.QtGui import QPageSize
+        if self._settings.get("custom_size"):
+            size = self._settings["custom_size"]
+        else:
+            page_size = self._settings.get("paper_size", QPrinter.B4)
+            size = QPageSize(QPageSize.PageSizeId(int(page_size))).size(QPageSize.Millimeter)
+        if self._settings.get("orientation") == QPrinter.Landscape:
+            return size.height(), size.width()
+        return size.width(), size.height()
+
+    def page_height_mm(self):
+        """Printable page height in millimetres: paper height less the top and bottom margins"""
+        margins = self._settings.get("margins", {"top": 0, "bottom": 0})
+        return self.page_size_mm()[1] - float(margins["top"]) - float(margins["bottom"])
+
+    def raw_page_lines(self):
+        """Page length in text lines for raw printing"""
+        from raw_print import page_lines
+        return page_lines(self.page_height_mm(), self._settings.get("lines_per_inch", 6))
+
     def get_page_height(self, printer):
         """Get the page height in pixels"""
         try:
@@ -320,9 +554,15 @@ class PayslipPDFGenerator:
         if self.progress_dialog:
             self.progress_dialog.current_job.setText("Cancelling...")
 
-    def generate_bulk_pdfs(self, employees, content_generator, ask_directory=True):
-        """Generate multiple payslip PDFs with batch processing"""
-        if not employees:
+    def generate_bulk_pdfs(self, employees, content_generator, ask_directory=True, total=None):
+        """Generate multiple payslip PDFs with batch processing
+
+        employees may be a list or any iterable (read as the job goes); pass
+        total when it is known but not a list.
+        """
+        if total is None and hasattr(employees, '__len__'):
+            total = len(employees)
+        if total == 0:
             QMessageBox.warning(self.parent, "No Data", "No employees selected for PDF generation.")
             return
 
@@ -334,11 +574,14 @@ class PayslipPDFGenerator:
 
             if not os.path.exists(output_dir):
                 os.makedirs(output_dir)
+            self.cancelled = False
 
-            # Create progress dialog
-            self.progress_dialog = PDFProgressDialog(self.parent, len(employees))
+            # Create progress dialog, repainted at a fixed rate however fast the PDFs are made
+            self.progress_dialog = PDFProgressDialog(self.parent, total)
             self.progress_dialog.cancel_button.clicked.connect(self._cancel_generation)
             self.progress_dialog.show()
+            bus = ProgressBus(total, parent=self.progress_dialog)
+            self.progress_dialog.attach(bus)
 
             # Ask user for batch processing mode
             confirm_msg = QMessageBox(self.parent)
@@ -350,47 +593,33 @@ class PayslipPDFGenerator:
             confirm_msg.exec_()
             ask_each_batch = not auto_checkbox.isChecked()
 
-            # Process in batches
-            batch_size = 10
-            total_items = len(employees)
-            processed = 0
-            success_count = 0
-            error_count = 0
-
-            for i in range(0, total_items, batch_size):
-                if ask_each_batch and i > 0:
-                    reply = QMessageBox.question(
-                        self.parent, "Continue?",
-                        "Process next batch?",
-                        QMessageBox.Yes | QMessageBox.No,
-                        QMessageBox.Yes
-                    )
-                    if reply != QMessageBox.Yes:
-                        break
-
-                batch = employees[i:i + batch_size]
-                for employee in batch:
-                    if self.cancelled:
-                        break
-                    try:
-                        emp_name = employee.get('name', 'Employee')
-                        payslip_content = content_generator(employee)
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-                        pdf_path = generate_pdf(payslip_content, emp_name, output_dir, timestamp)
-                        if pdf_path:
-                            success_count += 1
-                            self.progress_dialog.update_current_job(True, f"Generated PDF for {emp_name}")
-                        else:
-                            error_count += 1
-                            self.progress_dialog.update_current_job(False, f"Failed to generate PDF for {emp_name}")
-                    except Exception as e:
-                        error_count += 1
-                        logger.error(f"Error processing {emp_name}: {str(e)}")
-                        self.progress_dialog.update_current_job(False, f"Error: {str(e)}")
-
-                processed += len(batch)
-                progress = int((processed / total_items) * 100)
-                self.progress_dialog.update_progress(progress)
+            # Render and write in a pipeline on worker threads; the window stays responsive meanwhile
+            worker = PDFPipelineWorker(employees, content_generator, output_dir,
+                                       batch_size=10 if ask_each_batch else None)
+            self.pdf_worker = worker
+
+            def on_batch_done(processed):
+                reply = QMessageBox.question(
+                    self.parent, "Continue?",
+                    "Process next batch?",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.Yes
+                )
+                if reply == QMessageBox.Yes:
+                    worker.continue_batch()
+                else:
+                    worker.cancel()
+
+            bus.connect_job(worker.job_complete)
+            worker.batch_done.connect(on_batch_done)
+            loop = QEventLoop()
+            worker.finished.connect(loop.quit)
+            bus.start()
+            worker.start()
+            loop.exec_()
+            bus.stop()
+            self.pdf_worker = None
+            success_count, error_count = bus.completed, bus.failed
 
             self._on_generation_finished(success_count, error_count, output_dir)
 
@@ -419,8 +648,14 @@ class PayslipPDFGenerator:
 
 
 class PrinterSelectionDialog(QDialog):
-    """Dialog for selecting a printer from available printers"""
-    def __init__(self, parent=None):
+    """Dialog for selecting a printer from available printers.
+
+    With allow_raw the payslips can also be sent as raw text, to a printer or
+    to a file or device, instead of being rendered as graphics.
+    """
+    RAW_TO_FILE = "Raw text to a file or device..."
+
+    def __init__(self, parent=None, allow_raw=False):
         super().__init__(parent)
         self.setWindowTitle("Select Printer")
         self.setMinimumWidth(300)
@@ -442,6 +677,19 @@ class PrinterSelectionDialog(QDialog):
         layout.addWidget(QLabel("Select Printer:"))
         layout.addWidget(self.printer_combo)
 
+        self.raw_checkbox = None
+        if allow_raw:
+            self.printer_combo.addItem(self.RAW_TO_FILE)
+            self.raw_checkbox = QCheckBox("Print as raw text (fast on dot-matrix printers)")
+            self.escp_checkbox = QCheckBox("Send ESC/P page length and pitch commands")
+            self.escp_checkbox.setChecked(True)
+            self.escp_checkbox.setEnabled(False)
+            self.raw_checkbox.toggled.connect(self.escp_checkbox.setEnabled)
+            self.printer_combo.currentTextChanged.connect(self._on_printer_changed)
+            layout.addWidget(self.raw_checkbox)
+            layout.addWidget(self.escp_checkbox)
+            self._on_printer_changed(self.printer_combo.currentText())
+
         # Buttons
         button_layout = QHBoxLayout()
         ok_button = QPushButton("OK")
@@ -457,9 +705,183 @@ class PrinterSelectionDialog(QDialog):
         self.setLayout(layout)
 
     def selected_printer(self):
-        """Return the name of the selected printer"""
+        """Return the name of the selected printer (None when writing raw text to a file)"""
+        if self.to_file():
+            return None
         return self.printer_combo.currentText()
 
+    def _on_printer_changed(self, text):
+        # A file or device only takes raw text
+        to_file = text == self.RAW_TO_FILE
+        if to_file:
+            self.raw_checkbox.setChecked(True)
+        self.raw_checkbox.setEnabled(not to_file)
+
+    def to_file(self):
+        return self.printer_combo.currentText() == self.RAW_TO_FILE
+
+    def raw_selected(self):
+        return self.raw_checkbox is not None and self.raw_checkbox.isChecked()
+
+    def escp_selected(self):
+        return self.raw_selected() and self.escp_checkbox.isChecked()
+
+
+# Rendered preview pages kept in memory; pages scrolled out of view beyond this are rendered again
+PREVIEW_CACHE_PAGES = 32
+
+# Preview zoom levels, in pixels per inch
+PREVIEW_ZOOMS = {"50%": 48, "75%": 72, "100%": 96, "150%": 144}
+
+
+class PayslipPageModel(QAbstractListModel):
+    """One item per payslip of a bulk job, rendered only when the view asks for it.
+
+    With uniform item sizes a view only asks for the rows it shows, so a job
+    of thousands of payslips opens instantly; rendered pages are kept in a
+    small LRU cache.
+    """
+
+    def __init__(self, employees, content_generator, render_page, cache_pages=PREVIEW_CACHE_PAGES, parent=None):
+        super().__init__(parent)
+        self.employees = employees
+        self.content_generator = content_generator
+        self.render_page = render_page
+        self.cache_pages = cache_pages
+        self._pages = OrderedDict()
+        self.rendered = 0  # Pages rendered so far, including re-renders after eviction
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.employees)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return f"{row + 1} / {len(self.employees)}  {self.employees[row].get('name', '')}"
+        if role == Qt.DecorationRole:
+            return self.page(row)
+        return None
+
+    def page(self, row):
+        """Rendered page of one payslip, from the cache when it is there"""
+        pixmap = self._pages.get(row)
+        if pixmap is not None:
+            self._pages.move_to_end(row)
+            return pixmap
+        try:
+            content = self.content_generator(self.employees[row])
+        except Exception as e:
+            logger.error(f"Error generating payslip preview for row {row}: {str(e)}")
+            content = f"Cannot render this payslip:\n{str(e)}"
+        pixmap = self.render_page(content)
+        self.rendered += 1
+        self._pages[row] = pixmap
+        while len(self._pages) > self.cache_pages:
+            self._pages.popitem(last=False)
+        return pixmap
+
+    def clear_cache(self):
+        self._pages.clear()
+        if self.employees:
+            self.dataChanged.emit(self.index(0), self.index(len(self.employees) - 1), [Qt.DecorationRole])
+
+
+class BulkPreviewDialog(QDialog):
+    """Scrollable preview of every page of a bulk print job, rendered as it comes into view"""
+
+    def __init__(self, parent, employees, content_generator, page_settings_manager):
+        super().__init__(parent)
+        self.setWindowTitle(f"Print Preview - {len(employees)} payslips")
+        self.setMinimumSize(900, 700)
+        self.page_settings_manager = page_settings_manager
+        self.dpi = PREVIEW_ZOOMS["50%"]
+
+        layout = QVBoxLayout()
+        top_layout = QHBoxLayout()
+        top_layout.addWidget(QLabel("Zoom:"))
+        self.zoom_combo = QComboBox()
+        self.zoom_combo.addItems(list(PREVIEW_ZOOMS))
+        self.zoom_combo.currentTextChanged.connect(self.on_zoom_changed)
+        top_layout.addWidget(self.zoom_combo)
+        top_layout.addWidget(QLabel("Go to payslip:"))
+        self.goto_spin = QSpinBox()
+        self.goto_spin.setRange(1, max(1, len(employees)))
+        self.goto_spin.valueChanged.connect(self.go_to)
+        top_layout.addWidget(self.goto_spin)
+        top_layout.addStretch()
+        layout.addLayout(top_layout)
+
+        self.model = PayslipPageModel(employees, content_generator, self.render_page, parent=self)
+        self.view = QListView()
+        self.view.setViewMode(QListView.IconMode)
+        self.view.setMovement(QListView.Static)
+        self.view.setResizeMode(QListView.Adjust)
+        self.view.setSpacing(8)
+        # Every page has the same size, so the view never asks for pages it does not show
+        self.view.setUniformItemSizes(True)
+        self.view.setModel(self.model)
+        self._apply_page_size()
+        layout.addWidget(self.view)
+
+        button_layout = QHBoxLayout()
+        print_button = QPushButton("Print...")
+        print_button.clicked.connect(self.accept)
+        button_layout.addWidget(print_button)
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.reject)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def _page_pixels(self):
+        width_mm, height_mm = self.page_settings_manager.page_size_mm()
+        return QSize(int(width_mm / 25.4 * self.dpi), int(height_mm / 25.4 * self.dpi))
+
+    def _apply_page_size(self):
+        size = self._page_pixels()
+        self.view.setIconSize(size)
+        self.view.setGridSize(QSize(size.width() + 16, size.height() + 32))
+
+    def render_page(self, content):
+        """Draw a payslip page as it will print: paper size, margins and font from the page settings"""
+        size = self._page_pixels()
+        image = QImage(size, QImage.Format_RGB32)
+        dots_per_meter = int(self.dpi / 0.0254)
+        image.setDotsPerMeterX(dots_per_meter)
+        image.setDotsPerMeterY(dots_per_meter)
+        image.fill(Qt.white)
+
+        margins = self.page_settings_manager.settings.get("margins", {"top": 0, "bottom": 0, "left": 0, "right": 0})
+        left = float(margins["left"]) / 25.4 * self.dpi
+        top = float(margins["top"]) / 25.4 * self.dpi
+        right = float(margins["right"]) / 25.4 * self.dpi
+        doc = QTextDocument()
+        doc.documentLayout().setPaintDevice(image)
+        self.page_settings_manager.configure_document(doc)
+        doc.setPlainText(str(content))
+        doc.setTextWidth(size.width() - left - right)
+
+        painter = QPainter(image)
+        painter.translate(left, top)
+        doc.drawContents(painter)
+        painter.resetTransform()
+        painter.setPen(Qt.gray)
+        painter.drawRect(0, 0, size.width() - 1, size.height() - 1)
+        painter.end()
+        return QPixmap.fromImage(image)
+
+    def on_zoom_changed(self, zoom):
+        self.dpi = PREVIEW_ZOOMS[zoom]
+        self._apply_page_size()
+        self.model.clear_cache()
+
+    def go_to(self, number):
+        index = self.model.index(number - 1)
+        self.view.setCurrentIndex(index)
+        self.view.scrollTo(index, QListView.PositionAtTop)
+
 
 class PayslipPrintManager:
     """Enhanced print manager that handles both printing and PDF generation for B4 paper size"""
@@ -498,7 +920,7 @@ class PayslipPrintManager:
 
     def _add_page_breaks(self, content, page_height):
         """Add page breaks based on content height and page height"""
-        lines = content.split('\n')
+        lines = content.split('\n') if isinstance(content, str) else content.lines()
         pages = []
         current_page = []
         current_height = 0
@@ -605,13 +1027,25 @@ class PayslipPrintManager:
             success = True
             error_count = 0  # Initialize error count
 
+            # Printing runs on this thread; events are handled only at the bus's repaint rate
+            dialog = PDFProgressDialog(self.parent, len(employees), title="Printing Payslips",
+                                       verb="Printing", done="Printed", noun="payslips")
+            cancelled = []
+            dialog.cancel_button.clicked.connect(lambda: cancelled.append(True))
+            bus = ProgressBus(len(employees), parent=dialog)
+            dialog.attach(bus)
+            dialog.show()
+            bus.start()
+
             for employee in employees:
+                bus.pump()
+                if cancelled:
+                    logger.info("Bulk printing cancelled by user")
+                    success = False
+                    break
                 try:
                     emp_name = employee.get('name', 'Employee')
                     payslip_content = content_generator(employee)
-                    doc = QTextDocument()
-                    doc.setPlainText(payslip_content)
-                    self.pdf_generator.page_settings_manager.configure_document(doc)
 
                     # Split content into pages
                     content_pages = self._add_page_breaks(payslip_content, page_height)
@@ -625,12 +1059,16 @@ class PayslipPrintManager:
                             printer.newPage()
 
                         doc.print_(printer)
+                    bus.record(True, f"Printed payslip for {emp_name}")
 
                 except Exception as e:
                     error_count += 1
                     success = False
                     logger.error(f"Error printing for {emp_name}: {str(e)}")
+                    bus.record(False, f"Failed to print payslip for {emp_name}")
 
+            bus.stop()
+            dialog.close()
             return success
 
         except Exception as e:
@@ -644,6 +1082,7 @@ class PayslipPrintManager:
             return dialog.selected_printer()
         return None
 
+    @profiled('print_single')
     def print_single_payslip(self, payslip_content, employee_name="Employee", show_printer_dialog=True):
         """Print a single payslip with printer selection"""
         try:
@@ -675,6 +1114,7 @@ class PayslipPrintManager:
             QMessageBox.critical(self.parent, "Print Error", f"Error printing payslip: {str(e)}")
             return False
 
+    @profiled('print_preview')
     def print_with_preview(self, payslip_content, employee_name="Employee"):
         """Show print preview dialog before printing with appropriate page settings"""
         try:
@@ -721,10 +1161,65 @@ class PayslipPrintManager:
         """Generate a single PDF - delegate to PDF generator"""
         return self.pdf_generator.generate_single_pdf(employee_name, payslip_content, ask_directory)
 
-    def generate_bulk_pdfs(self, employees, content_generator, ask_directory=True):
+    @profiled('bulk_pdf')
+    def generate_bulk_pdfs(self, employees, content_generator, ask_directory=True, total=None):
         """Generate bulk PDFs - delegate to PDF generator"""
-        return self.pdf_generator.generate_bulk_pdfs(employees, content_generator, ask_directory)
+        return self.pdf_generator.generate_bulk_pdfs(employees, content_generator, ask_directory, total)
 
+    @profiled('bulk_preview')
+    def preview_bulk_payslips(self, employees, content_generator):
+        """Preview every payslip of a bulk print job; True if the user chose to print them"""
+        if not employees:
+            QMessageBox.warning(self.parent, "No Data", "No employees selected for preview.")
+            return False
+        dialog = BulkPreviewDialog(self.parent, employees, content_generator,
+                                   self.pdf_generator.page_settings_manager)
+        accepted = dialog.exec_() == QDialog.Accepted
+        logger.info(f"Bulk preview rendered {dialog.model.rendered} of {len(employees)} pages")
+        return accepted
+
+    @profiled('bulk_raw_print')
+    def print_bulk_raw(self, employees, content_generator, path=None, printer_name=None, escp=True):
+        """Print payslips as a raw text stream (plain text with form feeds, optionally ESC/P).
+
+        The text goes to the printer without being rendered as graphics, so
+        impact printers print at their own text speed. The page length comes
+        from the page settings. Returns True if every payslip was sent.
+        """
+        settings = self.pdf_generator.page_settings_manager
+        worker = RawPrintWorker(employees, content_generator, settings.raw_page_lines(), path, printer_name,
+                                escp, settings.settings.get("raw_pitch", 10),
+                                settings.settings.get("lines_per_inch"))
+        dialog = PDFProgressDialog(self.parent, len(employees), title="Printing Payslips",
+                                   verb="Printing", done="Printed", noun="payslips")
+        dialog.cancel_button.clicked.connect(worker.cancel)
+        bus = ProgressBus(len(employees), parent=dialog)
+        dialog.attach(bus)
+        bus.connect_job(worker.single_job_complete)
+        result = {}
+        worker.process_finished.connect(lambda success, errors, error: result.update(
+            success=success, errors=errors, error=error))
+
+        # The window stays responsive while the worker renders and sends the payslips
+        loop = QEventLoop()
+        worker.finished.connect(loop.quit)
+        dialog.show()
+        bus.start()
+        worker.start()
+        loop.exec_()
+        bus.stop()
+        dialog.close()
+
+        target = path or printer_name
+        if result.get('error'):
+            QMessageBox.critical(self.parent, "Print Error", f"Raw printing to {target} failed: {result['error']}")
+            return False
+        message = (f"Raw printing to {target} {'cancelled' if worker.cancelled else 'completed'}.\n"
+                   f"Sent: {result['success']}\nFailed: {result['errors']}")
+        QMessageBox.information(self.parent, "Printing Complete", message)
+        return not worker.cancelled and result['errors'] == 0
+
+    @profiled('bulk_print')
     def print_bulk_payslips(self, employees, content_generator, show_printer_dialog=True):
         """Print multiple payslips with printer selection"""
         if not employees:
@@ -733,7 +1228,20 @@ class PayslipPrintManager:
 
         printer_name = None
         if show_printer_dialog:
-            printer_name = self.get_printer_selection()
+            dialog = PrinterSelectionDialog(self.parent, allow_raw=True)
+            if dialog.exec_() != QDialog.Accepted:
+                return False
+            if dialog.raw_selected():
+                path = None
+                if dialog.to_file():
+                    path, _ = QFileDialog.getSaveFileName(
+                        self.parent, "Save Raw Print Stream", os.path.join(self.output_directory, "payslips.prn"),
+                        "Printer files (*.prn *.txt);;All files (*)")
+                    if not path:
+                        return False
+                return self.print_bulk_raw(employees, content_generator, path, dialog.selected_printer(),
+                                           dialog.escp_selected())
+            printer_name = dialog.selected_printer()
             if not printer_name:
                 return False
 
@@ -748,17 +1256,51 @@ class PayslipPrintManager:
 PayslipPrinter = PayslipPDFGenerator
 
 
+def pdf_file_path(employee_name, output_directory, timestamp):
+    """Path of a new payslip PDF, e.g. Payslip_JOHN_SILVA_20240131_101500.pdf.
+
+    The file is created empty so no other payslip can take the name; when
+    employees share a name (or have none) within the same timestamp, _2, _3...
+    is added before .pdf instead of overwriting the earlier payslip.
+    """
+    from payslip_lib import pdf_file_name
+    base, extension = os.path.splitext(os.path.join(output_directory, pdf_file_name(employee_name, timestamp)))
+    path, number = base + extension, 1
+    while True:
+        try:
+            with open(path, 'xb'):
+                return path
+        except FileExistsError:
+            number += 1
+            path = f"{base}_{number}{extension}"
+
+
+def discard_pdf(path):
+    """Remove a payslip PDF that was not written completely, so no empty or cut-off file is left"""
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning(f"Could not remove incomplete PDF {path}: {str(e)}")
+
+
+def render_pdf_bytes(content):
+    """Render payslip content to PDF file contents in memory, with the page settings.
+
+    Safe to call from worker threads: it paints into a QPdfWriter on a
+    QBuffer and touches no widget or file (see pdf_render.render_qt).
+    """
+    from pdf_render import render_qt
+    return render_qt(content, PageSettingsManager().settings)
+
+
 # Common PDF generation function used by both single and bulk operations
 def generate_pdf(content, employee_name, output_directory, timestamp):
     """Generate a PDF from payslip content using singleton PageSettingsManager"""
+    pdf_path = None
     try:
         settings_manager = PageSettingsManager()
 
-        safe_name = ''.join(c for c in employee_name if c.isalnum() or c in (' ', '-', '_')).strip()
-        safe_name = safe_name.replace(' ', '_')
-
-        filename = f"Payslip_{safe_name}_{timestamp}.pdf"
-        pdf_path = os.path.join(output_directory, filename)
+        pdf_path = pdf_file_path(employee_name, output_directory, timestamp)
 
         printer = QPrinter()
         printer.setOutputFormat(QPrinter.PdfFormat)
@@ -767,15 +1309,19 @@ def generate_pdf(content, employee_name, output_directory, timestamp):
 
 
         doc = QTextDocument()
-        doc.setPlainText(content)
+        doc.setPlainText(str(content))
 
         settings_manager.configure_printer(printer)
         settings_manager.configure_document(doc)
 
         doc.print_(printer)
+        if printer.printerState() == QPrinter.Error or os.path.getsize(pdf_path) == 0:
+            raise OSError(f"Could not write {pdf_path}")
 
         return pdf_path
 
     except Exception as e:
         logger.error(f"PDF generation error for {employee_name}: {str(e)}")
+        if pdf_path is not None:
+            discard_pdf(pdf_path)
         return None
\ No newline at end of file
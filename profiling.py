@@ -0,0 +1,298 @@
+import os
+import sys
+import time
+import pstats
+import logging
+import platform
+import cProfile
+import threading
+import functools
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger('Profiling')
+
+# Set to 1 (profiles go to ~/Payslips/profiles) or to a directory to profile bulk and print jobs
+PROFILE_ENV = 'PAYSLIP_PROFILE'
+
+# Seconds between stack samples of all threads
+SAMPLE_INTERVAL = 0.005
+
+# Lines in the readable reports
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 30
+
+# Frames kept per allocation traceback
+ALLOCATION_FRAMES = 10
+
+# From Python 3.12 cProfile sees every thread and only one profiler can be active in the process;
+# before, each thread needs its own profiler
+PROCESS_WIDE_PROFILER = sys.version_info >= (3, 12)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def profile_directory():
+    """Directory profiles are written to, or None when profiling is off."""
+    value = os.environ.get(PROFILE_ENV, '').strip()
+    if not value or value.lower() in ('0', 'false', 'no', 'off'):
+        return None
+    if value.lower() in ('1', 'true', 'yes', 'on'):
+        return os.path.join(os.path.expanduser("~"), "Payslips", "profiles")
+    return value
+
+
+def enable(directory=None):
+    """Profile the bulk and print jobs of this run, writing to directory (or the default)."""
+    os.environ[PROFILE_ENV] = directory or '1'
+    logger.info(f"Profiling bulk and print jobs into {profile_directory()}")
+
+
+def configure(argv):
+    """Handle --profile or --profile=DIR on the command line; returns the other arguments."""
+    remaining = []
+    for argument in argv:
+        if argument == '--profile':
+            enable()
+        elif argument.startswith('--profile='):
+            enable(argument.split('=', 1)[1])
+        else:
+            remaining.append(argument)
+    return remaining
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples the Python stacks of all threads on a timer and folds them.
+
+    The result is in the collapsed format read by flamegraph.pl and
+    speedscope: one line per distinct stack, 'thread;outer;...;inner count'.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.thread_names = {}  # Names of threads threading does not know, e.g. QThreads
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = dict(self.thread_names)
+            names.update((thread.ident, thread.name) for thread in threading.enumerate()
+                         if not isinstance(thread, threading._DummyThread))
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileSession:
+    """One profiled job: cProfile of every Python thread, tracemalloc and stack samples.
+
+    Profiling never changes what the job does: when a profiler cannot be
+    enabled (another one is active), that thread is left to the stack samples.
+
+    Writes into its own folder:
+        profile.pstats   cProfile statistics (python -m pstats, snakeviz)
+        profile.txt      the functions taking the most time, cumulative and own
+        allocations.txt  memory allocated during the job and still held, and the peak
+        stacks.folded    sampled stacks for a flame graph (flamegraph.pl, speedscope)
+        summary.txt      job, duration, machine and library versions
+    """
+
+    def __init__(self, name, directory, details=''):
+        self.name = name
+        self.details = details
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.path = os.path.join(directory, f"{name}_{stamp}")
+        self.profilers = []
+        self.sampler = StackSampler()
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+        self._enable_failed = False
+        self._started = None
+        self._started_at = None
+
+    def profile_current_thread(self):
+        """Start a cProfile profiler for the calling thread (merged into the report at the end), or None"""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            if not self._enable_failed:
+                self._enable_failed = True
+                logger.warning(f"cProfile unavailable ({str(e)}); only stack samples are recorded")
+            return None
+        with self._lock:
+            self.profilers.append(profiler)
+        return profiler
+
+    def _thread_hook(self, frame, event, arg):
+        # Called once in each new threading.Thread; enabling replaces this hook in that thread
+        if self.profile_current_thread() is None:
+            sys.setprofile(None)
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(ALLOCATION_FRAMES)
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self.sampler.start()
+        if not PROCESS_WIDE_PROFILER:
+            threading.setprofile(self._thread_hook)
+        self._started = time.perf_counter()
+        self._started_at = datetime.now()
+        self._main = self.profile_current_thread()
+
+    def stop(self):
+        elapsed = time.perf_counter() - self._started
+        if self._main is not None:
+            self._main.disable()
+        if not PROCESS_WIDE_PROFILER:
+            threading.setprofile(None)
+        self.sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            profilers = list(self.profilers)
+        stats = None
+        for profiler in profilers:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profiler)
+                else:
+                    stats.add(profiler)
+            except TypeError:
+                continue  # A thread that never ran any profiled code
+        if stats is not None:
+            stats.dump_stats(os.path.join(self.path, 'profile.pstats'))
+            with open(os.path.join(self.path, 'profile.txt'), 'w', encoding='utf-8') as f:
+                stats.stream = f
+                stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+                stats.sort_stats('tottime').print_stats(TOP_FUNCTIONS)
+
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+        with open(os.path.join(self.path, 'allocations.txt'), 'w', encoding='utf-8') as f:
+            f.write(f"Traced memory at the end: {current / 1e6:.1f} MB, peak during the job: {peak / 1e6:.1f} MB\n\n")
+            for number, statistic in enumerate(snapshot.statistics('traceback')[:TOP_ALLOCATIONS], 1):
+                f.write(f"#{number}: {statistic.size / 1e3:.1f} KB in {statistic.count} blocks\n")
+                for line in statistic.traceback.format(most_recent_first=True)[:8]:
+                    f.write(f"    {line}\n")
+
+        self.sampler.write(os.path.join(self.path, 'stacks.folded'))
+
+        try:
+            from PyQt5.QtCore import QT_VERSION_STR, PYQT_VERSION_STR
+        except ImportError:
+            QT_VERSION_STR = PYQT_VERSION_STR = 'not installed'
+        import pandas as pd
+        with open(os.path.join(self.path, 'summary.txt'), 'w', encoding='utf-8') as f:
+            f.write(f"Job: {self.name} {self.details}\n"
+                    f"Started: {self._started_at:%Y-%m-%d %H:%M:%S}\n"
+                    f"Duration: {elapsed:.2f} s\n"
+                    f"Threads profiled: {'all (one process-wide profiler)' if PROCESS_WIDE_PROFILER else len(profilers)}\n"
+                    f"Stack samples: {self.sampler.samples} every {self.sampler.interval * 1000:.0f} ms\n"
+                    f"Peak traced memory: {peak / 1e6:.1f} MB\n"
+                    f"Machine: {platform.platform()}, {os.cpu_count()} CPUs, {platform.processor() or platform.machine()}\n"
+                    f"Python {platform.python_version()}, pandas {pd.__version__}, "
+                    f"Qt {QT_VERSION_STR}, PyQt {PYQT_VERSION_STR}\n")
+        logger.info(f"Profile of {self.name} ({elapsed:.1f} s) written to {self.path}")
+
+
+@contextmanager
+def profile_run(name, details=''):
+    """Profile the enclosed job when profiling is on; nested jobs belong to the outer one."""
+    global _session
+    directory = profile_directory()
+    with _session_lock:
+        start = directory is not None and _session is None
+        if start:
+            _session = ProfileSession(name, directory, details)
+    if not start:
+        yield None
+        return
+    session = _session
+    session.start()
+    try:
+        yield session
+    finally:
+        try:
+            session.stop()
+        except Exception as e:
+            logger.error(f"Error writing profile of {name}: {str(e)}")
+        finally:
+            with _session_lock:
+                _session = None
+
+
+@contextmanager
+def thread_profile(name):
+    """Profile a QThread's run() into the running session, if any.
+
+    Threads started with threading.Thread are profiled automatically; QThreads
+    are not, so their run() bodies use this. name labels the thread's stacks.
+    With a process-wide profiler (Python 3.12+) the thread is already covered.
+    """
+    session = _session
+    if session is None:
+        yield
+        return
+    session.sampler.thread_names[threading.get_ident()] = name
+    profiler = None if PROCESS_WIDE_PROFILER else session.profile_current_thread()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+
+
+def profiled(name):
+    """Decorator profiling a bulk or print entry point when profiling is on."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if profile_directory() is None:
+                return function(*args, **kwargs)
+            employees = args[1] if len(args) > 1 else None
+            details = f"({len(employees)} employees)" if hasattr(employees, '__len__') \
+                and not isinstance(employees, str) else ''
+            with profile_run(name, details):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,123 @@
+import time
+import threading
+from collections import deque
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal
+from PyQt5.QtWidgets import QApplication
+
+# How often progress is repainted, in milliseconds (10 times a second)
+PROGRESS_INTERVAL_MS = 100
+
+# Seconds of recent progress the rate (and so the ETA) is measured over
+RATE_WINDOW = 5.0
+
+
+def format_duration(seconds):
+    """Short human duration, e.g. '12 s', '3 min 20 s', '1 h 05 min'."""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes} min {seconds:02d} s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} h {minutes:02d} min"
+
+
+class ProgressBus(QObject):
+    """Collects per-payslip results of a bulk job and reports them at a fixed rate.
+
+    Workers call record() (or have their per-job signal connected with
+    connect_job()) from any thread; that only counts under a lock. A timer
+    on the GUI thread emits `updated` with a snapshot at most every
+    PROGRESS_INTERVAL_MS, so the cost of showing progress stays the same
+    however many payslips a second the job gets through.
+
+    A snapshot is a dict with total (None if unknown), completed, failed,
+    done, rate (payslips per second), eta (seconds, or None), elapsed and
+    the last message.
+    """
+    updated = pyqtSignal(dict)
+
+    def __init__(self, total=None, interval=PROGRESS_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.message = ''
+        self._lock = threading.Lock()
+        self._changed = False
+        self._started = None
+        self._samples = deque()  # (time, payslips done) at each repaint
+        self._last_pump = 0.0
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self._flush)
+
+    def start(self):
+        """Start timing and repainting; call from the GUI thread"""
+        self._started = time.monotonic()
+        self._samples.append((self._started, 0))
+        self._timer.start()
+
+    def stop(self):
+        """Stop repainting after showing the final counts"""
+        self._timer.stop()
+        self._changed = True
+        self._flush()
+
+    def record(self, success, message=''):
+        """Count one finished payslip; safe to call from any thread"""
+        with self._lock:
+            if success:
+                self.completed += 1
+            else:
+                self.failed += 1
+            if message:
+                self.message = message
+            self._changed = True
+
+    def connect_job(self, signal):
+        """Count a worker's per-job (success, message) signal in the worker's thread.
+
+        The direct connection means no event is queued to the GUI per payslip.
+        """
+        signal.connect(self.record, Qt.DirectConnection)
+
+    def snapshot(self):
+        with self._lock:
+            completed, failed, message = self.completed, self.failed, self.message
+        done = completed + failed
+        now = time.monotonic()
+        elapsed = now - self._started if self._started is not None else 0.0
+        rate = 0.0
+        if self._samples:
+            since, done_then = self._samples[0]
+            if now - since > 0:
+                rate = (done - done_then) / (now - since)
+        eta = None
+        if self.total and done < self.total and rate > 0:
+            eta = (self.total - done) / rate
+        return {'total': self.total, 'completed': completed, 'failed': failed, 'done': done,
+                'rate': rate, 'eta': eta, 'elapsed': elapsed, 'message': message}
+
+    def _flush(self):
+        if not self._changed:
+            return
+        self._changed = False
+        snapshot = self.snapshot()
+        now = time.monotonic()
+        self._samples.append((now, snapshot['done']))
+        while len(self._samples) > 2 and now - self._samples[0][0] > RATE_WINDOW:
+            self._samples.popleft()
+        self.updated.emit(snapshot)
+
+    def pump(self):
+        """For jobs running on the GUI thread: process events, at most once per interval.
+
+        Lets the repaint timer fire and the Cancel button respond without
+        handling events after every payslip.
+        """
+        now = time.monotonic()
+        if now - self._last_pump >= self._timer.interval() / 1000:
+            self._last_pump = now
+            QApplication.processEvents()
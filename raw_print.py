@@ -0,0 +1,143 @@
+import sys
+import logging
+import subprocess
+
+logger = logging.getLogger('RawPrint')
+
+# Impact printers print 6 lines per inch unless told otherwise
+LINES_PER_INCH = 6
+
+# ESC/P control codes
+ESC = b'\x1b'
+RESET = ESC + b'@'
+SIX_LINES_PER_INCH = ESC + b'2'
+EIGHT_LINES_PER_INCH = ESC + b'0'
+FORM_FEED = b'\x0c'
+LINE_END = b'\r\n'
+
+# Characters per inch -> ESC/P pitch command (10 pica, 12 elite, 15 micron)
+PITCH_COMMANDS = {10: ESC + b'P', 12: ESC + b'M', 15: ESC + b'g'}
+
+# Most lines ESC C accepts for the page length
+MAX_PAGE_LINES = 127
+
+# Payslips encoded per write, so a large job streams instead of being built in memory
+WRITE_BATCH = 50
+
+
+def page_lines(height_mm, lines_per_inch=LINES_PER_INCH):
+    """Lines that fit on a page of this printable height."""
+    return max(1, int(height_mm / 25.4 * lines_per_inch))
+
+
+def escp_setup(lines, pitch=10, lines_per_inch=LINES_PER_INCH):
+    """ESC/P commands sent once before the payslips: reset, line spacing, page length and pitch."""
+    if pitch not in PITCH_COMMANDS:
+        raise ValueError(f"Unsupported pitch {pitch}; use one of {sorted(PITCH_COMMANDS)}")
+    spacing = EIGHT_LINES_PER_INCH if lines_per_inch == 8 else SIX_LINES_PER_INCH
+    length = ESC + b'C' + bytes([min(lines, MAX_PAGE_LINES)])
+    return RESET + spacing + length + PITCH_COMMANDS[pitch]
+
+
+def payslip_bytes(text, lines, encoding='cp437'):
+    """One payslip (text or a payslip_layout.Payslip) as printer text: CR LF line ends and a
+    form feed after every page.
+
+    Payslips longer than a page are split every `lines` lines; trailing
+    blank lines are dropped so a payslip never spills onto an empty page.
+    """
+    if isinstance(text, str):
+        rows = text.rstrip('\n').split('\n')
+    else:
+        rows = text.lines()
+        while len(rows) > 1 and not rows[-1]:
+            rows.pop()
+    pages = [rows[start:start + lines] for start in range(0, len(rows), lines)] or [[]]
+    return b''.join(LINE_END.join(row.rstrip('\r').encode(encoding, errors='replace') for row in page)
+                    + LINE_END + FORM_FEED
+                    for page in pages)
+
+
+def raw_stream(payslips, lines, escp=True, pitch=10, lines_per_inch=LINES_PER_INCH, encoding='cp437'):
+    """Printer stream for payslip texts, yielded in chunks of WRITE_BATCH payslips."""
+    chunk = []
+    if escp:
+        # The page length set on the printer is capped, so pages are split at the same length
+        lines = min(lines, MAX_PAGE_LINES)
+        chunk.append(escp_setup(lines, pitch, lines_per_inch))
+    for text in payslips:
+        chunk.append(payslip_bytes(text, lines, encoding))
+        if len(chunk) >= WRITE_BATCH:
+            yield b''.join(chunk)
+            chunk = []
+    if chunk:
+        yield b''.join(chunk)
+
+
+class RawOutput:
+    """Destination of a raw print stream: a file or device path, or a printer queue.
+
+    A path is written as is, so spool devices such as LPT1, /dev/usb/lp0 or a
+    shared \\\\server\\printer work like files. A printer name is sent through
+    the Windows spooler (needs pywin32) or `lp -o raw` elsewhere, bypassing the
+    printer driver's graphics rendering.
+    """
+
+    def __init__(self, path=None, printer_name=None, title="Payslips"):
+        if (path is None) == (printer_name is None):
+            raise ValueError("Give either a path or a printer name")
+        self.path = path
+        self.printer_name = printer_name
+        self._file = None
+        self._process = None
+        self._handle = None
+        if path is not None:
+            self._file = open(path, 'wb')
+        elif sys.platform == 'win32':
+            try:
+                import win32print
+            except ImportError:
+                raise RuntimeError("Raw printing to a Windows printer needs the pywin32 package")
+            self._handle = win32print.OpenPrinter(printer_name)
+            win32print.StartDocPrinter(self._handle, 1, (title, None, "RAW"))
+            win32print.StartPagePrinter(self._handle)
+        else:
+            self._process = subprocess.Popen(['lp', '-d', printer_name, '-o', 'raw', '-t', title],
+                                             stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+            self._file = self._process.stdin
+
+    def write(self, data):
+        if self._handle is not None:
+            import win32print
+            win32print.WritePrinter(self._handle, data)
+        else:
+            self._file.write(data)
+
+    def close(self):
+        """Finish the job; raises if the spooler rejected it."""
+        if self._handle is not None:
+            import win32print
+            try:
+                win32print.EndPagePrinter(self._handle)
+                win32print.EndDocPrinter(self._handle)
+            finally:
+                win32print.ClosePrinter(self._handle)
+                self._handle = None
+            return
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._process is not None:
+            status = self._process.wait()
+            self._process = None
+            if status != 0:
+                raise RuntimeError(f"lp exited with status {status}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f"RawOutput({(self.path or self.printer_name)!r})"
@@ -0,0 +1,125 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger('Reconciliation')
+
+# Statutory contributions printed in the footer, as (column, rate of the EPF base)
+CONTRIBUTION_RATES = [('EPF YEE', 0.08), ('ETF YER', 0.03), ('EPF YER', 0.12)]
+
+
+def reconciled_columns(template):
+    """Header names of the sheet columns the reconciliation checks read, besides mapped items."""
+    totals = template.get('totals', {})
+    return ([totals[key] for key in ('earnings', 'deductions', 'net') if key in totals]
+            + list(template.get('epf_base', []))
+            + [name for name, _ in CONTRIBUTION_RATES] + ['TOTAL EPF'])
+
+
+def _column(df, schema, name):
+    """Column values as float64 (NaN for blanks), or None if the sheet has no such column."""
+    position = schema.position(name)
+    if position is None:
+        return None
+    return df.iloc[:, position].to_numpy(dtype='float64', na_value=np.nan)
+
+
+def _row_sums(df, positions):
+    """Per-row sum of the given columns, blanks counting as zero."""
+    positions = sorted(set(positions))
+    if not positions:
+        return np.zeros(len(df))
+    block = df.iloc[:, positions].to_numpy(dtype='float64', na_value=np.nan)
+    return np.nansum(block, axis=1)
+
+
+def _mismatches(check, column, expected, actual, tolerance, describe):
+    """Issue records for rows where actual differs from expected by more than tolerance."""
+    expected = np.nan_to_num(expected)
+    actual = np.nan_to_num(actual)
+    difference = actual - expected
+    issues = []
+    for row in np.flatnonzero(np.abs(difference) > tolerance):
+        issues.append({
+            'severity': 'warning',
+            'row': int(row),
+            'column': column,
+            'check': check,
+            'expected': float(expected[row]),
+            'actual': float(actual[row]),
+            'difference': float(difference[row]),
+            'message': (f"{column} {actual[row]:,.2f} does not match {describe} "
+                        f"{expected[row]:,.2f} (difference {difference[row]:,.2f})"),
+        })
+    return issues
+
+
+def reconcile_sheet(df, schema, layout, tolerance=0.01, rate_tolerance=0.5):
+    """Check the printed totals against the sheet's own line items for every row at once.
+
+    Checks, per employee:
+        - total earnings equals the sum of the mapped earnings amounts
+        - total deductions equals the sum of the mapped deductions amounts
+        - net pay equals total earnings minus total deductions
+        - EPF 8%, ETF 3% and EPF 12% match the rates applied to the EPF base columns
+        - TOTAL EPF equals EPF employee plus employer contributions
+
+    Args:
+        df: Loaded sheet with payslip number columns coerced
+        schema: SheetSchema of the sheet
+        layout: CompiledLayout for the sheet (provides mapped items and total columns)
+        tolerance: Allowed difference for sums, in currency units
+        rate_tolerance: Allowed difference for percentage contributions (rounding)
+
+    Returns:
+        List of mismatch dicts with 'row', 'column', 'check', 'expected', 'actual',
+        'difference', 'message' and 'severity', in the same shape as pre-flight issues.
+    """
+    totals = layout.template.get('totals', {})
+    issues = []
+
+    total_earnings = _column(df, schema, totals.get('earnings', ''))
+    total_deductions = _column(df, schema, totals.get('deductions', ''))
+    net_pay = _column(df, schema, totals.get('net', ''))
+
+    if total_earnings is not None:
+        mapped = _row_sums(df, layout.amount_positions('earnings'))
+        issues += _mismatches('earnings', totals['earnings'], mapped, total_earnings,
+                              tolerance, "the mapped earnings")
+    if total_deductions is not None:
+        mapped = _row_sums(df, layout.amount_positions('deductions'))
+        issues += _mismatches('deductions', totals['deductions'], mapped, total_deductions,
+                              tolerance, "the mapped deductions")
+    if net_pay is not None and total_earnings is not None and total_deductions is not None:
+        expected = np.nan_to_num(total_earnings) - np.nan_to_num(total_deductions)
+        issues += _mismatches('net', totals['net'], expected, net_pay,
+                              tolerance, "earnings less deductions")
+
+    base_positions = [schema.position(name) for name in layout.template.get('epf_base', [])]
+    base_positions = [p for p in base_positions if p is not None]
+    if base_positions:
+        base = _row_sums(df, base_positions)
+        contributions = {}
+        for name, rate in CONTRIBUTION_RATES:
+            actual = _column(df, schema, name)
+            if actual is None:
+                continue
+            contributions[name] = actual
+            issues += _mismatches('contribution', name, base * rate, actual,
+                                  rate_tolerance, f"{rate:.0%} of the EPF base")
+        total_epf = _column(df, schema, 'TOTAL EPF')
+        if total_epf is not None and 'EPF YEE' in contributions and 'EPF YER' in contributions:
+            expected = np.nan_to_num(contributions['EPF YEE']) + np.nan_to_num(contributions['EPF YER'])
+            issues += _mismatches('contribution', 'TOTAL EPF', expected, total_epf,
+                                  tolerance, "EPF employee plus employer")
+
+    issues.sort(key=lambda issue: issue['row'])
+    logger.info(f"Reconciliation found {len(issues)} mismatches in '{schema.sheet_name}'")
+    return issues
+
+
+def summarize(issues):
+    """Count mismatches per checked column, e.g. {'TOT EARN': 3, 'EPF YEE': 1}."""
+    counts = {}
+    for issue in issues:
+        counts[issue['column']] = counts.get(issue['column'], 0) + 1
+    return counts
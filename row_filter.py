@@ -0,0 +1,255 @@
+import logging
+import re
+import numpy as np
+import pandas as pd
+from sheet_loader import normalize_header
+from employee_search import search_key
+
+logger = logging.getLogger('RowFilter')
+
+# Strings, operators and brackets, and words (column names, numbers, unquoted text)
+_TOKEN = re.compile(r'''\s*(?:("[^"]*"|'[^']*')|(>=|<=|!=|==|=|<|>|[(){}\[\],])|([^\s"'<>=!(){}\[\],]+))''')
+
+_KEYWORDS = {'AND', 'OR', 'NOT', 'IN', 'CONTAINS'}
+
+_ORDERING = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal}
+
+
+class FilterError(ValueError):
+    """A filter expression that cannot be read or does not fit the sheet."""
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise FilterError(f"Cannot read the filter at '{text[position:].strip()}'")
+        string, op, word = match.groups()
+        if string is not None:
+            tokens.append(('value', string[1:-1]))
+        elif op is not None:
+            tokens.append(('op', op))
+        elif word.upper() in _KEYWORDS:
+            tokens.append(('keyword', word.upper()))
+        else:
+            tokens.append(('word', word))
+        position = match.end()
+    return tokens
+
+
+def _number(value):
+    try:
+        return float(str(value).replace(',', ''))
+    except ValueError:
+        return None
+
+
+def _column(df, schema, name):
+    """Column for a header as typed: case, spacing and punctuation don't matter."""
+    position = schema.position(name)
+    if position is None:
+        wanted = re.sub(r'[^A-Z0-9]', '', normalize_header(name))
+        position = next((i for i, column in enumerate(schema.columns)
+                         if re.sub(r'[^A-Z0-9]', '', normalize_header(column)) == wanted), None)
+    if position is None:
+        raise FilterError(f"The sheet has no column named '{name}'")
+    return df.iloc[:, position]
+
+
+def _text(column):
+    """Column values as search keys, for text comparisons."""
+    text = column.astype('string').str.split().str.join(' ').str.upper()
+    return text.where(text != '')
+
+
+def _is_number_column(column):
+    return pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_bool_dtype(column.dtype)
+
+
+def _isin(column, values):
+    """Rows whose value is one of values; numbers compare as numbers, text without regard to case."""
+    if _is_number_column(column):
+        numbers = [number for number in map(_number, values) if number is not None]
+        array = column.to_numpy(dtype='float64', na_value=np.nan)
+        return np.isin(array, numbers)
+    keys = {key for key in map(search_key, values) if key is not None}
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Compare each category once, then look the rows up by code
+        hits = _text(pd.Series(column.cat.categories)).isin(keys).to_numpy(dtype=bool, na_value=False)
+        codes = column.cat.codes.to_numpy()
+        return (codes >= 0) & hits[codes]
+    return _text(column).isin(keys).to_numpy(dtype=bool, na_value=False)
+
+
+def _ordering(column, op, value):
+    if pd.api.types.is_datetime64_any_dtype(column.dtype):
+        try:
+            bound = pd.to_datetime(value, dayfirst=True)
+        except (ValueError, TypeError):
+            raise FilterError(f"'{value}' is not a date")
+        return _ORDERING[op](column, bound).to_numpy(dtype=bool, na_value=False)
+    bound = _number(value)
+    if bound is None:
+        raise FilterError(f"'{value}' is not a number; {op} compares numbers")
+    array = pd.to_numeric(column, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    with np.errstate(invalid='ignore'):
+        return _ORDERING[op](array, bound)
+
+
+def _contains(column, value):
+    return column.astype('string').str.contains(value, case=False, regex=False) \
+        .to_numpy(dtype=bool, na_value=False)
+
+
+class _Parser:
+    """Recursive descent over the tokens; every rule returns a function mask(df, schema)."""
+
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None, expected=None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind) or (value and token[1] != value):
+            expected = expected or (f"'{value}'" if value else 'more')
+            found = f"'{token[1]}'" if token[0] else 'the end'
+            raise FilterError(f"Expected {expected} but found {found}")
+        self.position += 1
+        return token[1]
+
+    def parse(self):
+        mask = self.expression()
+        if self.peek()[0] is not None:
+            raise FilterError(f"Unexpected '{self.peek()[1]}'")
+        return mask
+
+    def expression(self):
+        parts = [self.conjunction()]
+        while self.peek() == ('keyword', 'OR'):
+            self.take()
+            parts.append(self.conjunction())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda df, schema: np.logical_or.reduce([part(df, schema) for part in parts])
+
+    def conjunction(self):
+        parts = [self.negation()]
+        while self.peek() == ('keyword', 'AND'):
+            self.take()
+            parts.append(self.negation())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda df, schema: np.logical_and.reduce([part(df, schema) for part in parts])
+
+    def negation(self):
+        if self.peek() == ('keyword', 'NOT'):
+            self.take()
+            part = self.negation()
+            return lambda df, schema: ~part(df, schema)
+        if self.peek() == ('op', '('):
+            self.take()
+            part = self.expression()
+            self.take('op', ')')
+            return part
+        return self.comparison()
+
+    def column_name(self):
+        if self.peek()[0] == 'value':
+            return self.take()
+        words = [self.take('word', expected='a column name')]
+        while self.peek()[0] == 'word':
+            words.append(self.take())
+        return ' '.join(words)
+
+    def value(self, words=True):
+        """A quoted string or unquoted text; unquoted text runs over several words unless in a list."""
+        if self.peek()[0] == 'value':
+            return self.take()
+        value = [self.take('word', expected='a value')]
+        while words and self.peek()[0] == 'word':
+            value.append(self.take())
+        return ' '.join(value)
+
+    def values(self):
+        """A {...}, (...) or [...] list; items are separated by commas and/or whitespace."""
+        closing = {'{': '}', '(': ')', '[': ']'}.get(self.peek()[1]) if self.peek()[0] == 'op' else None
+        if closing is None:
+            self.take(expected="a list in braces after 'in'", value='{')
+        self.take()
+        values = []
+        while self.peek() != ('op', closing):
+            if self.peek()[0] is None:
+                self.take(value=closing)
+            if self.peek() == ('op', ','):
+                self.take()
+                continue
+            values.append(self.value(words=False))
+        self.take('op', closing)
+        return values
+
+    def comparison(self):
+        name = self.column_name()
+        kind, op = self.peek()
+        if (kind, op) == ('keyword', 'NOT'):
+            self.take()
+            self.take('keyword', 'IN')
+            values = self.values()
+            return lambda df, schema: ~_isin(_column(df, schema, name), values)
+        if (kind, op) == ('keyword', 'IN'):
+            self.take()
+            values = self.values()
+            return lambda df, schema: _isin(_column(df, schema, name), values)
+        if (kind, op) == ('keyword', 'CONTAINS'):
+            self.take()
+            value = self.value()
+            return lambda df, schema: _contains(_column(df, schema, name), value)
+        if kind != 'op' or op not in ('=', '==', '!=', *_ORDERING):
+            found = f"'{op}'" if kind else 'the end'
+            raise FilterError(f"Expected a comparison after '{name}' but found {found}")
+        self.take()
+        value = self.value()
+        if op in _ORDERING:
+            return lambda df, schema: _ordering(_column(df, schema, name), op, value)
+        if op == '!=':
+            return lambda df, schema: ~_isin(_column(df, schema, name), [value])
+        return lambda df, schema: _isin(_column(df, schema, name), [value])
+
+
+def compile_filter(text):
+    """Parse a row filter into a function mask(df, schema) returning a boolean array.
+
+    Filters compare sheet columns, named by their headers, e.g.
+
+        DEPARTMENT in {DYEING, QA} and netpay > 0
+        EMP NO in (1001 1002 1003)
+        not DESIGNATION contains "trainee" or "BASIC SAL" >= 50000
+
+    Supported: = != < <= > >=, in / not in {list}, contains, and, or, not and
+    parentheses. Lists may be separated by commas, spaces or new lines, so a
+    column copied from Excel can be pasted between the braces. Text compares
+    without regard to case; every condition is evaluated on whole columns.
+
+    Raises:
+        FilterError: If the filter cannot be read
+    """
+    if not text.strip():
+        raise FilterError("The filter is empty")
+    return _Parser(text).parse()
+
+
+def filter_rows(df, schema, text):
+    """Row positions of a loaded sheet that match a filter, in sheet order.
+
+    Raises:
+        FilterError: If the filter cannot be read or names a missing column
+    """
+    mask = compile_filter(text)(df, schema)
+    rows = np.flatnonzero(mask).tolist()
+    logger.info(f"Filter matched {len(rows)} of {len(df)} rows in '{schema.sheet_name}'")
+    return rows
@@ -0,0 +1,240 @@
+import logging
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from employee_search import EmployeeIndex
+
+logger = logging.getLogger('SheetJobs')
+
+# Known date columns shown as dd/mm/yyyy in the data table
+DATE_COLUMNS = ['DOB', 'DOJ', 'D.O.B.', 'D.O.J', 'DATE']
+
+# Most worker processes used to pre-parse sheets
+PRELOAD_MAX_WORKERS = 4
+
+# Memory the pre-parse workers may use together, estimated from sheet sizes
+PRELOAD_MEMORY_BUDGET = 1024 * 1024 * 1024
+
+# Peak parse memory per byte of worksheet XML (measured: about 2-3x, rounded up)
+PARSE_BYTES_PER_XML_BYTE = 4
+
+# Loaded sheets kept for instant switching; least recently used ones are dropped beyond this
+SHEET_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+class LoadCancelled(Exception):
+    """Raised inside a job to stop reading when the user cancels."""
+
+
+def is_xlsx(path):
+    return isinstance(path, str) and os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm')
+
+
+def payslip_columns_for(schema):
+    """Sheet columns read in payslip-only mode: layout fields, mappings and reconciled totals."""
+    from slypGenarater import payslip_columns, get_compiled_layout
+    from reconciliation import reconciled_columns
+    return payslip_columns(schema, reconciled_columns(get_compiled_layout(schema).template))
+
+
+def prepare_sheet(df, schema):
+    """Convert and compact a freshly loaded sheet for rendering.
+
+    Returns:
+        Tuple of (coercion issues, memory in bytes)
+    """
+    from sheet_loader import coerce_numeric_columns, compact_frame, frame_memory_bytes
+    from slypGenarater import payslip_numeric_positions, get_compiled_layout
+    # Payslip figures are converted to numbers once here, not per row while rendering
+    coercion_issues = coerce_numeric_columns(df, payslip_numeric_positions(schema)) \
+        if schema.sheet_type else []
+    # Categorical text, integer IDs and sparse blank columns keep large sheets small
+    id_positions = get_compiled_layout(schema).id_positions if schema.sheet_type else ()
+    compact_frame(df, schema, id_positions)
+    return coercion_issues, frame_memory_bytes(df)
+
+
+def _date_text(value):
+    import pandas as pd
+    try:
+        # Convert to datetime if string
+        if isinstance(value, str):
+            value = pd.to_datetime(value)
+        # Only show the date part (remove timestamp)
+        return value.strftime('%d/%m/%Y')
+    except Exception:
+        return str(value)
+
+
+def format_table(df):
+    """Text of every cell for the data table, one list per column.
+
+    Dates show as dd/mm/yyyy and decimal numbers with two decimals.
+    """
+    import pandas as pd
+    from sheet_loader import SheetRows
+    rows = SheetRows(df)
+    columns = []
+    for position, label in enumerate(df.columns):
+        dtype = df.dtypes.iloc[position]
+        date_column = str(label) in DATE_COLUMNS or pd.api.types.is_datetime64_any_dtype(dtype)
+        integer_column = pd.api.types.is_integer_dtype(dtype)
+        get = rows.column_getter(position)
+        texts = []
+        for row in range(len(df)):
+            value = get(row)
+            if pd.isna(value):
+                texts.append("")
+            elif date_column or isinstance(value, pd.Timestamp):
+                texts.append(_date_text(value))
+            elif integer_column:
+                texts.append(str(int(value)))
+            elif isinstance(value, (int, float)):
+                # Format numbers to 2 decimal points
+                texts.append(f"{value:.2f}")
+            else:
+                texts.append(str(value))
+        columns.append(texts)
+    return columns
+
+
+def parse_sheet(source, sheet_name, payslip_only=False, progress=None, payroll_only=False, table=True):
+    """Read, convert and format one sheet, ready to show.
+
+    Runs off the GUI thread: in a QThread for the sheet being opened, or in a
+    worker process when sheets are pre-parsed.
+
+    Args:
+        source: Workbook path, or an open pd.ExcelFile
+        sheet_name: Name of the sheet
+        payslip_only: Read only the columns payslips use
+        progress: Optional progress(rows, bytes_read, total_bytes) callback (.xlsx only);
+            it may raise LoadCancelled
+        payroll_only: Return None for sheets that are not FIXED/FTC payroll sheets
+        table: Format the cells for the data table; without it 'cells' is None
+
+    Returns:
+        Dict with 'df', 'schema', 'coercion_issues', 'memory', 'cells', 'index'
+        (an EmployeeIndex) and 'size' (approximate bytes held), or None (see payroll_only)
+    """
+    select_columns = payslip_columns_for if payslip_only else None
+    if is_xlsx(source):
+        from xlsx_stream import read_sheet
+        df, schema = read_sheet(source, sheet_name, select_columns, progress, payroll_only=payroll_only)
+        if df is None:
+            return None
+    else:
+        from sheet_loader import load_sheet, detect_sheet_schema
+        if payroll_only and not detect_sheet_schema(source, sheet_name).sheet_type:
+            return None
+        if progress:
+            progress(0, 0, 0)
+        df, schema = load_sheet(source, sheet_name, select_columns)
+    if progress:
+        progress(len(df), 0, 0)
+    coercion_issues, memory = prepare_sheet(df, schema)
+    cells = format_table(df) if table else None
+    index = EmployeeIndex(df, schema)
+    size = memory + index.size + sum(sys.getsizeof(text) for column in cells or () for text in column)
+    return {'df': df, 'schema': schema, 'coercion_issues': coercion_issues,
+            'memory': memory, 'cells': cells, 'index': index, 'size': size}
+
+
+class SheetCache:
+    """Loaded sheets by key, dropping the least recently used beyond max_bytes."""
+
+    def __init__(self, max_bytes=SHEET_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.total_bytes = 0
+
+    def get(self, key):
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        if key in self._entries:
+            self.total_bytes -= self._entries.pop(key)['size']
+        if result['size'] > self.max_bytes:
+            logger.info(f"Sheet {key[0]!r} is too large to keep cached")
+            return
+        self._entries[key] = result
+        self.total_bytes += result['size']
+        while self.total_bytes > self.max_bytes:
+            _, dropped = self._entries.popitem(last=False)
+            self.total_bytes -= dropped['size']
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+
+def plan_preload(path, sheet_names, max_workers=PRELOAD_MAX_WORKERS, memory_budget=PRELOAD_MEMORY_BUDGET):
+    """Decide which sheets to pre-parse and with how many worker processes.
+
+    Sheets are parsed biggest first. The number of workers is capped by
+    max_workers, the CPU count and how many of the largest sheets fit the
+    memory budget at once; sheets that could never fit are left to load on click.
+
+    Returns:
+        Tuple of (sheet names, worker count)
+    """
+    if is_xlsx(path):
+        from xlsx_stream import sheet_sizes
+        sizes = sheet_sizes(path)
+        estimates = {name: sizes.get(name, 0) * PARSE_BYTES_PER_XML_BYTE for name in sheet_names}
+    else:
+        # No per-sheet sizes in .xls files; assume the whole file per sheet
+        estimate = os.path.getsize(path) * PARSE_BYTES_PER_XML_BYTE
+        estimates = {name: estimate for name in sheet_names}
+
+    sheets = sorted((name for name in sheet_names if estimates[name] <= memory_budget),
+                    key=estimates.get, reverse=True)
+    skipped = [name for name in sheet_names if name not in sheets]
+    if skipped:
+        logger.info(f"Not pre-parsing {', '.join(skipped)}: over the memory budget")
+    workers, used = 0, 0
+    for name in sheets[:min(max_workers, os.cpu_count() or 1)]:
+        if used + estimates[name] > memory_budget:
+            break
+        used += estimates[name]
+        workers += 1
+    return sheets, max(workers, 1) if sheets else 0
+
+
+def preload_sheets(path, sheet_names, payslip_only=False, is_cancelled=None, **plan):
+    """Parse payroll sheets in parallel worker processes.
+
+    Yields (sheet name, parse_sheet result) as each sheet finishes, skipping
+    sheets that are not payroll sheets. Stops early when is_cancelled()
+    returns True; sheets already being parsed are left to finish and dropped.
+    """
+    sheets, workers = plan_preload(path, sheet_names, **plan)
+    if not sheets:
+        return
+    logger.info(f"Pre-parsing {len(sheets)} sheets with {workers} worker processes")
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {executor.submit(parse_sheet, path, name, payslip_only, None, True): name
+                   for name in sheets}
+        while pending:
+            if is_cancelled and is_cancelled():
+                return
+            done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Pre-parsing '{name}' failed: {e}")
+                    continue
+                if result is not None:
+                    yield name, result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,334 @@
+import logging
+import pandas as pd
+from payslip_layout import LAYOUTS
+
+logger = logging.getLogger('SheetLoader')
+
+# Only this many rows are scanned when looking for the header row
+HEADER_SCAN_ROWS = 10
+
+# Header row used by the payroll workbooks when detection finds nothing better
+DEFAULT_HEADER_ROW = 1
+
+# Column names that identify the header row of a payroll sheet (normalized)
+HEADER_MARKERS = {
+    'EMP NO', 'NAME', 'NIC NO.', 'DEPARTMENT', 'DESIGNATION', 'DOB', 'DOJ',
+    'EPF NO', 'BASIC SAL', 'TOT EARN', 'EPF YEE', 'ETF YER', 'A/C NO'
+}
+
+
+
+def normalize_header(name):
+    """Normalize a column header: collapse whitespace, strip and upper-case."""
+    return ' '.join(str(name).split()).upper()
+
+
+class SheetSchema:
+    """Detected layout of a payroll sheet.
+
+    Holds the header row position, the sheet type (FIXED/FTC) and a
+    normalized header -> column position index built once per sheet.
+
+    When only some columns of the sheet were loaded, source_positions gives
+    the sheet column each loaded column came from, so layouts that address
+    columns by their place in the sheet still find them, and sheet_columns
+    keeps every header of the sheet.
+    """
+
+    def __init__(self, columns, sheet_type=None, header_row=DEFAULT_HEADER_ROW, sheet_name="",
+                 source_positions=None, sheet_columns=None):
+        self.columns = [str(c) for c in columns]
+        self.sheet_type = sheet_type
+        self.header_row = header_row
+        self.sheet_name = sheet_name
+        self.source_positions = list(source_positions) if source_positions is not None else None
+        self._local_positions = {source: position for position, source
+                                 in enumerate(self.source_positions or ())}
+        self.sheet_columns = [str(c) for c in sheet_columns] if sheet_columns is not None else self.columns
+        self.index = {}
+        for position, column in enumerate(self.columns):
+            # Keep the first occurrence, like a label lookup on the DataFrame would
+            self.index.setdefault(normalize_header(column), position)
+
+    def position(self, name, default=None):
+        """Return the column position for a header name, or default if missing."""
+        return self.index.get(normalize_header(name), default)
+
+    def has(self, name):
+        """Check whether the sheet has a column with this header."""
+        return normalize_header(name) in self.index
+
+    def column(self, name):
+        """Return the actual column label for a header name, or None if missing."""
+        position = self.position(name)
+        return None if position is None else self.columns[position]
+
+    @property
+    def is_subset(self):
+        """True when only some of the sheet's columns were loaded."""
+        return self.source_positions is not None
+
+    def source_position(self, position):
+        """Return the sheet column position of a loaded column."""
+        return self.source_positions[position] if self.is_subset else position
+
+    def local_position(self, source_position):
+        """Return the loaded column position of a sheet column, or None if it was not loaded."""
+        if self.is_subset:
+            return self._local_positions.get(source_position)
+        return source_position if 0 <= source_position < len(self.columns) else None
+
+    def __repr__(self):
+        loaded = f", loaded={len(self.columns)}" if self.is_subset else ""
+        return (f"SheetSchema(sheet_type={self.sheet_type!r}, header_row={self.header_row}, "
+                f"columns={len(self.columns)}{loaded})")
+
+
+def classify_sheet(sheet_name, headers):
+    """Return the layout sheet type (e.g. 'FIXED', 'FTC') or None, by name first and then by headers."""
+    upper_name = str(sheet_name).upper()
+    for sheet_type in LAYOUTS:
+        if sheet_type in upper_name:
+            return sheet_type
+
+    normalized = {normalize_header(h) for h in headers}
+    scores = {sheet_type: len(layout['markers'] & normalized) for sheet_type, layout in LAYOUTS.items()}
+    best = max(scores, key=scores.get)
+    return best if scores[best] > 0 else None
+
+
+def find_header_row(preview):
+    """Return the index of the row in a header-less preview frame that looks like the header."""
+    best_row, best_score = None, 1
+    for row_number in range(len(preview)):
+        values = preview.iloc[row_number]
+        score = len({normalize_header(v) for v in values if pd.notnull(v)} & HEADER_MARKERS)
+        if score > best_score:
+            best_row, best_score = row_number, score
+    return best_row
+
+
+def schema_from_columns(columns, sheet_name=""):
+    """Build a schema from already-parsed column labels (e.g. a row's index)."""
+    return SheetSchema(columns, classify_sheet(sheet_name, columns), sheet_name=sheet_name)
+
+
+def detect_sheet_schema(excel_file, sheet_name, scan_rows=HEADER_SCAN_ROWS):
+    """Detect the header row and sheet type by scanning only the first rows of a sheet.
+
+    Args:
+        excel_file: An open pd.ExcelFile (or a path accepted by it)
+        sheet_name: Name of the sheet to inspect
+        scan_rows: Number of leading rows to scan for the header
+    """
+    preview = pd.read_excel(excel_file, sheet_name=sheet_name, header=None, nrows=scan_rows)
+    header_row = find_header_row(preview)
+    if header_row is None:
+        logger.warning(f"No header row found in first {scan_rows} rows of '{sheet_name}', "
+                       f"using row {DEFAULT_HEADER_ROW}")
+        header_row = DEFAULT_HEADER_ROW
+
+    columns = [str(v) if pd.notnull(v) else f"Unnamed: {i}"
+               for i, v in enumerate(preview.iloc[header_row])] if header_row < len(preview) else []
+    sheet_type = classify_sheet(sheet_name, columns)
+    return SheetSchema(columns, sheet_type, header_row, sheet_name)
+
+
+def load_sheet(excel_file, sheet_name, select_columns=None):
+    """Load a sheet using its detected header row.
+
+    Args:
+        excel_file: An open pd.ExcelFile (or a path accepted by it)
+        sheet_name: Name of the sheet to load
+        select_columns: Optional function taking the detected SheetSchema and
+            returning the sheet column positions to read (None reads them all).
+            Only those columns are parsed.
+
+    Returns:
+        Tuple of (DataFrame, SheetSchema). The schema is rebuilt from the parsed
+        column labels so positions match the DataFrame exactly.
+    """
+    detected = detect_sheet_schema(excel_file, sheet_name)
+    positions = select_columns(detected) if select_columns and detected.sheet_type else None
+    if positions is not None:
+        positions = sorted({p for p in positions if 0 <= p < len(detected.columns)})
+    df = pd.read_excel(excel_file, sheet_name=sheet_name, header=detected.header_row,
+                       usecols=positions)
+    schema = SheetSchema(df.columns, detected.sheet_type, detected.header_row, sheet_name,
+                         source_positions=positions,
+                         sheet_columns=detected.columns if positions is not None else None)
+    loaded = f"{len(df.columns)} of {len(detected.columns)} columns, " if positions is not None else ""
+    logger.info(f"Loaded '{sheet_name}' as {schema.sheet_type} sheet "
+                f"(header row {schema.header_row}, {loaded}{len(df)} rows)")
+    return df, schema
+
+
+def coerce_numeric_columns(df, positions):
+    """Convert the given columns to float64 in one vectorized pass.
+
+    Blank cells become NaN. Cells that hold text which cannot be read as a
+    number also become NaN and are reported, so the renderer never has to
+    parse or guard individual values.
+
+    Args:
+        df: DataFrame to convert (modified in place)
+        positions: Column positions to convert
+
+    Returns:
+        List of coercion failures, one dict per cell with 'row', 'column' and 'value'
+    """
+    positions = sorted({p for p in positions if p is not None and 0 <= p < df.shape[1]})
+    object_positions = []
+    for position in positions:
+        column = df.iloc[:, position]
+        if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+            df.isetitem(position, column.astype('float64'))
+        else:
+            object_positions.append(position)
+
+    if not object_positions or df.empty:
+        return []
+
+    raw = df.iloc[:, object_positions].to_numpy(dtype=object)
+    flat = pd.Series(raw.ravel(order='F'), dtype=object)
+    numbers = pd.to_numeric(flat, errors='coerce')
+
+    # Retry the few failed cells as text: blanks are empty, "1,250.00" is a number
+    failed = numbers.isna() & flat.notna()
+    if failed.any():
+        text = flat[failed].astype(str).str.strip().str.replace(',', '', regex=False)
+        numbers[failed] = pd.to_numeric(text, errors='coerce')
+        failed &= numbers.isna() & (text.reindex(flat.index, fill_value='') != '')
+
+    values = numbers.to_numpy(dtype='float64').reshape(raw.shape, order='F')
+    for k, position in enumerate(object_positions):
+        df.isetitem(position, values[:, k])
+
+    issues = []
+    rows = len(df)
+    for cell in failed[failed].index:
+        k, row = divmod(cell, rows)
+        issues.append({'row': row, 'column': str(df.columns[object_positions[k]]), 'value': flat[cell]})
+    if issues:
+        logger.warning(f"{len(issues)} cells could not be read as numbers and were left blank")
+    return issues
+
+
+# Text columns that repeat a handful of values across the sheet
+CATEGORY_COLUMNS = {'DEPARTMENT', 'DESIGNATION', 'BANK', 'BRANCH NAME', 'BRANCH', 'BANK CODE'}
+
+# Other text columns become categorical when they have at most this share of distinct values
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# Number columns where at least this share of cells is blank (or zero) are stored sparse
+SPARSE_MIN_FILL_RATIO = 0.9
+
+
+def _to_integer(column):
+    """Integer column for whole-number IDs (nullable when blanks exist), or None if not whole."""
+    values = column.to_numpy(dtype='float64', na_value=float('nan'))
+    present = values[values == values]
+    if len(present) and (present != present.round()).any():
+        return None
+    if len(present) < len(values):
+        return pd.to_numeric(column.astype('Int64'), downcast='integer')
+    return pd.to_numeric(column.astype('int64'), downcast='integer')
+
+
+def compact_frame(df, schema, id_positions=()):
+    """Shrink a loaded sheet in place without changing any value.
+
+    - Repeated strings (DEPARTMENT, DESIGNATION, BANK, BRANCH NAME, ...) become categoricals
+    - ID columns (EMP NO, E.P.F. NO, A/C NO, ...) become the smallest integer type
+    - Integer columns are downcast
+    - Mostly blank or zero number columns are stored sparse
+
+    Args:
+        df: Loaded sheet, after coerce_numeric_columns
+        schema: SheetSchema of the sheet
+        id_positions: Column positions of whole-number IDs
+    """
+    rows = len(df)
+    if not rows:
+        return
+    for position in range(df.shape[1]):
+        column = df.iloc[:, position]
+        dtype = column.dtype
+        if position in id_positions:
+            compacted = _to_integer(column)
+        elif dtype == object:
+            if pd.api.types.infer_dtype(column, skipna=True) != 'string':
+                continue
+            if (normalize_header(schema.columns[position]) in CATEGORY_COLUMNS
+                    or column.nunique() <= rows * CATEGORY_MAX_UNIQUE_RATIO):
+                compacted = column.astype('category')
+            else:
+                continue
+        elif pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype):
+            compacted = pd.to_numeric(column, downcast='integer')
+        elif pd.api.types.is_float_dtype(dtype) and not isinstance(dtype, pd.SparseDtype):
+            blanks = int(column.isna().sum())
+            zeros = int((column == 0).sum())
+            fill_value = float('nan') if blanks >= zeros else 0.0
+            if max(blanks, zeros) < rows * SPARSE_MIN_FILL_RATIO:
+                continue
+            compacted = column.astype(pd.SparseDtype('float64', fill_value))
+        else:
+            continue
+        if compacted is not None:
+            df.isetitem(position, compacted)
+
+
+def frame_memory_bytes(df):
+    """Memory held by a DataFrame, including the strings it references."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def format_bytes(size):
+    """Human readable size, e.g. '12.4 MB'."""
+    for unit in ('bytes', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'bytes' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+class SheetRows:
+    """Positional access to the values of a (compacted) sheet's rows.
+
+    Bulk jobs keep row positions and ask for a row's values only when it is
+    rendered, instead of holding a copied Series per employee.
+    """
+
+    def __init__(self, df):
+        self._length = len(df)
+        self._getters = [self._column_getter(df.iloc[:, position]) for position in range(df.shape[1])]
+
+    @staticmethod
+    def _column_getter(column):
+        dtype = column.dtype
+        if isinstance(dtype, pd.SparseDtype):
+            array = column.array
+            points = dict(zip(array.sp_index.indices.tolist(), array.sp_values.tolist()))
+            fill_value = array.fill_value
+            return lambda row: points.get(row, fill_value)
+        if isinstance(dtype, pd.CategoricalDtype):
+            codes = column.cat.codes.to_numpy()
+            categories = column.cat.categories.to_numpy(dtype=object)
+            nan = float('nan')
+            return lambda row: categories[codes[row]] if codes[row] >= 0 else nan
+        if pd.api.types.is_extension_array_dtype(dtype) or pd.api.types.is_datetime64_any_dtype(dtype):
+            # Timestamps and pd.NA, as a row Series would hold them
+            return column.to_numpy(dtype=object).__getitem__
+        return column.to_numpy().__getitem__
+
+    def __len__(self):
+        return self._length
+
+    def column_getter(self, position):
+        """Function returning the value of one column for a row position."""
+        return self._getters[position]
+
+    def values(self, row):
+        """Values of one row, in column order."""
+        return [get(row) for get in self._getters]
@@ -0,0 +1,144 @@
+import logging
+from PyQt5.QtCore import QThread, pyqtSignal
+from sheet_jobs import LoadCancelled, is_xlsx, parse_sheet, preload_sheets
+
+logger = logging.getLogger('SheetWorker')
+
+
+class WorkbookOpenWorker(QThread):
+    """Opens a workbook in the background and reports its sheet names as soon as they are known"""
+    sheet_names_ready = pyqtSignal(list)
+    opened = pyqtSignal(object)  # pd.ExcelFile, or None for .xlsx files (sheets are streamed)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.cancelled = False
+
+    def run(self):
+        try:
+            if is_xlsx(self.path):
+                from xlsx_stream import sheet_names
+                self.sheet_names_ready.emit(sheet_names(self.path))
+                self.opened.emit(None)
+                return
+            import pandas as pd
+            excel_file = pd.ExcelFile(self.path)
+            if self.cancelled:
+                excel_file.close()
+                return
+            self.sheet_names_ready.emit(excel_file.sheet_names)
+            self.opened.emit(excel_file)
+        except Exception as e:
+            logger.error(f"Error opening workbook: {e}")
+            self.failed.emit(str(e))
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class SheetLoadWorker(QThread):
+    """Parses one sheet in the background, with progress and cancel.
+
+    .xlsx sheets are streamed so progress is reported while rows are read;
+    other formats are read in one go. The loaded frame is converted,
+    compacted and formatted for the table before it is handed back.
+    """
+    progress = pyqtSignal(int, int, int)  # rows read, bytes read, total bytes (0 when unknown)
+    loaded = pyqtSignal(dict)  # see sheet_jobs.parse_sheet
+    failed = pyqtSignal(str)
+
+    def __init__(self, source, sheet_name, payslip_only=False):
+        """
+        Args:
+            source: Workbook path, or an open pd.ExcelFile
+            sheet_name: Name of the sheet to load
+            payslip_only: Read only the columns payslips use
+        """
+        super().__init__()
+        self.source = source
+        self.sheet_name = sheet_name
+        self.payslip_only = payslip_only
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _report(self, rows, bytes_read, total_bytes):
+        if self.cancelled:
+            raise LoadCancelled()
+        self.progress.emit(rows, bytes_read, total_bytes)
+
+    def run(self):
+        try:
+            result = parse_sheet(self.source, self.sheet_name, self.payslip_only, self._report)
+            if self.cancelled:
+                raise LoadCancelled()
+            self.loaded.emit(result)
+        except LoadCancelled:
+            logger.info(f"Loading '{self.sheet_name}' cancelled")
+        except Exception as e:
+            logger.error(f"Error loading sheet: {e}")
+            self.failed.emit(str(e))
+
+
+class SheetPreloadWorker(QThread):
+    """Parses all payroll sheets of a workbook in parallel worker processes.
+
+    Each finished sheet is reported with sheet_ready so it can be cached and
+    shown instantly when its sheet is clicked.
+    """
+    sheet_ready = pyqtSignal(str, dict)  # sheet name, see sheet_jobs.parse_sheet
+
+    def __init__(self, path, sheet_names, payslip_only=False):
+        super().__init__()
+        self.path = path
+        self.sheet_names = list(sheet_names)
+        self.payslip_only = payslip_only
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            for name, result in preload_sheets(self.path, self.sheet_names, self.payslip_only,
+                                               lambda: self.cancelled):
+                self.sheet_ready.emit(name, result)
+        except Exception as e:
+            logger.error(f"Error pre-parsing sheets: {e}")
+
+
+class PayrollDiffWorker(QThread):
+    """Compares the loaded sheet with last month's figures in the background.
+
+    Last month comes from a sheet of another workbook (previous_path and
+    previous_sheet) or from a month of the payroll history (history_month).
+    """
+    compared = pyqtSignal(list)  # see payroll_diff.diff_figures
+    failed = pyqtSignal(str)
+
+    def __init__(self, df, schema, previous_path=None, previous_sheet=None, history_month=None):
+        super().__init__()
+        self.df = df
+        self.schema = schema
+        self.previous_path = previous_path
+        self.previous_sheet = previous_sheet
+        self.history_month = history_month
+
+    def run(self):
+        try:
+            from payroll_diff import sheet_figures, history_figures, diff_sheets
+            if self.history_month:
+                previous = history_figures(self.history_month, self.schema.sheet_type)
+            else:
+                result = parse_sheet(self.previous_path, self.previous_sheet, payslip_only=True,
+                                     payroll_only=True, table=False)
+                if result is None:
+                    raise ValueError(f"'{self.previous_sheet}' is not a FIXED or FTC payroll sheet")
+                previous = sheet_figures(result['df'], result['schema'])
+            self.compared.emit(diff_sheets(self.df, self.schema, previous))
+        except Exception as e:
+            logger.error(f"Error comparing with last month: {e}")
+            self.failed.emit(str(e))
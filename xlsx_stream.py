@@ -0,0 +1,370 @@
+import logging
+import re
+import zipfile
+import posixpath
+from datetime import datetime, timedelta
+from xml.etree.ElementTree import iterparse
+import pandas as pd
+from sheet_loader import (
+    SheetSchema, HEADER_SCAN_ROWS, DEFAULT_HEADER_ROW, find_header_row, classify_sheet
+)
+
+logger = logging.getLogger('XlsxStream')
+
+_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_DOC_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Built-in number formats that display dates or times
+_BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+
+# Text read as a blank cell, as read_excel does by default
+NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+}
+
+# Rows between progress reports of read_sheet
+PROGRESS_EVERY_ROWS = 250
+
+_EPOCH_1900 = datetime(1899, 12, 30)
+_EPOCH_1904 = datetime(1904, 1, 1)
+
+
+def _column_index(reference):
+    """Zero-based column index of a cell reference such as 'AB12'."""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def _is_date_format(code):
+    """Check whether a custom number format displays a date or time."""
+    code = re.sub(r'"[^"]*"|\\.|\[[^\]]*\]', '', code)
+    return re.search(r'[dmyhs]', code, re.IGNORECASE) is not None
+
+
+def _workbook_sheets(archive):
+    """Worksheet XML paths inside the archive by sheet name (in order), and whether the workbook uses 1904 dates."""
+    relationships = {}
+    with archive.open('xl/_rels/workbook.xml.rels') as stream:
+        for _, elem in iterparse(stream):
+            if elem.tag == f'{_PKG_REL}Relationship':
+                relationships[elem.get('Id')] = elem.get('Target')
+
+    members, date1904 = {}, False
+    with archive.open('xl/workbook.xml') as stream:
+        for _, elem in iterparse(stream):
+            if elem.tag == f'{_MAIN}workbookPr':
+                date1904 = elem.get('date1904') in ('1', 'true')
+            elif elem.tag == f'{_MAIN}sheet':
+                target = relationships.get(elem.get(f'{_DOC_REL}id'), '')
+                members[elem.get('name')] = (target.lstrip('/') if target.startswith('/')
+                                             else posixpath.normpath(posixpath.join('xl', target)))
+    return members, date1904
+
+
+def _sheet_member(archive, sheet_name):
+    """Path of a worksheet's XML inside the archive, and whether the workbook uses 1904 dates."""
+    members, date1904 = _workbook_sheets(archive)
+    if sheet_name not in members:
+        raise ValueError(f"Worksheet named '{sheet_name}' not found")
+    return members[sheet_name], date1904
+
+
+def _shared_strings(archive):
+    """Shared string table, in order (rich text runs joined, phonetic hints left out)."""
+    strings = []
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return strings
+    with archive.open('xl/sharedStrings.xml') as stream:
+        for _, elem in iterparse(stream):
+            if elem.tag == f'{_MAIN}si':
+                # Plain text, or rich text runs; phonetic hints (rPh) are left out
+                texts = elem.findall(f'{_MAIN}t') + elem.findall(f'{_MAIN}r/{_MAIN}t')
+                strings.append(''.join(t.text or '' for t in texts))
+                elem.clear()
+    return strings
+
+
+def _date_styles(archive):
+    """Indexes of the cell styles (the 's' attribute of a cell) that display dates."""
+    if 'xl/styles.xml' not in archive.namelist():
+        return set()
+    custom_dates = set()
+    styles = []
+    with archive.open('xl/styles.xml') as stream:
+        in_cell_xfs = False
+        for event, elem in iterparse(stream, events=('start', 'end')):
+            if elem.tag == f'{_MAIN}cellXfs':
+                in_cell_xfs = event == 'start'
+            elif event == 'end' and elem.tag == f'{_MAIN}numFmt':
+                if _is_date_format(elem.get('formatCode', '')):
+                    custom_dates.add(int(elem.get('numFmtId')))
+            elif event == 'end' and in_cell_xfs and elem.tag == f'{_MAIN}xf':
+                styles.append(int(elem.get('numFmtId', 0)))
+    return {index for index, format_id in enumerate(styles)
+            if format_id in _BUILTIN_DATE_FORMATS or format_id in custom_dates}
+
+
+class SheetStream:
+    """Reads one worksheet of an .xlsx file row by row, straight from its XML.
+
+    The header row is detected from the first rows, like load_sheet does, and
+    data rows are then decoded one at a time as they are iterated. Only the
+    current row is held in memory (plus the workbook's shared string table).
+    read_sheet builds the loaded DataFrame from it and reports progress as
+    rows come in.
+
+    Values come out as read_excel would give them: whole numbers as int,
+    dates as datetime, default NA text and empty cells as NaN.
+    """
+
+    def __init__(self, path, sheet_name, select_columns=None, scan_rows=HEADER_SCAN_ROWS):
+        """
+        Args:
+            path: Path of the .xlsx workbook
+            sheet_name: Name of the worksheet to read
+            select_columns: Optional function taking the detected SheetSchema and
+                returning the sheet column positions to keep (see load_sheet)
+            scan_rows: Number of leading rows to scan for the header
+        """
+        self.path = path
+        self.sheet_name = sheet_name
+        self._archive = zipfile.ZipFile(path)
+        try:
+            member, date1904 = _sheet_member(self._archive, sheet_name)
+            self._epoch = _EPOCH_1904 if date1904 else _EPOCH_1900
+            self._shared = _shared_strings(self._archive)
+            self._date_styles = _date_styles(self._archive)
+            self.total_bytes = self._archive.getinfo(member).file_size
+            self._sheet_file = None
+            self._sheet_rows = self._read_rows(member)
+
+            # Rows before and including the header are buffered for detection only
+            preview = []
+            for number, values in self._sheet_rows:
+                preview.extend([] for _ in range(number - len(preview)))
+                preview.append(values)
+                if len(preview) >= scan_rows:
+                    break
+            self.schema = self._detect_schema(preview, select_columns)
+            self._buffered = [(number, values) for number, values in enumerate(preview)
+                              if number > self.schema.header_row and values]
+        except Exception:
+            self._archive.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._sheet_rows.close()
+        self._archive.close()
+
+    @property
+    def bytes_read(self):
+        """How much of the worksheet XML (uncompressed) has been read so far."""
+        try:
+            return self._sheet_file.tell() if self._sheet_file is not None else 0
+        except ValueError:
+            return self.total_bytes
+
+    def _detect_schema(self, preview, select_columns):
+        header_row = find_header_row(pd.DataFrame(preview)) if preview else None
+        if header_row is None:
+            logger.warning(f"No header row found in first {len(preview)} rows of '{self.sheet_name}', "
+                           f"using row {DEFAULT_HEADER_ROW}")
+            header_row = DEFAULT_HEADER_ROW
+        width = max((len(values) for values in preview), default=0)
+        header = preview[header_row] if header_row < len(preview) else []
+        columns = [str(header[i]) if i < len(header) and header[i] == header[i] else f"Unnamed: {i}"
+                   for i in range(width)]
+        sheet_type = classify_sheet(self.sheet_name, columns)
+        schema = SheetSchema(columns, sheet_type, header_row, self.sheet_name)
+
+        positions = select_columns(schema) if select_columns and sheet_type else None
+        if positions is None:
+            self._positions = None
+            return schema
+        self._positions = sorted({p for p in positions if 0 <= p < width})
+        return SheetSchema([columns[p] for p in self._positions], sheet_type, header_row,
+                           self.sheet_name, source_positions=self._positions, sheet_columns=columns)
+
+    def _cell_value(self, cell):
+        kind = cell.get('t', 'n')
+        if kind == 'inlineStr':
+            value = ''.join(t.text or '' for t in cell.iter(f'{_MAIN}t'))
+            return float('nan') if value in NA_STRINGS else value
+        text = cell.findtext(f'{_MAIN}v')
+        if text is None:
+            return float('nan')
+        if kind == 's':
+            value = self._shared[int(text)]
+            return float('nan') if value in NA_STRINGS else value
+        if kind in ('str', 'e'):
+            return float('nan') if text in NA_STRINGS else text
+        if kind == 'b':
+            return text == '1'
+        if kind == 'd':
+            return datetime.fromisoformat(text)
+
+        number = float(text)
+        if int(cell.get('s', 0)) in self._date_styles:
+            if self._epoch is _EPOCH_1900 and 0 < number < 60:
+                number += 1  # Excel counts 29 Feb 1900, which never existed
+            return self._epoch + timedelta(days=number)
+        return int(number) if number.is_integer() else number
+
+    def _read_rows(self, member):
+        """Yield (row index, values) for every row holding at least one cell."""
+        with self._archive.open(member) as stream:
+            self._sheet_file = stream
+            sheet_data = None
+            next_number = 0
+            for event, elem in iterparse(stream, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == f'{_MAIN}sheetData':
+                        sheet_data = elem
+                    continue
+                if elem.tag != f'{_MAIN}row':
+                    continue
+                number = int(elem.get('r', next_number + 1)) - 1
+                next_number = number + 1
+                values = []
+                for position, cell in enumerate(elem.iter(f'{_MAIN}c')):
+                    reference = cell.get('r')
+                    index = _column_index(reference) if reference else position
+                    values.extend([float('nan')] * (index - len(values)))
+                    values.append(self._cell_value(cell))
+                if sheet_data is not None:
+                    sheet_data.clear()  # Drop parsed rows so memory stays flat
+                yield number, values
+
+    def rows(self, numeric_positions=()):
+        """Yield (row position, values) for each data row below the header.
+
+        Row positions count from the first row after the header, as DataFrame
+        positions of load_sheet do. Blank rows are skipped. Values are a tuple
+        in the schema's column order; numeric_positions are converted to float
+        the way coerce_numeric_columns does (text that is not a number, NaN).
+        The stream can be iterated once.
+        """
+        header_row = self.schema.header_row
+        width = len(self.schema.sheet_columns)
+        positions = self._positions
+        numeric = sorted(numeric_positions)
+        nan = float('nan')
+
+        def records():
+            yield from self._buffered
+            yield from self._sheet_rows
+
+        for number, values in records():
+            if number <= header_row or all(v != v for v in values):
+                continue
+            if len(values) < width:
+                values.extend([nan] * (width - len(values)))
+            values = values[:width] if positions is None else [values[p] for p in positions]
+            for position in numeric:
+                values[position] = _number(values[position])
+            yield number - header_row - 1, tuple(values)
+
+
+def sheet_names(path):
+    """Names of the worksheets of an .xlsx workbook, in order, without loading any sheet."""
+    names = []
+    with zipfile.ZipFile(path) as archive, archive.open('xl/workbook.xml') as stream:
+        for _, elem in iterparse(stream):
+            if elem.tag == f'{_MAIN}sheet':
+                names.append(elem.get('name'))
+    return names
+
+
+def sheet_sizes(path):
+    """Uncompressed XML size of each worksheet by name, a cheap measure of what parsing it costs."""
+    with zipfile.ZipFile(path) as archive:
+        members, _ = _workbook_sheets(archive)
+        names = set(archive.namelist())
+        return {name: archive.getinfo(member).file_size if member in names else 0
+                for name, member in members.items()}
+
+
+def _unique_labels(columns):
+    """Column labels made unique the way read_excel does ('NAME', 'NAME.1', ...)."""
+    seen = {}
+    labels = []
+    for column in columns:
+        label = column
+        while label in seen:
+            seen[column] += 1
+            label = f"{column}.{seen[column]}"
+        seen[label] = 0
+        labels.append(label)
+    return labels
+
+
+def read_sheet(path, sheet_name, select_columns=None, progress=None, progress_every=PROGRESS_EVERY_ROWS,
+               payroll_only=False):
+    """Read a worksheet into a DataFrame, like load_sheet, reporting progress as it goes.
+
+    Args:
+        path: Path of the .xlsx workbook
+        sheet_name: Name of the worksheet to read
+        select_columns: Optional column selection (see load_sheet)
+        progress: Optional function called as progress(rows, bytes_read, total_bytes)
+            every progress_every rows; it may raise to stop reading
+        progress_every: Rows between progress calls
+        payroll_only: Stop after the header when the sheet is not a payroll sheet
+
+    Returns:
+        Tuple of (DataFrame, SheetSchema), with the same row positions as load_sheet.
+        The DataFrame is None when payroll_only is set and the sheet has no sheet type.
+    """
+    with SheetStream(path, sheet_name, select_columns) as stream:
+        detected = stream.schema
+        if payroll_only and not detected.sheet_type:
+            return None, detected
+        blank = (float('nan'),) * len(detected.columns)
+        records = []
+        for row, values in stream.rows():
+            # Blank rows between employees keep their place, as read_excel keeps them
+            records.extend([blank] * (row - len(records)))
+            records.append(values)
+            if progress and len(records) % progress_every == 0:
+                progress(len(records), stream.bytes_read, stream.total_bytes)
+        if progress:
+            progress(len(records), stream.total_bytes, stream.total_bytes)
+
+    df = pd.DataFrame.from_records(records, columns=_unique_labels(detected.columns), nrows=len(records))
+    for position in range(df.shape[1]):
+        # read_excel turns columns of numeric-looking text (e.g. bank codes) into numbers
+        if df.dtypes.iloc[position] == object:
+            try:
+                df.isetitem(position, pd.to_numeric(df.iloc[:, position]))
+            except (ValueError, TypeError):
+                pass
+    schema = SheetSchema(df.columns, detected.sheet_type, detected.header_row, sheet_name,
+                         source_positions=detected.source_positions,
+                         sheet_columns=detected.sheet_columns if detected.is_subset else None)
+    logger.info(f"Read '{sheet_name}' as {schema.sheet_type} sheet "
+                f"(header row {schema.header_row}, {len(df)} rows)")
+    return df, schema
+
+
+def _number(value):
+    """A cell value as float, NaN when it is blank or not a number."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().replace(',', ''))
+        except ValueError:
+            return float('nan')
+    return float('nan')